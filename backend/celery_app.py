@@ -0,0 +1,20 @@
+"""
+Configuração do Celery para as tarefas assíncronas do projeto
+
+Para rodar o worker (com o agendador das tarefas periódicas):
+    celery -A celery_app worker -B -l info
+"""
+
+import os
+
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'settings')
+
+app = Celery('greencycle')
+
+# Lê as configurações com prefixo CELERY_ do settings.py
+app.config_from_object('django.conf:settings', namespace='CELERY')
+
+# Procura tarefas em <app>/tasks.py dos apps instalados
+app.autodiscover_tasks()
@@ -1,9 +1,10 @@
 from django.contrib import admin
 
-from .models import (Avaliacoes, Clientes, Coletas, Enderecos, ImagemColetas,
-                     ImagemPerfil, Materiais, MateriaisParceiros,
-                     MateriaisPontosColeta, Pagamentos, Parceiros,
-                     PontosColeta, Solicitacoes, Telefones, Usuarios)
+from .models import (Avaliacoes, Clientes, Coletas, Enderecos,
+                     GeocodificacaoCache, ImagemColetas, ImagemPerfil,
+                     Materiais, MateriaisParceiros, MateriaisPontosColeta, Pagamentos, Parceiros,
+                     PontosColeta, ResumoAvaliacoes, Solicitacoes, Telefones,
+                     Usuarios)
 
 
 @admin.register(Avaliacoes)
@@ -118,10 +119,11 @@ class EnderecosAdmin(admin.ModelAdmin):
         'cidade',
         'rua',
         'numero',
+        'geocoding_status',
         'criado_em',
         'atualizado_em',
     )
-    list_filter = ('estado', 'cidade', 'criado_em')
+    list_filter = ('estado', 'cidade', 'geocoding_status', 'criado_em')
     search_fields = ('cep', 'cidade', 'rua', 'bairro')
 
 
@@ -260,3 +262,34 @@ class ImagemPerfilAdmin(admin.ModelAdmin):
     list_select_related = ('id_usuarios',)
     search_fields = ('id_usuarios__usuario', 'id_usuarios__nome')
     readonly_fields = ('file_id', 'criado_em', 'atualizado_em')
+
+
+@admin.register(GeocodificacaoCache)
+class GeocodificacaoCacheAdmin(admin.ModelAdmin):
+    list_display = (
+        'id',
+        'endereco_normalizado',
+        'latitude',
+        'longitude',
+        'encontrado',
+        'expira_em',
+        'atualizado_em',
+    )
+    list_filter = ('encontrado', 'expira_em')
+    search_fields = ('endereco_normalizado', 'chave')
+
+
+@admin.register(ResumoAvaliacoes)
+class ResumoAvaliacoesAdmin(admin.ModelAdmin):
+    list_display = (
+        'id',
+        'tipo',
+        'referencia_id',
+        'total_avaliacoes',
+        'media_notas',
+        'total_coletas_finalizadas',
+        'atualizado_em',
+    )
+    list_filter = ('tipo',)
+    search_fields = ('referencia_id',)
+    readonly_fields = ('criado_em', 'atualizado_em')
@@ -1,6 +1,15 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from . import signals
+        from .middleware import instalar_contador
+        signals.conectar()
+        connection_created.connect(
+            instalar_contador, dispatch_uid='orcamento_consultas'
+        )
@@ -0,0 +1,93 @@
+import hashlib
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.response import Response
+
+logger = logging.getLogger(__name__)
+
+PREFIXO = 'respostas'
+
+
+def _chave_versao(modelo):
+    return f'{PREFIXO}:versao:{modelo._meta.label_lower}'
+
+
+def versoes(modelos):
+    """Contador de versão atual de cada modelo (0 se nunca alterado)"""
+    chaves = [_chave_versao(modelo) for modelo in modelos]
+    valores = cache.get_many(chaves)
+    return [valores.get(chave, 0) for chave in chaves]
+
+
+def invalidar(*modelos):
+    """
+    Incrementa a versão dos modelos após o commit da transação atual;
+    as respostas guardadas com a versão anterior deixam de ser lidas e
+    expiram sozinhas (CACHE_RESPOSTAS_TTL)
+
+    Chamado pelos sinais post_save/post_delete (core.signals). Alterações
+    que não disparam sinais (QuerySet.update(), bulk_create) precisam
+    chamar invalidar() explicitamente.
+    """
+    def incrementar():
+        for modelo in modelos:
+            chave = _chave_versao(modelo)
+            try:
+                if not cache.add(chave, 1, timeout=None):
+                    cache.incr(chave)
+            except Exception as e:
+                logger.warning('Erro ao invalidar cache de %s: %s', chave, e)
+    transaction.on_commit(incrementar)
+
+
+class CacheRespostaMixin:
+    """
+    Cache read-through de list e retrieve de um ViewSet
+
+    A chave combina URL, query params (em ordem) e a versão de cada
+    modelo em cache_modelos, que deve listar todos os modelos lidos pelos
+    serializers da view. Como as versões são lidas antes da consulta, uma
+    resposta calculada durante uma alteração fica guardada com a versão
+    antiga e nunca é servida.
+    """
+    cache_modelos = ()
+
+    def list(self, request, *args, **kwargs):
+        return self._resposta_em_cache(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._resposta_em_cache(super().retrieve, request, *args, **kwargs)
+
+    def _chave_resposta(self, request):
+        base = repr((
+            request.build_absolute_uri(request.path),
+            sorted(request.query_params.lists()),
+            versoes(self.cache_modelos),
+        ))
+        return f'{PREFIXO}:{hashlib.md5(base.encode()).hexdigest()}'
+
+    def _resposta_em_cache(self, metodo, request, *args, **kwargs):
+        if not settings.CACHE_RESPOSTAS_ATIVO:
+            return metodo(request, *args, **kwargs)
+
+        try:
+            chave = self._chave_resposta(request)
+            dados = cache.get(chave)
+        except Exception as e:
+            logger.warning('Erro ao ler resposta do cache: %s', e)
+            return metodo(request, *args, **kwargs)
+
+        if dados is not None:
+            return Response(dados, headers={'X-Cache': 'HIT'})
+
+        resposta = metodo(request, *args, **kwargs)
+        if resposta.status_code == 200:
+            try:
+                cache.set(chave, resposta.data, timeout=settings.CACHE_RESPOSTAS_TTL)
+            except Exception as e:
+                logger.warning('Erro ao gravar resposta no cache: %s', e)
+        resposta['X-Cache'] = 'MISS'
+        return resposta
@@ -0,0 +1,96 @@
+import logging
+import threading
+import time
+from collections import namedtuple
+from types import MappingProxyType
+
+from django.conf import settings
+
+from .cache_respostas import versoes
+from .models import Materiais
+
+logger = logging.getLogger(__name__)
+
+# Fotografia imutável da tabela materiais. Os objetos são compartilhados
+# entre requisições e threads: apenas leitura
+Catalogo = namedtuple(
+    'Catalogo', ['versao', 'materiais', 'por_id', 'por_nome', 'carregado_em']
+)
+
+_lock = threading.Lock()
+_atual = None
+
+
+def _versao_global():
+    # Mesmo contador de versão do cache de respostas, incrementado pelos
+    # sinais de Materiais (core.signals)
+    try:
+        return versoes([Materiais])[0]
+    except Exception as e:
+        logger.warning('Erro ao ler versão do catálogo de materiais: %s', e)
+        return None
+
+
+def _carregar(versao):
+    materiais = tuple(Materiais.objects.order_by('id'))
+    return Catalogo(
+        versao=versao,
+        materiais=materiais,
+        por_id=MappingProxyType({m.id: m for m in materiais}),
+        por_nome=MappingProxyType({m.nome.lower(): m for m in materiais}),
+        carregado_em=time.monotonic(),
+    )
+
+
+def validar():
+    """
+    Confere a versão no cache e recarrega o catálogo se ela mudou (ou se
+    passou de CATALOGO_MATERIAIS_IDADE_MAXIMA). Chamado uma vez por
+    requisição pelo CatalogoMateriaisMiddleware.
+    """
+    global _atual
+
+    versao = _versao_global()
+    catalogo = _atual
+    if (
+        catalogo is not None
+        and (versao is None or versao == catalogo.versao)
+        and time.monotonic() - catalogo.carregado_em
+        < settings.CATALOGO_MATERIAIS_IDADE_MAXIMA
+    ):
+        return catalogo
+
+    with _lock:
+        if _atual is catalogo:
+            # A versão é lida antes da consulta: uma alteração durante a
+            # carga gera outra versão e nova carga na próxima requisição
+            _atual = _carregar(versao)
+        return _atual
+
+
+def atual():
+    """Catálogo vigente, sem consultar o cache (carrega se ainda não houver)"""
+    return _atual or validar()
+
+
+def material(material_id):
+    """Materiais com o id informado, ou None"""
+    try:
+        return atual().por_id.get(int(material_id))
+    except (TypeError, ValueError):
+        return None
+
+
+def por_nome(nome):
+    return atual().por_nome.get(nome.lower())
+
+
+def nome(material_id):
+    encontrado = material(material_id)
+    return encontrado.nome if encontrado else None
+
+
+def materiais(ids):
+    """Materiais dos ids informados, em ordem de id (ids ausentes ignorados)"""
+    por_id = atual().por_id
+    return [por_id[i] for i in sorted(set(ids)) if i in por_id]
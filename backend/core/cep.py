@@ -0,0 +1,347 @@
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+
+class CEPIndisponivel(Exception):
+    """Falha ao consultar o serviço externo de CEP (rede, timeout, 5xx)"""
+
+
+def normalizar_registro(dados):
+    """
+    Converte um registro de CEP para o formato usado na API
+
+    Aceita tanto as chaves da ViaCEP (logradouro, localidade, uf) quanto
+    as chaves já usadas pelo projeto (rua, cidade, estado).
+    """
+    cep = re.sub(r'[^0-9]', '', str(dados.get('cep', '')))
+    return {
+        'cep': cep,
+        'estado': dados.get('uf', dados.get('estado', '')) or '',
+        'cidade': dados.get('localidade', dados.get('cidade', '')) or '',
+        'bairro': dados.get('bairro', '') or '',
+        'rua': dados.get('logradouro', dados.get('rua', '')) or '',
+    }
+
+
+class IndiceCEP:
+    """
+    Índice local de CEPs em um arquivo SQLite
+
+    O CEP é guardado como inteiro e usado como chave primária de uma
+    tabela WITHOUT ROWID, então cada consulta é uma busca direta na
+    árvore B do arquivo, sem rede. Cada thread usa sua própria conexão.
+    """
+    CAMPOS = ('cep', 'estado', 'cidade', 'bairro', 'rua')
+
+    def __init__(self, caminho):
+        self.caminho = str(caminho)
+        self._local = threading.local()
+
+    def _conexao(self):
+        conexao = getattr(self._local, 'conexao', None)
+        if conexao is None:
+            diretorio = os.path.dirname(self.caminho)
+            if diretorio:
+                os.makedirs(diretorio, exist_ok=True)
+            conexao = sqlite3.connect(self.caminho, timeout=5)
+            # WAL permite leituras enquanto outro processo grava
+            conexao.execute('PRAGMA journal_mode=WAL')
+            conexao.execute(
+                'CREATE TABLE IF NOT EXISTS ceps ('
+                'cep INTEGER PRIMARY KEY, estado TEXT, cidade TEXT, '
+                'bairro TEXT, rua TEXT) WITHOUT ROWID'
+            )
+            self._local.conexao = conexao
+        return conexao
+
+    def buscar(self, cep):
+        """Retorna o endereço do CEP (8 dígitos) ou None"""
+        linha = self._conexao().execute(
+            'SELECT cep, estado, cidade, bairro, rua FROM ceps WHERE cep = ?',
+            (int(cep),)
+        ).fetchone()
+        if linha is None:
+            return None
+
+        endereco = dict(zip(self.CAMPOS, linha))
+        endereco['cep'] = f"{linha[0]:08d}"
+        return endereco
+
+    @staticmethod
+    def _linhas(registros):
+        return [
+            (
+                int(registro['cep']),
+                registro['estado'],
+                registro['cidade'],
+                registro['bairro'],
+                registro['rua'],
+            )
+            for registro in registros
+            if len(registro['cep']) == 8
+        ]
+
+    @staticmethod
+    def _gravar(conexao, linhas):
+        conexao.executemany(
+            'INSERT OR REPLACE INTO ceps '
+            '(cep, estado, cidade, bairro, rua) VALUES (?, ?, ?, ?, ?)',
+            linhas
+        )
+
+    def inserir(self, registros):
+        """Insere ou atualiza registros já normalizados; retorna o total"""
+        linhas = self._linhas(registros)
+        conexao = self._conexao()
+        with conexao:
+            self._gravar(conexao, linhas)
+        return len(linhas)
+
+    def importar(self, registros, limpar=False, lote=10000):
+        """
+        Grava os registros (iterável de registros normalizados) em uma
+        única transação; retorna o total
+
+        Com limpar=True o índice é esvaziado na mesma transação. Qualquer
+        erro durante a leitura desfaz tudo e o índice anterior continua
+        valendo; leitores (WAL) só enxergam a base nova após o commit.
+        """
+        conexao = self._conexao()
+        total = 0
+        with conexao:
+            if limpar:
+                conexao.execute('DELETE FROM ceps')
+            pendentes = []
+            for registro in registros:
+                pendentes.append(registro)
+                if len(pendentes) >= lote:
+                    linhas = self._linhas(pendentes)
+                    self._gravar(conexao, linhas)
+                    total += len(linhas)
+                    pendentes = []
+            linhas = self._linhas(pendentes)
+            self._gravar(conexao, linhas)
+            total += len(linhas)
+        return total
+
+    def limpar(self):
+        conexao = self._conexao()
+        with conexao:
+            conexao.execute('DELETE FROM ceps')
+
+    def contar(self):
+        return self._conexao().execute('SELECT COUNT(*) FROM ceps').fetchone()[0]
+
+
+class CacheLRU:
+    """Cache em memória com limite de itens (LRU) e expiração por item"""
+
+    def __init__(self, tamanho_maximo):
+        self.tamanho_maximo = tamanho_maximo
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obter(self, chave):
+        """Retorna (encontrado, valor)"""
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None:
+                return False, None
+            valor, expira_em = item
+            if expira_em <= time.monotonic():
+                del self._itens[chave]
+                return False, None
+            self._itens.move_to_end(chave)
+            return True, valor
+
+    def salvar(self, chave, valor, ttl):
+        with self._lock:
+            self._itens[chave] = (valor, time.monotonic() + ttl)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.tamanho_maximo:
+                self._itens.popitem(last=False)
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+
+
+class DisjuntorCircuito:
+    """
+    Circuit breaker simples: após N falhas seguidas o circuito abre e as
+    chamadas falham na hora, sem rede, até passar o tempo de reabertura.
+    Depois disso uma chamada de teste é liberada (meio-aberto).
+    """
+
+    def __init__(self, limite_falhas, tempo_reabertura):
+        self.limite_falhas = limite_falhas
+        self.tempo_reabertura = tempo_reabertura
+        self._falhas = 0
+        self._aberto_ate = 0.0
+        self._lock = threading.Lock()
+
+    def permitir(self):
+        with self._lock:
+            if self._falhas < self.limite_falhas:
+                return True
+            if time.monotonic() >= self._aberto_ate:
+                # Meio-aberto: libera uma tentativa e reabre se falhar
+                self._aberto_ate = time.monotonic() + self.tempo_reabertura
+                return True
+            return False
+
+    def registrar_sucesso(self):
+        with self._lock:
+            self._falhas = 0
+            self._aberto_ate = 0.0
+
+    def registrar_falha(self):
+        with self._lock:
+            self._falhas += 1
+            if self._falhas >= self.limite_falhas:
+                self._aberto_ate = time.monotonic() + self.tempo_reabertura
+
+    @property
+    def aberto(self):
+        with self._lock:
+            return (
+                self._falhas >= self.limite_falhas
+                and time.monotonic() < self._aberto_ate
+            )
+
+
+class ClienteViaCEP:
+    """
+    Cliente da ViaCEP com conexões reaproveitadas e respostas memoizadas
+
+    As respostas (inclusive "CEP não encontrado") ficam em um LRU do
+    processo e no Redis (CACHES['default']) com TTL. As chamadas têm
+    timeouts curtos e passam por um circuit breaker para que uma
+    instabilidade da ViaCEP não segure os workers.
+    """
+    URL = 'https://viacep.com.br/ws/{cep}/json/'
+    PREFIXO = 'viacep'
+    NAO_ENCONTRADO = 'nao_encontrado'
+
+    def __init__(self):
+        self.timeout = (
+            settings.CEP_TIMEOUT_CONEXAO,
+            settings.CEP_TIMEOUT_LEITURA
+        )
+        self.ttl = settings.CEP_CACHE_TTL
+        self.ttl_negativo = settings.CEP_CACHE_TTL_NEGATIVO
+        self.lru = CacheLRU(settings.CEP_CACHE_LRU_TAMANHO)
+        self.disjuntor = DisjuntorCircuito(
+            settings.CEP_CIRCUITO_FALHAS,
+            settings.CEP_CIRCUITO_REABERTURA
+        )
+
+        self.sessao = requests.Session()
+        adaptador = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=settings.CEP_POOL_CONEXOES
+        )
+        self.sessao.mount('https://', adaptador)
+
+    def consultar(self, cep):
+        """
+        Retorna o endereço normalizado ou None se o CEP não existir.
+        Falhas de rede (ou circuito aberto) levantam CEPIndisponivel.
+        """
+        encontrado, endereco = self.lru.obter(cep)
+        if encontrado:
+            return endereco
+
+        try:
+            valor = cache.get(f'{self.PREFIXO}:{cep}')
+        except Exception as e:
+            logger.warning('Erro ao ler cache da ViaCEP: %s', e)
+            valor = None
+
+        if valor is not None:
+            endereco = None if valor == self.NAO_ENCONTRADO else valor
+            ttl = self.ttl if endereco else self.ttl_negativo
+            self.lru.salvar(cep, endereco, ttl)
+            return endereco
+
+        endereco = self._requisitar(cep)
+        self._memorizar(cep, endereco)
+        return endereco
+
+    def _requisitar(self, cep):
+        if not self.disjuntor.permitir():
+            raise CEPIndisponivel('Consulta à ViaCEP suspensa (circuito aberto)')
+
+        try:
+            response = self.sessao.get(
+                self.URL.format(cep=cep), timeout=self.timeout
+            )
+            # 400 = CEP mal formatado. Qualquer outro status diferente de
+            # 200 (429, 403, 5xx...) é indisponibilidade: não pode virar
+            # "CEP inexistente" no cache negativo
+            if response.status_code not in (200, 400):
+                raise CEPIndisponivel(
+                    f'ViaCEP respondeu com status {response.status_code}'
+                )
+            data = response.json() if response.status_code == 200 else None
+        except (requests.exceptions.RequestException, ValueError) as e:
+            self.disjuntor.registrar_falha()
+            raise CEPIndisponivel(str(e)) from e
+        except CEPIndisponivel:
+            self.disjuntor.registrar_falha()
+            raise
+
+        self.disjuntor.registrar_sucesso()
+
+        # 400 ou {"erro": true} = CEP inexistente
+        if not data or data.get('erro'):
+            return None
+        return normalizar_registro(data)
+
+    def _memorizar(self, cep, endereco):
+        ttl = self.ttl if endereco else self.ttl_negativo
+        self.lru.salvar(cep, endereco, ttl)
+        try:
+            cache.set(
+                f'{self.PREFIXO}:{cep}',
+                endereco or self.NAO_ENCONTRADO,
+                timeout=ttl
+            )
+        except Exception as e:
+            logger.warning('Erro ao gravar cache da ViaCEP: %s', e)
+
+
+def buscar_cep(cep):
+    """
+    Busca o CEP no índice local e, se habilitado, na ViaCEP
+
+    Resultados obtidos da ViaCEP são gravados no índice, então a próxima
+    consulta do mesmo CEP não acessa a rede.
+    """
+    endereco = indice_cep.buscar(cep)
+    if endereco is not None or not settings.CEP_FALLBACK_VIACEP:
+        return endereco
+
+    endereco = cliente_viacep.consultar(cep)
+    if endereco is not None:
+        try:
+            indice_cep.inserir([endereco])
+        except sqlite3.Error as e:
+            logger.warning('Não foi possível gravar o CEP %s no índice: %s', cep, e)
+    return endereco
+
+
+indice_cep = IndiceCEP(settings.CEP_INDICE_ARQUIVO)
+cliente_viacep = ClienteViaCEP()
@@ -0,0 +1,165 @@
+import logging
+from collections import defaultdict, namedtuple
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Count, Q
+
+from . import estados_coleta
+from .models import (Coletas, MateriaisParceiros, Parceiros,
+                     ResumoAvaliacoes)
+from .rotas import distancias_entre
+
+logger = logging.getLogger(__name__)
+
+Atribuicao = namedtuple(
+    'Atribuicao', ['coleta_id', 'parceiro_id', 'distancia_km', 'custo']
+)
+
+
+def _coletas_para_despacho(lote):
+    """Coletas pendentes, sem parceiro e com coordenadas, mais antigas primeiro"""
+    return list(Coletas.objects.filter(
+        id_solicitacoes__estado_solicitacao='pendente',
+        id_parceiros__isnull=True,
+        id_enderecos__latitude__isnull=False,
+        id_enderecos__longitude__isnull=False
+    ).select_related(
+        'id_enderecos', 'id_solicitacoes'
+    ).order_by('criado_em', 'id')[:lote])
+
+
+def _parceiros_elegiveis(materiais):
+    """
+    Parceiros que trabalham com algum dos materiais e têm endereço com
+    coordenadas, com a carga atual (coletas aceitas e ainda não
+    coletadas) anotada em carga
+    """
+    ids = MateriaisParceiros.objects.filter(
+        id_materiais__in=materiais
+    ).values_list('id_parceiros', flat=True)
+
+    return list(Parceiros.objects.filter(
+        id__in=ids,
+        id_usuarios__id_endereco__latitude__isnull=False,
+        id_usuarios__id_endereco__longitude__isnull=False
+    ).select_related('id_usuarios__id_endereco').annotate(
+        carga=Count(
+            'coletas',
+            filter=Q(coletas__id_solicitacoes__estado_solicitacao='aceitado')
+        )
+    ).order_by('id'))
+
+
+def _medias_avaliacao(parceiro_ids):
+    medias = {}
+    for resumo in ResumoAvaliacoes.objects.filter(
+        tipo='parceiro', referencia_id__in=parceiro_ids, total_avaliacoes__gt=0
+    ):
+        medias[resumo.referencia_id] = resumo.soma_notas / resumo.total_avaliacoes
+    return medias
+
+
+def planejar(lote=None, raio_km=None):
+    """
+    Calcula as atribuições coleta -> parceiro, sem gravar nada
+
+    Custo de cada par = distância (km) * DESPACHO_PESO_DISTANCIA
+    + carga do parceiro * DESPACHO_PESO_CARGA
+    + (5 - média das avaliações) * DESPACHO_PESO_AVALIACAO.
+    Pares inviáveis (material que o parceiro não atende, além do raio
+    ou parceiro na capacidade máxima) ficam com custo infinito.
+
+    A matriz de custos é montada com NumPy e resolvida de forma gulosa:
+    o par mais barato é atribuído, a coleta sai da matriz e a coluna do
+    parceiro fica mais cara pela carga adicional.
+    """
+    lote = lote or settings.DESPACHO_LOTE
+    raio_km = raio_km or settings.DESPACHO_RAIO_MAXIMO_KM
+    capacidade = settings.DESPACHO_CAPACIDADE_PARCEIRO
+
+    coletas = _coletas_para_despacho(lote)
+    if not coletas:
+        return []
+
+    parceiros = _parceiros_elegiveis({c.id_materiais_id for c in coletas})
+    if not parceiros:
+        return []
+
+    indice_parceiro = {p.id: j for j, p in enumerate(parceiros)}
+    atende = np.zeros((len(coletas), len(parceiros)), dtype=bool)
+    por_material = defaultdict(list)
+    for material_id, parceiro_id in MateriaisParceiros.objects.filter(
+        id_materiais__in={c.id_materiais_id for c in coletas},
+        id_parceiros__in=indice_parceiro
+    ).values_list('id_materiais', 'id_parceiros'):
+        por_material[material_id].append(indice_parceiro[parceiro_id])
+    for i, coleta in enumerate(coletas):
+        atende[i, por_material[coleta.id_materiais_id]] = True
+
+    distancias = distancias_entre(
+        [(c.id_enderecos.latitude, c.id_enderecos.longitude) for c in coletas],
+        [
+            (p.id_usuarios.id_endereco.latitude, p.id_usuarios.id_endereco.longitude)
+            for p in parceiros
+        ]
+    )
+
+    medias = _medias_avaliacao(list(indice_parceiro))
+    nota = np.array([
+        medias.get(p.id, settings.DESPACHO_NOTA_PADRAO) for p in parceiros
+    ])
+    carga = np.array([p.carga for p in parceiros], dtype=float)
+
+    custo_fixo = (
+        distancias * settings.DESPACHO_PESO_DISTANCIA
+        + (5 - nota) * settings.DESPACHO_PESO_AVALIACAO
+    )
+    custo_fixo[~atende | (distancias > raio_km)] = np.inf
+
+    atribuicoes = []
+    while True:
+        livre = carga < capacidade
+        custo = np.where(
+            livre, custo_fixo + carga * settings.DESPACHO_PESO_CARGA, np.inf
+        )
+        i, j = np.unravel_index(np.argmin(custo), custo.shape)
+        if not np.isfinite(custo[i, j]):
+            break
+
+        atribuicoes.append(Atribuicao(
+            coletas[i].id, parceiros[j].id,
+            round(float(distancias[i, j]), 2), round(float(custo[i, j]), 2)
+        ))
+        custo_fixo[i, :] = np.inf
+        carga[j] += 1
+
+    return atribuicoes
+
+
+def despachar(lote=None, raio_km=None, simular=False):
+    """
+    Planeja e aplica as atribuições pelo mesmo caminho de aceitar-coleta
+
+    Coletas que mudaram de estado desde o planejamento são ignoradas.
+    Retorna (atribuições aplicadas, quantidade ignorada).
+    """
+    atribuicoes = planejar(lote, raio_km)
+    if simular or not atribuicoes:
+        return atribuicoes, 0
+
+    aplicadas = []
+    ignoradas = 0
+    for atribuicao in atribuicoes:
+        try:
+            estados_coleta.aceitar_coleta(
+                atribuicao.coleta_id, atribuicao.parceiro_id
+            )
+        except estados_coleta.TransicaoInvalida as e:
+            logger.info('Coleta %s não despachada: %s', atribuicao.coleta_id, e)
+            ignoradas += 1
+            continue
+        aplicadas.append(atribuicao)
+
+    logger.info('Despacho: %d coletas atribuídas, %d ignoradas', len(aplicadas), ignoradas)
+    return aplicadas, ignoradas
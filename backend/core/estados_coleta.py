@@ -0,0 +1,264 @@
+from collections import namedtuple
+
+from django.db import transaction
+from django.db.models import Subquery
+from django.utils import timezone
+
+from . import eventos, resumo_avaliacoes
+from .cache_respostas import invalidar
+from .indice_espacial import indice_pendentes
+from .models import (Avaliacoes, Coletas, MateriaisParceiros, Pagamentos,
+                     Solicitacoes)
+
+
+class TransicaoInvalida(Exception):
+    """A coleta não está em um estado que permita a operação"""
+
+
+class ColetaNaoEncontrada(TransicaoInvalida):
+    pass
+
+
+def _id_coleta(coleta_id):
+    """Id vindo da URL; um id não numérico é uma coleta que não existe"""
+    try:
+        return int(coleta_id)
+    except (TypeError, ValueError):
+        raise ColetaNaoEncontrada('Coleta não encontrada')
+
+
+# Estados seguintes permitidos a partir de cada estado
+TRANSICOES_SOLICITACAO = {
+    'pendente': {'aceitado', 'cancelado'},
+    'aceitado': {'coletado'},
+    'coletado': {'finalizado'},
+    'cancelado': set(),
+    'finalizado': set(),
+}
+TRANSICOES_PAGAMENTO = {
+    'pendente': {'pago', 'cancelado'},
+    'pago': set(),
+    'cancelado': set(),
+}
+
+# Cada ação leva a solicitação e, opcionalmente, o pagamento de um
+# estado (origem) para outro (destino)
+Transicao = namedtuple('Transicao', ['solicitacao', 'pagamento', 'mensagem'])
+
+ACOES = {
+    'aceitar': Transicao(
+        ('pendente', 'aceitado'), None,
+        'Esta coleta não está mais disponível'
+    ),
+    'marcar_coletado': Transicao(
+        ('aceitado', 'coletado'), None,
+        'Esta coleta não pode ser marcada como coletada'
+    ),
+    'cancelar': Transicao(
+        ('pendente', 'cancelado'), ('pendente', 'cancelado'),
+        'Esta coleta só pode ser cancelada se estiver com pagamento pendente e solicitação pendente'
+    ),
+    'finalizar': Transicao(
+        ('coletado', 'finalizado'), ('pendente', 'pago'),
+        'Esta coleta só pode ser finalizada se estiver com pagamento pendente e solicitação coletado'
+    ),
+}
+
+# A tabela de ações precisa respeitar as transições permitidas
+for _acao in ACOES.values():
+    assert _acao.solicitacao[1] in TRANSICOES_SOLICITACAO[_acao.solicitacao[0]]
+    assert not _acao.pagamento or _acao.pagamento[1] in TRANSICOES_PAGAMENTO[_acao.pagamento[0]]
+
+
+def transicionar(acao, coleta_ids, parceiro_id=None):
+    """
+    Aplica a ação a várias coletas em uma única transação
+
+    As coletas são lidas e travadas (SELECT ... FOR UPDATE) em uma
+    consulta; as que estão no estado de origem passam para o destino com
+    um UPDATE por tabela, ainda condicionado ao estado de origem. Com
+    parceiro_id apenas coletas desse parceiro (id de Parceiros) são
+    alteradas. Retorna (ids alterados, {id: motivo} dos recusados).
+    """
+    if acao == 'aceitar':
+        return _aceitar_varias(coleta_ids, parceiro_id)
+
+    transicao = ACOES[acao]
+    coleta_ids = list(dict.fromkeys(int(i) for i in coleta_ids))
+    agora = timezone.now()
+
+    with transaction.atomic():
+        coletas = Coletas.objects.filter(id__in=coleta_ids).select_related(
+            'id_solicitacoes', 'id_pagamentos'
+        ).select_for_update(of=('self', 'id_solicitacoes', 'id_pagamentos'))
+        coletas = {coleta.id: coleta for coleta in coletas}
+
+        recusadas = {}
+        aptas = []
+        for coleta_id in coleta_ids:
+            coleta = coletas.get(coleta_id)
+            if coleta is None:
+                recusadas[coleta_id] = 'Coleta não encontrada'
+            elif parceiro_id is not None and coleta.id_parceiros_id != parceiro_id:
+                recusadas[coleta_id] = 'Esta coleta não pertence a este parceiro'
+            elif not _no_estado_de_origem(coleta, transicao):
+                recusadas[coleta_id] = transicao.mensagem
+            else:
+                aptas.append(coleta)
+
+        if aptas:
+            _aplicar(acao, transicao, aptas, agora)
+
+    return [coleta.id for coleta in aptas], recusadas
+
+
+def transicionar_uma(acao, coleta_id, parceiro_id=None):
+    """transicionar() para uma coleta, levantando TransicaoInvalida"""
+    coleta_id = _id_coleta(coleta_id)
+    alteradas, recusadas = transicionar(acao, [coleta_id], parceiro_id)
+    if alteradas:
+        return
+    motivo = recusadas[coleta_id]
+    if motivo == 'Coleta não encontrada':
+        raise ColetaNaoEncontrada(motivo)
+    raise TransicaoInvalida(motivo)
+
+
+def _no_estado_de_origem(coleta, transicao):
+    if coleta.id_solicitacoes.estado_solicitacao != transicao.solicitacao[0]:
+        return False
+    return (
+        transicao.pagamento is None
+        or coleta.id_pagamentos.estado_pagamento == transicao.pagamento[0]
+    )
+
+
+def _aplicar(acao, transicao, coletas, agora):
+    origem, destino = transicao.solicitacao
+    campos = {'estado_solicitacao': destino, 'atualizado_em': agora}
+    if destino == 'finalizado':
+        campos['finalizado_em'] = agora
+    Solicitacoes.objects.filter(
+        id__in=[coleta.id_solicitacoes_id for coleta in coletas],
+        estado_solicitacao=origem
+    ).update(**campos)
+
+    if transicao.pagamento:
+        origem, destino = transicao.pagamento
+        Pagamentos.objects.filter(
+            id__in=[coleta.id_pagamentos_id for coleta in coletas],
+            estado_pagamento=origem
+        ).update(estado_pagamento=destino, atualizado_em=agora)
+
+    invalidar(Solicitacoes, Pagamentos)
+
+    if acao == 'cancelar':
+        for coleta in coletas:
+            indice_pendentes.publicar_remocao(
+                coleta.id, eventos.CANCELADA, coleta.id_materiais_id
+            )
+    elif acao == 'finalizar':
+        _criar_avaliacoes(coletas)
+
+
+def _criar_avaliacoes(coletas):
+    """Cria o registro de avaliação (notas 0) das coletas finalizadas"""
+    # Verificar se já não existe (por segurança)
+    existentes = set(Avaliacoes.objects.filter(
+        id_coletas__in=[coleta.id for coleta in coletas]
+    ).values_list('id_coletas', flat=True))
+
+    avaliacoes = Avaliacoes.objects.bulk_create([
+        Avaliacoes(
+            id_coletas_id=coleta.id,
+            id_clientes_id=coleta.id_clientes_id,
+            id_parceiros_id=coleta.id_parceiros_id,
+            nota_parceiros=0,  # Valor padrão até cliente avaliar
+            nota_clientes=0,   # Valor padrão até parceiro avaliar
+            descricao_parceiros='',
+            descricao_clientes=''
+        )
+        for coleta in coletas
+        if coleta.id not in existentes
+    ])
+    invalidar(Avaliacoes)
+    resumo_avaliacoes.registrar_finalizacoes(coletas, avaliacoes)
+
+
+def _aceitar_varias(coleta_ids, parceiro_id):
+    if parceiro_id is None:
+        raise ValueError('aceitar exige parceiro_id')
+
+    alteradas = []
+    recusadas = {}
+    with transaction.atomic():
+        for coleta_id in dict.fromkeys(int(i) for i in coleta_ids):
+            try:
+                aceitar_coleta(coleta_id, parceiro_id)
+            except TransicaoInvalida as e:
+                recusadas[coleta_id] = str(e)
+            else:
+                alteradas.append(coleta_id)
+    return alteradas, recusadas
+
+
+def aceitar_coleta(coleta_id, parceiro_id):
+    """
+    Atribui uma coleta pendente ao parceiro (id de Parceiros)
+
+    A coleta é reivindicada com um UPDATE condicional (WHERE
+    id_parceiros IS NULL e material atendido pelo parceiro); só uma
+    transação concorrente consegue fazer essa troca. Em seguida a
+    solicitação passa de 'pendente' para 'aceitado', também com UPDATE
+    condicional. Se qualquer um dos dois não alterar nenhuma linha tudo
+    é desfeito e TransicaoInvalida é levantada com o motivo.
+
+    Usado pela ação aceitar-coleta e pelo despacho automático.
+    """
+    coleta_id = _id_coleta(coleta_id)
+    agora = timezone.now()
+    with transaction.atomic():
+        reivindicada = Coletas.objects.filter(
+            id=coleta_id,
+            id_parceiros__isnull=True,
+            id_materiais__in=MateriaisParceiros.objects.filter(
+                id_parceiros=parceiro_id
+            ).values('id_materiais')
+        ).update(id_parceiros=parceiro_id, atualizado_em=agora)
+
+        if reivindicada:
+            aceita = Solicitacoes.objects.filter(
+                id=Subquery(
+                    Coletas.objects.filter(id=coleta_id).values('id_solicitacoes')
+                ),
+                estado_solicitacao='pendente'
+            ).update(estado_solicitacao='aceitado', atualizado_em=agora)
+            if aceita:
+                invalidar(Coletas, Solicitacoes)
+                indice_pendentes.publicar_remocao(coleta_id, eventos.ACEITA)
+                return
+
+        # Desfaz a reivindicação (se houve) antes de descobrir o motivo
+        transaction.set_rollback(True)
+
+    raise _motivo_recusa(coleta_id, parceiro_id)
+
+
+def _motivo_recusa(coleta_id, parceiro_id):
+    """Consulta a coleta apenas no caminho de erro, para a mensagem"""
+    coleta = Coletas.objects.select_related('id_solicitacoes').filter(
+        id=coleta_id
+    ).first()
+    if coleta is None:
+        return ColetaNaoEncontrada('Coleta não encontrada')
+
+    # Verificar se a coleta ainda está pendente
+    if coleta.id_solicitacoes.estado_solicitacao != 'pendente':
+        return TransicaoInvalida('Esta coleta não está mais disponível')
+
+    # Verificar se já não foi aceita por outro parceiro
+    if coleta.id_parceiros_id:
+        return TransicaoInvalida('Esta coleta já foi aceita por outro parceiro')
+
+    # Restou o material que o parceiro não atende
+    return TransicaoInvalida('Você não trabalha com este tipo de material')
@@ -0,0 +1,193 @@
+import asyncio
+import contextlib
+import json
+import logging
+import threading
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+logger = logging.getLogger(__name__)
+
+# Tipos de evento enviados aos parceiros
+NOVA = 'nova'
+ACEITA = 'aceita'
+CANCELADA = 'cancelada'
+
+
+def criar_evento(tipo, coleta_id, id_materiais=None, dados=None):
+    """
+    Evento de alteração nas coletas pendentes. id_materiais = None
+    entrega o evento a todos os parceiros (ex.: aceite, em que o
+    material não é lido para não custar uma consulta).
+    """
+    return {
+        'tipo': tipo,
+        'coleta_id': coleta_id,
+        'id_materiais': id_materiais,
+        'dados': dados,
+    }
+
+
+class BrokerMemoria:
+    """
+    Distribui os eventos para as conexões abertas neste processo
+
+    Cada assinante recebe uma asyncio.Queue; publicar() pode ser chamado
+    de qualquer thread. Sozinho serve para testes e para rodar com um
+    único processo; BrokerRedis o usa para a entrega local.
+    """
+
+    def __init__(self, tamanho_fila):
+        self.tamanho_fila = tamanho_fila
+        self._lock = threading.Lock()
+        self._assinantes = set()
+
+    def publicar(self, evento):
+        self._distribuir(evento)
+
+    def _distribuir(self, evento):
+        with self._lock:
+            assinantes = list(self._assinantes)
+        for loop, fila in assinantes:
+            try:
+                loop.call_soon_threadsafe(self._entregar, fila, evento)
+            except RuntimeError:
+                # Loop encerrado sem cancelar a assinatura
+                with self._lock:
+                    self._assinantes.discard((loop, fila))
+
+    @staticmethod
+    def _entregar(fila, evento):
+        try:
+            fila.put_nowait(evento)
+        except asyncio.QueueFull:
+            logger.warning('Fila de eventos cheia, evento %s descartado', evento['tipo'])
+
+    @property
+    def total_assinantes(self):
+        with self._lock:
+            return len(self._assinantes)
+
+    @contextlib.asynccontextmanager
+    async def assinar(self):
+        """Fila com os eventos publicados enquanto o contexto estiver aberto"""
+        assinante = (asyncio.get_running_loop(), asyncio.Queue(self.tamanho_fila))
+        with self._lock:
+            self._assinantes.add(assinante)
+        try:
+            yield assinante[1]
+        finally:
+            with self._lock:
+                self._assinantes.discard(assinante)
+
+
+class BrokerRedis(BrokerMemoria):
+    """
+    Eventos trafegam por um canal pub/sub do Redis, então chegam às
+    conexões de todos os processos. Cada processo mantém uma única
+    assinatura no Redis, aberta enquanto houver conexões, e reparte os
+    eventos localmente.
+    """
+
+    def __init__(self, url, senha, canal, tamanho_fila):
+        super().__init__(tamanho_fila)
+        self.url = url
+        self.senha = senha
+        self.canal = canal
+        self._cliente = None
+        self._ouvinte = None
+
+    def publicar(self, evento):
+        import redis
+
+        if self._cliente is None:
+            # Timeouts curtos: publicar acontece dentro das requisições
+            self._cliente = redis.Redis.from_url(
+                self.url, password=self.senha,
+                socket_connect_timeout=2, socket_timeout=2
+            )
+        self._cliente.publish(self.canal, json.dumps(evento, cls=DjangoJSONEncoder))
+
+    @contextlib.asynccontextmanager
+    async def assinar(self):
+        if self._ouvinte is None or self._ouvinte.done():
+            self._ouvinte = asyncio.create_task(self._ouvir())
+        try:
+            async with super().assinar() as fila:
+                yield fila
+        finally:
+            if not self.total_assinantes and self._ouvinte is not None:
+                self._ouvinte.cancel()
+                self._ouvinte = None
+
+    async def _ouvir(self):
+        import redis.asyncio
+
+        while True:
+            cliente = redis.asyncio.Redis.from_url(self.url, password=self.senha)
+            pubsub = cliente.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self.canal)
+                async for mensagem in pubsub.listen():
+                    self._distribuir(json.loads(mensagem['data']))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning('Assinatura de eventos no Redis interrompida: %s', e)
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
+                await cliente.aclose()
+
+
+def _criar_broker():
+    if settings.EVENTOS_BACKEND == 'memoria':
+        return BrokerMemoria(settings.EVENTOS_TAMANHO_FILA)
+    return BrokerRedis(
+        settings.EVENTOS_REDIS_URL,
+        settings.EVENTOS_REDIS_SENHA,
+        settings.EVENTOS_CANAL,
+        settings.EVENTOS_TAMANHO_FILA,
+    )
+
+
+broker = _criar_broker()
+
+
+def publicar(tipo, coleta_id, id_materiais=None, dados=None):
+    """Publica o evento; falhas são registradas e não interrompem a operação"""
+    try:
+        broker.publicar(criar_evento(tipo, coleta_id, id_materiais, dados))
+    except Exception as e:
+        logger.warning('Erro ao publicar evento de coleta %s: %s', coleta_id, e)
+
+
+def formatar_sse(evento):
+    dados = json.dumps(
+        {'coleta_id': evento['coleta_id'], 'coleta': evento['dados']},
+        cls=DjangoJSONEncoder
+    )
+    return f"event: {evento['tipo']}\ndata: {dados}\n\n"
+
+
+async def transmitir(materiais):
+    """
+    Fluxo Server-Sent Events com os eventos dos materiais informados
+
+    Um comentário é enviado a cada EVENTOS_INTERVALO_PING segundos sem
+    eventos para manter a conexão aberta através de proxies.
+    """
+    yield f'retry: {settings.EVENTOS_RECONEXAO_MS}\n\n'
+    async with broker.assinar() as fila:
+        while True:
+            try:
+                evento = await asyncio.wait_for(
+                    fila.get(), timeout=settings.EVENTOS_INTERVALO_PING
+                )
+            except asyncio.TimeoutError:
+                yield ': ping\n\n'
+                continue
+
+            if evento['id_materiais'] is None or evento['id_materiais'] in materiais:
+                yield formatar_sse(evento)
@@ -0,0 +1,52 @@
+"""
+Executor de testes do projeto (TEST_RUNNER em settings.py)
+
+As tabelas do core não são gerenciadas pelo Django (managed = False): em
+produção elas já existem e as migrações do app só aplicam SQL do Postgres
+sobre elas. No banco de testes os modelos passam a ser gerenciados e o app
+é criado direto dos modelos, sem as migrações. Cache e eventos ficam em
+memória, para os testes não dependerem do Redis.
+"""
+from pathlib import Path
+
+from django.apps import apps
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+# Pasta do manage.py. Como ela também tem __init__.py, sem isso o unittest
+# subiria até a raiz do repositório e importaria backend.core.tests
+DIRETORIO_PROJETO = Path(__file__).resolve().parent.parent
+
+
+class ExecutorTestes(DiscoverRunner):
+
+    def __init__(self, top_level=None, **kwargs):
+        super().__init__(top_level=top_level or str(DIRETORIO_PROJETO), **kwargs)
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+
+        self._nao_gerenciados = [
+            modelo
+            for modelo in apps.get_app_config('core').get_models(include_auto_created=True)
+            if not modelo._meta.managed
+        ]
+        for modelo in self._nao_gerenciados:
+            modelo._meta.managed = True
+
+        self._configuracoes = override_settings(
+            MIGRATION_MODULES={'core': None},
+            CACHES={
+                'default': {
+                    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                }
+            },
+            EVENTOS_BACKEND='memoria',
+        )
+        self._configuracoes.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._configuracoes.disable()
+        for modelo in self._nao_gerenciados:
+            modelo._meta.managed = False
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,133 @@
+import math
+
+from django.conf import settings
+from django.db.models import F, FloatField, Q
+from django.db.models.functions import ASin, Cos, Least, Power, Radians, Sin, Sqrt
+from rest_framework.exceptions import ValidationError
+
+RAIO_TERRA_KM = 6371.0088
+KM_POR_GRAU_LATITUDE = 111.32
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Distância em km entre dois pontos (graus decimais)"""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * RAIO_TERRA_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def caixa_delimitadora(lat, lon, raio_km):
+    """
+    Retorna (lat_min, lat_max, lon_min, lon_max) do quadrado que contém o
+    círculo de raio_km em volta do ponto
+
+    É usada como pré-filtro nas colunas indexadas de latitude/longitude;
+    a distância exata é calculada apenas para quem está dentro da caixa.
+    """
+    delta_lat = raio_km / KM_POR_GRAU_LATITUDE
+    lat_min = max(-90.0, lat - delta_lat)
+    lat_max = min(90.0, lat + delta_lat)
+
+    # Perto dos polos a caixa cobre todas as longitudes
+    cos_lat = math.cos(math.radians(max(abs(lat_min), abs(lat_max))))
+    if cos_lat <= 1e-6:
+        return lat_min, lat_max, -180.0, 180.0
+    delta_lon = min(180.0, raio_km / (KM_POR_GRAU_LATITUDE * cos_lat))
+    return lat_min, lat_max, lon - delta_lon, lon + delta_lon
+
+
+def distancia_km(lat, lon, campo_latitude, campo_longitude):
+    """Expressão de banco com a distância haversine até (lat, lon) em km"""
+    lat_origem = math.radians(lat)
+    lon_origem = math.radians(lon)
+    lat_destino = Radians(F(campo_latitude))
+    lon_destino = Radians(F(campo_longitude))
+
+    a = (
+        Power(Sin((lat_destino - lat_origem) / 2), 2)
+        + math.cos(lat_origem) * Cos(lat_destino)
+        * Power(Sin((lon_destino - lon_origem) / 2), 2)
+    )
+    # Least evita erro de domínio no ASIN por arredondamento
+    return 2 * RAIO_TERRA_KM * ASin(
+        Least(Sqrt(a), 1.0, output_field=FloatField()),
+        output_field=FloatField()
+    )
+
+
+def filtrar_por_raio(queryset, lat, lon, raio_km, prefixo=''):
+    """
+    Filtra o queryset pelos registros a até raio_km de (lat, lon),
+    anota distancia_km e ordena do mais próximo para o mais distante
+
+    prefixo é o caminho até o Enderecos (ex.: 'id_enderecos__').
+    Endereços sem coordenadas ficam de fora.
+    """
+    campo_latitude = f'{prefixo}latitude'
+    campo_longitude = f'{prefixo}longitude'
+    lat_min, lat_max, lon_min, lon_max = caixa_delimitadora(lat, lon, raio_km)
+
+    caixa = Q(**{
+        f'{campo_latitude}__range': (lat_min, lat_max),
+        f'{campo_longitude}__range': (max(lon_min, -180.0), min(lon_max, 180.0)),
+    })
+    # Caixa atravessando o antimeridiano: completa com o outro lado
+    if lon_min < -180.0:
+        caixa |= Q(**{
+            f'{campo_latitude}__range': (lat_min, lat_max),
+            f'{campo_longitude}__gte': lon_min + 360.0,
+        })
+    if lon_max > 180.0:
+        caixa |= Q(**{
+            f'{campo_latitude}__range': (lat_min, lat_max),
+            f'{campo_longitude}__lte': lon_max - 360.0,
+        })
+
+    return queryset.filter(caixa).annotate(
+        distancia_km=distancia_km(lat, lon, campo_latitude, campo_longitude)
+    ).filter(distancia_km__lte=raio_km).order_by('distancia_km', 'id')
+
+
+def ler_origem(query_params, obrigatoria=False):
+    """
+    Lê ?lat=, ?lon= e ?raio= (km) da requisição
+
+    Retorna (lat, lon, raio_km) ou None quando lat/lon não foram
+    informados e a origem não é obrigatória.
+    """
+    lat = query_params.get('lat')
+    lon = query_params.get('lon')
+    if lat in (None, '') and lon in (None, ''):
+        if obrigatoria:
+            raise ValidationError({'lat': 'Informe lat e lon'})
+        return None
+
+    try:
+        lat = float(lat)
+        lon = float(lon)
+    except (TypeError, ValueError):
+        raise ValidationError({'lat': 'lat e lon devem ser números'})
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise ValidationError({'lat': 'Coordenadas fora do intervalo válido'})
+
+    return (lat, lon, ler_raio(query_params))
+
+
+def ler_raio(query_params):
+    """Lê ?raio= (km), limitado a BUSCA_RAIO_MAXIMO_KM"""
+    raio = query_params.get('raio')
+    if raio in (None, ''):
+        return settings.BUSCA_RAIO_PADRAO_KM
+    try:
+        raio = float(raio)
+    except ValueError:
+        raise ValidationError({'raio': 'raio deve ser um número (km)'})
+    # float() aceita 'nan' e 'inf'; nan passaria pelas comparações abaixo
+    if not math.isfinite(raio):
+        raise ValidationError({'raio': 'raio deve ser um número (km)'})
+    if raio <= 0:
+        raise ValidationError({'raio': 'raio deve ser maior que zero'})
+    return min(raio, settings.BUSCA_RAIO_MAXIMO_KM)
@@ -0,0 +1,300 @@
+import hashlib
+import logging
+import random
+import re
+import threading
+import time
+import unicodedata
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import GeocodificacaoCache
+
+logger = logging.getLogger(__name__)
+
+
+class GeocodificacaoIndisponivel(Exception):
+    """Falha temporária ao consultar o Nominatim (rede, 429, 5xx...)"""
+
+
+# Campos de Enderecos que entram no texto enviado ao geocoding
+CAMPOS_ENDERECO = ('rua', 'numero', 'bairro', 'cidade', 'estado', 'cep')
+
+
+def montar_endereco_completo(endereco):
+    """Monta o texto usado no geocoding a partir de um Enderecos"""
+    return (
+        f"{endereco.rua}, {endereco.numero}, {endereco.bairro}, "
+        f"{endereco.cidade}, {endereco.estado}, {endereco.cep}"
+    )
+
+
+def normalizar_endereco(endereco_completo):
+    """
+    Normaliza o endereço para uso como chave de cache
+
+    Remove acentos, pontuação e espaços repetidos e converte para
+    minúsculas, de forma que "Rua São João, 10" e "rua sao joao 10"
+    gerem a mesma chave.
+    """
+    texto = unicodedata.normalize('NFKD', str(endereco_completo))
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    texto = texto.lower()
+
+    # CEP com ou sem hífen deve gerar a mesma chave
+    texto = re.sub(r'(\d{5})-(\d{3})', r'\1\2', texto)
+
+    # Mantém apenas letras e números, separados por um único espaço
+    texto = re.sub(r'[^a-z0-9]+', ' ', texto)
+    return ' '.join(texto.split())
+
+
+class CacheGeocodificacao:
+    """
+    Cache de coordenadas consultado antes de qualquer chamada ao Nominatim
+
+    Usa o Redis (CACHES['default']) como primeira camada e a tabela
+    geocodificacao_cache como fallback persistente. Endereços não
+    encontrados também são armazenados (cache negativo), com TTL menor.
+    """
+    PREFIXO = 'geocodificacao'
+    NAO_ENCONTRADO = 'nao_encontrado'
+
+    def __init__(self):
+        self.ttl = settings.GEOCODING_CACHE_TTL
+        self.ttl_negativo = settings.GEOCODING_CACHE_TTL_NEGATIVO
+        self.max_registros = settings.GEOCODING_CACHE_MAX_REGISTROS
+
+    @staticmethod
+    def gerar_chave(endereco_completo):
+        normalizado = normalizar_endereco(endereco_completo)
+        return hashlib.sha256(normalizado.encode('utf-8')).hexdigest()
+
+    def _chave_redis(self, chave):
+        return f'{self.PREFIXO}:{chave}'
+
+    def obter(self, endereco_completo):
+        """
+        Retorna (encontrado_no_cache, coordenadas)
+
+        coordenadas é uma tupla (latitude, longitude) ou None quando o
+        endereço já foi consultado e não existe no Nominatim.
+        """
+        chave = self.gerar_chave(endereco_completo)
+
+        try:
+            valor = cache.get(self._chave_redis(chave))
+        except Exception as e:
+            # Redis indisponível: segue para a tabela do banco
+            logger.warning('Erro ao ler cache de geocodificação: %s', e)
+            valor = None
+
+        if valor is not None:
+            if valor == self.NAO_ENCONTRADO:
+                return True, None
+            return True, tuple(valor)
+
+        registro = GeocodificacaoCache.objects.filter(
+            chave=chave,
+            expira_em__gt=timezone.now()
+        ).first()
+
+        if registro is None:
+            return False, None
+
+        coordenadas = registro.coordenadas()
+        restante = (registro.expira_em - timezone.now()).total_seconds()
+        self._salvar_redis(chave, coordenadas, int(restante))
+        return True, coordenadas
+
+    def salvar(self, endereco_completo, coordenadas):
+        """Armazena o resultado (positivo ou negativo) nas duas camadas"""
+        chave = self.gerar_chave(endereco_completo)
+        ttl = self.ttl if coordenadas else self.ttl_negativo
+
+        self._salvar_redis(chave, coordenadas, ttl)
+
+        latitude, longitude = coordenadas if coordenadas else (None, None)
+        GeocodificacaoCache.objects.update_or_create(
+            chave=chave,
+            defaults={
+                'endereco_normalizado': normalizar_endereco(
+                    endereco_completo
+                )[:255],
+                'latitude': latitude,
+                'longitude': longitude,
+                'encontrado': coordenadas is not None,
+                'expira_em': timezone.now() + timedelta(seconds=ttl),
+            }
+        )
+
+        # Limpeza ocasional para não pagar o custo em toda escrita
+        if random.random() < settings.GEOCODING_CACHE_PROBABILIDADE_LIMPEZA:
+            self.remover_expirados()
+
+    def _salvar_redis(self, chave, coordenadas, ttl):
+        if ttl <= 0:
+            return
+        valor = list(coordenadas) if coordenadas else self.NAO_ENCONTRADO
+        try:
+            cache.set(self._chave_redis(chave), valor, timeout=ttl)
+        except Exception as e:
+            logger.warning('Erro ao gravar cache de geocodificação: %s', e)
+
+    def remover_expirados(self):
+        """Remove registros vencidos e os mais antigos acima do limite"""
+        removidos, _ = GeocodificacaoCache.objects.filter(
+            expira_em__lte=timezone.now()
+        ).delete()
+
+        excedentes = GeocodificacaoCache.objects.order_by(
+            '-atualizado_em'
+        ).values_list('id', flat=True)[self.max_registros:]
+        excedentes = list(excedentes)
+        if excedentes:
+            removidos += GeocodificacaoCache.objects.filter(
+                id__in=excedentes
+            ).delete()[0]
+
+        return removidos
+
+
+cache_geocodificacao = CacheGeocodificacao()
+
+
+class LimitadorTaxa:
+    """
+    Token bucket para respeitar o limite de requisições do Nominatim
+
+    Cada chamada a aguardar() reserva um token; só há espera quando o
+    orçamento está esgotado. Subclasses definem onde o estado do bucket
+    fica guardado (memória do processo ou Redis).
+    """
+
+    def __init__(self, taxa, capacidade):
+        self.taxa = float(taxa)
+        self.capacidade = float(capacidade)
+        self._lock_metricas = threading.Lock()
+        self._metricas = {
+            'aquisicoes': 0,
+            'esperas': 0,
+            'tempo_total_espera': 0.0,
+            'maior_espera': 0.0,
+        }
+
+    def reservar(self):
+        """Reserva um token e retorna quantos segundos é preciso esperar"""
+        raise NotImplementedError
+
+    def aguardar(self):
+        espera = self.reservar()
+        self._registrar(espera)
+        if espera > 0:
+            logger.debug('Aguardando %.3fs pelo limite do Nominatim', espera)
+            time.sleep(espera)
+        return espera
+
+    def _registrar(self, espera):
+        with self._lock_metricas:
+            self._metricas['aquisicoes'] += 1
+            if espera > 0:
+                self._metricas['esperas'] += 1
+                self._metricas['tempo_total_espera'] += espera
+                self._metricas['maior_espera'] = max(
+                    self._metricas['maior_espera'], espera
+                )
+
+    def metricas(self):
+        with self._lock_metricas:
+            metricas = dict(self._metricas)
+        aquisicoes = metricas['aquisicoes']
+        metricas['espera_media'] = (
+            metricas['tempo_total_espera'] / aquisicoes if aquisicoes else 0.0
+        )
+        return metricas
+
+
+class LimitadorTaxaLocal(LimitadorTaxa):
+    """Bucket em memória, válido apenas dentro do processo (testes/dev)"""
+
+    def __init__(self, taxa, capacidade):
+        super().__init__(taxa, capacidade)
+        self._lock = threading.Lock()
+        self._tokens = self.capacidade
+        self._atualizado = time.monotonic()
+
+    def reservar(self):
+        with self._lock:
+            agora = time.monotonic()
+            self._tokens = min(
+                self.capacidade,
+                self._tokens + (agora - self._atualizado) * self.taxa
+            )
+            self._atualizado = agora
+
+            # O token é consumido mesmo com saldo negativo, assim chamadas
+            # concorrentes formam uma fila em vez de competir novamente
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.taxa
+
+
+class LimitadorTaxaRedis(LimitadorTaxa):
+    """
+    Bucket compartilhado entre todos os workers do gunicorn via Redis
+
+    O cálculo é feito em um script Lua (atômico) usando o relógio do
+    próprio Redis, para não depender do horário de cada máquina.
+    """
+    SCRIPT = """
+        local capacidade = tonumber(ARGV[1])
+        local taxa = tonumber(ARGV[2])
+        local relogio = redis.call('TIME')
+        local agora = tonumber(relogio[1]) + tonumber(relogio[2]) / 1000000
+        local estado = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+        local tokens = tonumber(estado[1]) or capacidade
+        local ts = tonumber(estado[2]) or agora
+        tokens = math.min(capacidade, tokens + (agora - ts) * taxa) - 1
+        redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', agora)
+        redis.call('EXPIRE', KEYS[1], math.ceil(capacidade / taxa) + 60)
+        if tokens >= 0 then
+            return '0'
+        end
+        return tostring(-tokens / taxa)
+    """
+
+    def __init__(self, taxa, capacidade, chave='limitador:nominatim'):
+        super().__init__(taxa, capacidade)
+        self.chave = chave
+        self._script = None
+        # Usado se o Redis cair, para nunca exceder o limite localmente
+        self._reserva_local = LimitadorTaxaLocal(taxa, capacidade)
+
+    def reservar(self):
+        try:
+            if self._script is None:
+                from django_redis import get_redis_connection
+                conexao = get_redis_connection('default')
+                self._script = conexao.register_script(self.SCRIPT)
+            espera = self._script(
+                keys=[self.chave], args=[self.capacidade, self.taxa]
+            )
+            return float(espera)
+        except Exception as e:
+            logger.warning('Limitador no Redis indisponível: %s', e)
+            return self._reserva_local.reservar()
+
+
+def criar_limitador_nominatim():
+    taxa = settings.GEOCODING_RATE_LIMIT_POR_SEGUNDO
+    capacidade = settings.GEOCODING_RATE_LIMIT_CAPACIDADE
+    if settings.GEOCODING_RATE_LIMIT_BACKEND == 'redis':
+        return LimitadorTaxaRedis(taxa, capacidade)
+    return LimitadorTaxaLocal(taxa, capacidade)
+
+
+limitador_nominatim = criar_limitador_nominatim()
@@ -0,0 +1,359 @@
+import logging
+import math
+import threading
+import time
+from collections import defaultdict, namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from . import eventos, geo
+from .models import Coletas, MateriaisParceiros, Parceiros
+from .serializers import ColetasPendentesParceiroSerializer
+
+logger = logging.getLogger(__name__)
+
+# Coleta pendente guardada no índice; dados é a resposta já serializada
+Entrada = namedtuple(
+    'Entrada', ['id', 'id_materiais', 'latitude', 'longitude', 'criado_em', 'dados']
+)
+# Item devolvido pelas buscas (distancia_km = None quando não há origem)
+ResultadoBusca = namedtuple(
+    'ResultadoBusca', ['id', 'criado_em', 'dados', 'distancia_km']
+)
+
+
+def coletas_pendentes():
+    """Coletas pendentes ainda sem parceiro (as que entram no índice)"""
+    return Coletas.objects.filter(
+        id_solicitacoes__estado_solicitacao='pendente',
+        id_parceiros__isnull=True
+    ).select_related(
+        'id_clientes__id_usuarios',
+        'id_enderecos',
+        'id_pagamentos'
+    )
+
+
+def criar_entrada(coleta):
+    dados = dict(ColetasPendentesParceiroSerializer(coleta).data)
+    dados.pop('distancia_km', None)
+    endereco = coleta.id_enderecos
+    return Entrada(
+        id=coleta.id,
+        id_materiais=coleta.id_materiais_id,
+        latitude=endereco.latitude if endereco else None,
+        longitude=endereco.longitude if endereco else None,
+        criado_em=coleta.criado_em,
+        dados=dados,
+    )
+
+
+def para_resposta(resultado):
+    """Converte um ResultadoBusca no item da resposta de pendentes-parceiro"""
+    distancia = resultado.distancia_km
+    return {
+        **resultado.dados,
+        'distancia_km': round(distancia, 2) if distancia is not None else None,
+    }
+
+
+class IndicePendentes:
+    """
+    Índice espacial, em memória, das coletas pendentes
+
+    As coletas ficam em uma grade (células de tamanho_celula graus) por
+    material, então pendentes-parceiro é respondido sem consultar o
+    banco. Cada processo tem sua cópia; as alterações são publicadas em
+    um diário no cache (CACHES['default']) com um contador de versão e
+    aplicadas pelos outros processos na próxima consulta. Se o diário
+    tiver lacunas ou o índice ficar velho demais, ele é reconstruído a
+    partir do banco (também na primeira consulta de cada processo).
+    """
+    PREFIXO = 'indice_pendentes'
+    # _publicar() incrementa a versão e só depois grava o evento: um
+    # evento ausente só é tratado como lacuna do diário (e reconstrói o
+    # índice) se continuar ausente por este tempo, em segundos
+    ESPERA_LACUNA = 2.0
+
+    def __init__(self, tamanho_celula, idade_maxima, ttl_eventos):
+        self.tamanho_celula = tamanho_celula
+        self.idade_maxima = idade_maxima
+        self.ttl_eventos = ttl_eventos
+        self._lock = threading.RLock()
+        self._entradas = {}
+        # material -> célula -> {id da coleta: Entrada}
+        self._grade = defaultdict(lambda: defaultdict(dict))
+        self._versao = None  # versão do diário já aplicada (None = vazio)
+        self._construido_em = 0.0
+        self._lacuna = None  # (versão ausente, desde quando)
+
+    @property
+    def _chave_versao(self):
+        return f'{self.PREFIXO}:versao'
+
+    def _chave_evento(self, versao):
+        return f'{self.PREFIXO}:evento:{versao}'
+
+    def _celula(self, latitude, longitude):
+        if latitude is None or longitude is None:
+            return None
+        return (
+            math.floor(latitude / self.tamanho_celula),
+            math.floor(longitude / self.tamanho_celula),
+        )
+
+    def _incluir(self, entrada):
+        self._remover(entrada.id)
+        self._entradas[entrada.id] = entrada
+        celula = self._celula(entrada.latitude, entrada.longitude)
+        self._grade[entrada.id_materiais][celula][entrada.id] = entrada
+
+    def _remover(self, coleta_id):
+        entrada = self._entradas.pop(coleta_id, None)
+        if entrada is None:
+            return
+        celulas = self._grade[entrada.id_materiais]
+        celula = self._celula(entrada.latitude, entrada.longitude)
+        celulas[celula].pop(coleta_id, None)
+        if not celulas[celula]:
+            del celulas[celula]
+
+    def _versao_global(self):
+        try:
+            return cache.get(self._chave_versao, 0)
+        except Exception as e:
+            logger.warning('Erro ao ler versão do índice de pendentes: %s', e)
+            return None
+
+    def reconstruir(self):
+        """Recarrega todas as coletas pendentes do banco"""
+        # A versão é lida antes da consulta: eventos publicados durante a
+        # recarga são reaplicados depois (incluir/remover são idempotentes)
+        versao = self._versao_global()
+        entradas = [criar_entrada(coleta) for coleta in coletas_pendentes()]
+
+        with self._lock:
+            self._entradas = {}
+            self._grade = defaultdict(lambda: defaultdict(dict))
+            for entrada in entradas:
+                self._incluir(entrada)
+            self._versao = versao or 0
+            self._construido_em = time.monotonic()
+            self._lacuna = None
+
+        logger.info('Índice de coletas pendentes reconstruído: %d coletas', len(entradas))
+        return len(entradas)
+
+    def _velho(self):
+        return (
+            self._versao is None
+            or time.monotonic() - self._construido_em > self.idade_maxima
+        )
+
+    def sincronizar(self):
+        """Aplica os eventos publicados desde a última consulta"""
+        if not self._velho():
+            versao = self._versao_global()
+            if versao is None or versao == self._versao:
+                return
+
+        with self._lock:
+            # Verifica de novo: outra thread pode ter reconstruído ou
+            # aplicado os eventos enquanto esta esperava o lock
+            if self._velho():
+                self.reconstruir()
+                return
+            self._aplicar_eventos()
+
+    def _aplicar_eventos(self):
+        versao = self._versao_global()
+        if versao is None or versao == self._versao:
+            return
+        if versao < self._versao:
+            # Contador reiniciado (cache limpo): o diário não serve mais
+            self.reconstruir()
+            return
+
+        try:
+            eventos = cache.get_many([
+                self._chave_evento(n) for n in range(self._versao + 1, versao + 1)
+            ])
+        except Exception as e:
+            logger.warning('Erro ao ler eventos do índice de pendentes: %s', e)
+            return
+
+        # Aplica em ordem até o primeiro evento ausente; os seguintes
+        # ficam para a próxima consulta
+        for n in range(self._versao + 1, versao + 1):
+            evento = eventos.get(self._chave_evento(n))
+            if evento is None:
+                break
+            operacao, valor = evento
+            if operacao == 'incluir':
+                self._incluir(valor)
+            else:
+                self._remover(valor)
+            self._versao = n
+
+        if self._versao == versao:
+            self._lacuna = None
+            return
+
+        ausente, agora = self._versao + 1, time.monotonic()
+        if self._lacuna is None or self._lacuna[0] != ausente:
+            self._lacuna = (ausente, agora)
+        elif agora - self._lacuna[1] > self.ESPERA_LACUNA:
+            # Evento expirado ou perdido: recarrega do banco
+            self.reconstruir()
+
+    def consultar(self, materiais, origem=None):
+        """
+        Coletas pendentes dos materiais informados
+
+        Sem origem, ordena por (criado_em, id) decrescente, como o feed
+        do banco. Com origem (lat, lon, raio_km), retorna apenas as que
+        estão no raio, da mais próxima para a mais distante.
+        """
+        self.sincronizar()
+
+        with self._lock:
+            if origem is None:
+                resultados = [
+                    ResultadoBusca(e.id, e.criado_em, e.dados, None)
+                    for material in materiais
+                    for celula in self._grade.get(material, {}).values()
+                    for e in celula.values()
+                ]
+                resultados.sort(key=lambda r: (r.criado_em, r.id), reverse=True)
+                return resultados
+
+            lat, lon, raio = origem
+            resultados = []
+            for entrada in self._candidatos(materiais, lat, lon, raio):
+                distancia = geo.haversine_km(
+                    lat, lon, entrada.latitude, entrada.longitude
+                )
+                if distancia <= raio:
+                    resultados.append(ResultadoBusca(
+                        entrada.id, entrada.criado_em, entrada.dados, distancia
+                    ))
+            resultados.sort(key=lambda r: (r.distancia_km, r.id))
+            return resultados
+
+    def _candidatos(self, materiais, lat, lon, raio):
+        """Entradas nas células que cruzam a caixa delimitadora do raio"""
+        lat_min, lat_max, lon_min, lon_max = geo.caixa_delimitadora(lat, lon, raio)
+        y_min, x_min = self._celula(lat_min, lon_min)
+        y_max, x_max = self._celula(lat_max, lon_max)
+        total_celulas = (y_max - y_min + 1) * (x_max - x_min + 1)
+
+        for material in materiais:
+            celulas = self._grade.get(material)
+            if not celulas:
+                continue
+
+            if total_celulas > len(celulas):
+                # Raio grande: percorrer as células ocupadas sai mais barato
+                for celula, entradas in celulas.items():
+                    if celula is not None and y_min <= celula[0] <= y_max:
+                        yield from entradas.values()
+                continue
+
+            # Colunas além de ±180° (caixa no antimeridiano) dão a volta
+            colunas = round(360 / self.tamanho_celula)
+            primeira_coluna = math.floor(-180 / self.tamanho_celula)
+            for y in range(y_min, y_max + 1):
+                for x in range(x_min, x_max + 1):
+                    x = (x - primeira_coluna) % colunas + primeira_coluna
+                    yield from celulas.get((y, x), {}).values()
+
+    def _publicar(self, operacao, valor):
+        # Duas operações no cache: entre o incr e o set os leitores veem a
+        # versão nova sem o evento (ver ESPERA_LACUNA em _aplicar_eventos)
+        try:
+            cache.add(self._chave_versao, 0, timeout=None)
+            versao = cache.incr(self._chave_versao)
+            cache.set(
+                self._chave_evento(versao), (operacao, valor),
+                timeout=self.ttl_eventos
+            )
+        except Exception as e:
+            # Sem o diário os processos se corrigem na próxima reconstrução
+            logger.warning('Erro ao publicar evento do índice de pendentes: %s', e)
+
+    def publicar_inclusao(self, coleta_id):
+        """Publica a coleta no índice após o commit da transação atual"""
+        self.publicar_inclusoes([coleta_id])
+
+    def publicar_inclusoes(self, coleta_ids):
+        """
+        publicar_inclusao() de várias coletas, lidas em uma consulta.
+        Também avisa os parceiros conectados (core.eventos).
+        """
+        def publicar():
+            for coleta in coletas_pendentes().filter(id__in=coleta_ids):
+                entrada = criar_entrada(coleta)
+                self._publicar('incluir', entrada)
+                eventos.publicar(
+                    eventos.NOVA, entrada.id, entrada.id_materiais, entrada.dados
+                )
+        transaction.on_commit(publicar)
+
+    def publicar_remocao(self, coleta_id, motivo, id_materiais=None):
+        """
+        Retira a coleta do índice após o commit da transação atual e
+        avisa os parceiros conectados (motivo: eventos.ACEITA ou
+        eventos.CANCELADA)
+        """
+        def publicar():
+            self._publicar('remover', coleta_id)
+            eventos.publicar(motivo, coleta_id, id_materiais)
+        transaction.on_commit(publicar)
+
+
+def dados_parceiro(usuario_id):
+    """
+    Id, materiais e coordenadas do endereço do parceiro, em cache por
+    INDICE_PENDENTES_TTL_PARCEIRO segundos. None se não existir.
+    """
+    chave = f'{IndicePendentes.PREFIXO}:parceiro:{usuario_id}'
+    try:
+        dados = cache.get(chave)
+    except Exception as e:
+        logger.warning('Erro ao ler parceiro do cache: %s', e)
+        dados = None
+    if dados is not None:
+        return dados
+
+    parceiro = Parceiros.objects.select_related(
+        'id_usuarios__id_endereco'
+    ).filter(id_usuarios=usuario_id).first()
+    if parceiro is None:
+        return None
+
+    endereco = parceiro.id_usuarios.id_endereco if parceiro.id_usuarios else None
+    dados = {
+        'id': parceiro.id,
+        'materiais': list(MateriaisParceiros.objects.filter(
+            id_parceiros=parceiro
+        ).values_list('id_materiais', flat=True)),
+        'coordenadas': (
+            (endereco.latitude, endereco.longitude)
+            if endereco and endereco.latitude is not None
+            and endereco.longitude is not None else None
+        ),
+    }
+    try:
+        cache.set(chave, dados, timeout=settings.INDICE_PENDENTES_TTL_PARCEIRO)
+    except Exception as e:
+        logger.warning('Erro ao gravar parceiro no cache: %s', e)
+    return dados
+
+
+indice_pendentes = IndicePendentes(
+    settings.INDICE_PENDENTES_CELULA_GRAUS,
+    settings.INDICE_PENDENTES_IDADE_MAXIMA,
+    settings.INDICE_PENDENTES_TTL_EVENTOS,
+)
@@ -0,0 +1,123 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from rest_framework.test import APIClient
+
+from core.models import Coletas, MateriaisParceiros
+
+
+class Command(BaseCommand):
+    help = (
+        'Confere que as listagens com serialização rápida (?rapido=1) '
+        'respondem exatamente os mesmos bytes que os serializers '
+        '(?rapido=0), inclusive os links de paginação. Apenas leitura.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tamanho', type=int, default=100,
+                            help='Itens por página')
+        parser.add_argument('--paginas', type=int, default=3,
+                            help='Páginas seguidas (pelo link next) por listagem')
+
+    def handle(self, *args, **options):
+        cliente = APIClient()
+        divergentes = 0
+
+        # Pendentes pelo banco (o índice em memória não usa serializer)
+        with override_settings(
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+            INDICE_PENDENTES_ATIVO=False
+        ):
+            for url, params in self._listagens():
+                params = {**params, 'tamanho_pagina': options['tamanho']}
+                try:
+                    paginas, itens, tempos = self._comparar(
+                        cliente, url, params, options['paginas']
+                    )
+                except AssertionError as e:
+                    divergentes += 1
+                    self.stdout.write(self.style.ERROR(f'{url}: {e}'))
+                    continue
+
+                normal, rapido = tempos
+                self.stdout.write(self.style.SUCCESS(
+                    f'{url} {params}: idêntico em {paginas} página(s), '
+                    f'{itens} item(ns); {normal * 1000:.0f} ms -> {rapido * 1000:.0f} ms'
+                ))
+
+        if divergentes:
+            raise CommandError(f'{divergentes} listagem(ns) com saída diferente')
+
+    @staticmethod
+    def _listagens():
+        listagens = [('/v1/coletas/', {}), ('/v1/avaliacoes/', {})]
+
+        parceiro = Coletas.objects.exclude(id_parceiros=None).values_list(
+            'id_parceiros__id_usuarios', flat=True
+        ).first()
+        if parceiro:
+            listagens.append((f'/v1/coletas/minhas-coletas-parceiro/{parceiro}/', {}))
+
+        cliente = Coletas.objects.values_list(
+            'id_clientes__id_usuarios', flat=True
+        ).first()
+        if cliente:
+            listagens.append((f'/v1/coletas/minhas-coletas-cliente/{cliente}/', {}))
+
+        parceiro = MateriaisParceiros.objects.values_list(
+            'id_parceiros__id_usuarios', flat=True
+        ).first()
+        if parceiro:
+            url = f'/v1/coletas/pendentes-parceiro/{parceiro}/'
+            listagens.append((url, {}))
+            origem = Coletas.objects.exclude(
+                id_enderecos__latitude=None
+            ).values_list(
+                'id_enderecos__latitude', 'id_enderecos__longitude'
+            ).first()
+            if origem:
+                # Com origem: distancia_km anotada e paginação por número
+                listagens.append((url, {
+                    'lat': origem[0],
+                    'lon': origem[1],
+                    'raio': settings.BUSCA_RAIO_MAXIMO_KM,
+                }))
+        return listagens
+
+    def _comparar(self, cliente, url, params, limite):
+        """Percorre as páginas pelos dois caminhos comparando os bytes"""
+        tempos = [0.0, 0.0]
+        urls = [url, url]
+        parametros = [{**params, 'rapido': 0}, {**params, 'rapido': 1}]
+        paginas = itens = 0
+
+        while urls[0] and paginas < limite:
+            conteudos = []
+            for i in (0, 1):
+                inicio = time.perf_counter()
+                resposta = cliente.get(urls[i], parametros[i])
+                tempos[i] += time.perf_counter() - inicio
+                assert resposta.status_code == 200, (
+                    f'respondeu {resposta.status_code}'
+                )
+                conteudos.append(resposta)
+
+            normal, rapido = conteudos
+            # Os links carregam o próprio ?rapido=; fora isso devem ser iguais
+            conteudo_rapido = rapido.content.replace(b'rapido=1', b'rapido=0')
+            assert normal.content == conteudo_rapido, (
+                f'página {paginas + 1} diferente:\n'
+                f'  serializer: {normal.content[:500]!r}\n'
+                f'  rápido:     {rapido.content[:500]!r}'
+            )
+
+            dados = normal.json()
+            paginas += 1
+            itens += len(dados.get('results', []))
+            # Próximas páginas pelo link next, que já traz os parâmetros
+            urls = [dados.get('next'), rapido.json().get('next')]
+            parametros = [{}, {}]
+
+        return paginas, itens, tempos
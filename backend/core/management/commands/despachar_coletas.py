@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+
+from core import despacho
+
+
+class Command(BaseCommand):
+    help = (
+        'Atribui coletas pendentes a parceiros elegíveis considerando '
+        'distância, carga e avaliações (ver DESPACHO_* no settings)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Apenas mostra as atribuições, sem gravar'
+        )
+        parser.add_argument(
+            '--lote',
+            type=int,
+            help='Quantidade máxima de coletas (padrão: DESPACHO_LOTE)'
+        )
+        parser.add_argument(
+            '--raio',
+            type=float,
+            help='Distância máxima em km (padrão: DESPACHO_RAIO_MAXIMO_KM)'
+        )
+
+    def handle(self, *args, **options):
+        atribuicoes, ignoradas = despacho.despachar(
+            lote=options['lote'],
+            raio_km=options['raio'],
+            simular=options['dry_run']
+        )
+
+        for atribuicao in atribuicoes:
+            self.stdout.write(
+                f'coleta {atribuicao.coleta_id} -> parceiro '
+                f'{atribuicao.parceiro_id} ({atribuicao.distancia_km} km, '
+                f'custo {atribuicao.custo})'
+            )
+
+        verbo = 'planejada(s)' if options['dry_run'] else 'atribuída(s)'
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(atribuicoes)} coleta(s) {verbo}, {ignoradas} ignorada(s)'
+        ))
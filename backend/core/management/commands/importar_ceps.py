@@ -0,0 +1,73 @@
+import csv
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.cep import indice_cep, normalizar_registro
+
+
+class Command(BaseCommand):
+    help = (
+        'Importa uma base de CEPs em CSV, JSON ou JSON Lines para o índice '
+        'local usado em /enderecos/buscar-cep/. Cada registro usa as chaves '
+        'da ViaCEP (cep, uf, localidade, bairro, logradouro) ou as do '
+        'projeto (cep, estado, cidade, bairro, rua). A importação é feita '
+        'em uma única transação: se a leitura falhar, nada muda no índice.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivo', help='Caminho do arquivo de CEPs')
+        parser.add_argument(
+            '--formato',
+            choices=['csv', 'json', 'jsonl'],
+            help='Formato do arquivo (padrão: pela extensão)'
+        )
+        parser.add_argument(
+            '--delimitador',
+            default=None,
+            help='Delimitador do CSV (padrão: detectado automaticamente)'
+        )
+        parser.add_argument(
+            '--limpar',
+            action='store_true',
+            help='Substitui os CEPs existentes pelos do arquivo'
+        )
+        parser.add_argument('--lote', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        arquivo = options['arquivo']
+        formato = options['formato'] or arquivo.rsplit('.', 1)[-1].lower()
+        if formato not in ('csv', 'json', 'jsonl'):
+            raise CommandError('Informe o formato com --formato')
+
+        try:
+            with open(arquivo, encoding='utf-8') as entrada:
+                total = indice_cep.importar(
+                    (
+                        normalizar_registro(registro)
+                        for registro in self._ler(entrada, formato, options)
+                    ),
+                    limpar=options['limpar'],
+                    lote=options['lote']
+                )
+        except (OSError, ValueError, csv.Error) as e:
+            raise CommandError(f'Erro ao ler {arquivo}: {e}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{total} CEPs importados ({indice_cep.contar()} no índice)'
+        ))
+
+    def _ler(self, entrada, formato, options):
+        if formato == 'json':
+            yield from json.load(entrada)
+        elif formato == 'jsonl':
+            for linha in entrada:
+                if linha.strip():
+                    yield json.loads(linha)
+        else:
+            delimitador = options['delimitador']
+            if delimitador is None:
+                amostra = entrada.read(4096)
+                entrada.seek(0)
+                delimitador = csv.Sniffer().sniff(amostra, ',;|\t').delimiter
+            yield from csv.DictReader(entrada, delimiter=delimitador)
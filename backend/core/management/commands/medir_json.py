@@ -0,0 +1,196 @@
+import datetime
+import io
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from core import catalogo_materiais
+from core.models import (Clientes, Coletas, Enderecos, ImagemColetas,
+                         Pagamentos, Parceiros, Solicitacoes, Usuarios)
+from core.renderizadores import JSONRapidoParser, JSONRapidoRenderer, orjson
+from core.serializers import ColetasRetrieveSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara o JSONRenderer/JSONParser do DRF com os de '
+        'core.renderizadores (orjson) em páginas de '
+        'ColetasRetrieveSerializer montadas em memória, conferindo que '
+        'o JSON gerado é idêntico. Não altera o banco.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--coletas', type=int, default=100,
+                            help='Coletas por página')
+        parser.add_argument('--repeticoes', type=int, default=500,
+                            help='Páginas renderizadas/lidas em cada medição')
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            self.stdout.write(self.style.WARNING(
+                'orjson não instalado: os dois lados usam o json da stdlib'
+            ))
+
+        pagina = {
+            'next': 'http://localhost:8000/v1/coletas/?cursor=eyJ2IjowfQ',
+            'previous': None,
+            'results': ColetasRetrieveSerializer(
+                self._montar_coletas(options['coletas']), many=True
+            ).data,
+        }
+        self._conferir(pagina)
+
+        repeticoes = options['repeticoes']
+        padrao = self._medir(
+            lambda: JSONRenderer().render(pagina), repeticoes
+        )
+        rapido = self._medir(
+            lambda: JSONRapidoRenderer().render(pagina), repeticoes
+        )
+        self._relatar('render', padrao, rapido, repeticoes)
+
+        conteudo = JSONRenderer().render(pagina)
+        padrao = self._medir(
+            lambda: JSONParser().parse(io.BytesIO(conteudo)), repeticoes
+        )
+        rapido = self._medir(
+            lambda: JSONRapidoParser().parse(io.BytesIO(conteudo)), repeticoes
+        )
+        self._relatar('parse', padrao, rapido, repeticoes)
+        self.stdout.write(
+            f'página com {options["coletas"]} coletas: {len(conteudo) / 1024:.0f} KiB'
+        )
+
+    def _conferir(self, pagina):
+        """Mesmo JSON nos dois renderers, inclusive com tipos Python crus"""
+        agora = timezone.now()
+        amostras = [
+            pagina,
+            {
+                # Decimal e datas como os SerializerMethodField devolvem,
+                # valor de TextField (pagamentos) como texto
+                'peso_material': Decimal('12.5000'),
+                'valor_pagamento': '35.90',
+                'criado_em': agora,
+                'utc': agora.astimezone(datetime.timezone.utc),
+                'data': agora.date(),
+                'notas_detalhadas': {5: 3, 4: 1},
+                'texto': 'Coleta às 8h portão azul',
+                'distancia_km': 3.14,
+            },
+            # Casos em que o orjson diverge e o renderer volta ao DRF
+            {'pequeno': 1e-7, 'grande': 1e16, 'lista': [0.00001, -2.5e-300],
+             'decimal': Decimal('1E-7')},
+            {'inteiro': 12345678901234567890123, 'negativo': -2 ** 63 - 1},
+            {(1.5e-10): 'chave float'},
+        ]
+        for amostra in amostras:
+            padrao = JSONRenderer().render(amostra)
+            rapido = JSONRapidoRenderer().render(amostra)
+            if padrao != rapido:
+                raise CommandError(
+                    f'JSON diferente:\n  DRF:    {padrao[:300]!r}\n'
+                    f'  orjson: {rapido[:300]!r}'
+                )
+            if JSONRapidoParser().parse(io.BytesIO(rapido)) != JSONParser().parse(io.BytesIO(padrao)):
+                raise CommandError('Parser com resultado diferente')
+
+        # NaN/Infinity: os dois renderers recusam (STRICT_JSON)
+        for valor in (float('nan'), float('inf')):
+            erros = []
+            for renderer in (JSONRenderer(), JSONRapidoRenderer()):
+                try:
+                    renderer.render({'valor': [valor]})
+                except ValueError as e:
+                    erros.append(str(e))
+                else:
+                    erros.append(None)
+            if erros[0] != erros[1]:
+                raise CommandError(f'{valor} tratado diferente: {erros}')
+
+        # Entradas que o orjson leria diferente ou recusaria
+        for conteudo in (
+            b'12345678901234567890123',
+            b'{"id": -9223372036854775809, "valor": 1e-07}',
+            b'"\\ud800"',
+            b'{"valor": NaN}',
+            b'{"aberto": ',
+        ):
+            resultados = []
+            for parser in (JSONParser(), JSONRapidoParser()):
+                try:
+                    resultados.append(parser.parse(io.BytesIO(conteudo)))
+                except ParseError as e:
+                    resultados.append(str(e.detail))
+            if resultados[0] != resultados[1] or type(resultados[0]) is not type(resultados[1]):
+                raise CommandError(
+                    f'Parser diferente para {conteudo!r}: {resultados}'
+                )
+        self.stdout.write(self.style.SUCCESS('Saída idêntica ao JSONRenderer do DRF'))
+
+    @staticmethod
+    def _medir(funcao, repeticoes):
+        # Melhor de 3 medições
+        melhor = None
+        for _ in range(3):
+            inicio = time.perf_counter()
+            for _ in range(repeticoes):
+                funcao()
+            duracao = time.perf_counter() - inicio
+            melhor = duracao if melhor is None else min(melhor, duracao)
+        return melhor
+
+    def _relatar(self, operacao, padrao, rapido, repeticoes):
+        self.stdout.write(
+            f'{operacao}: DRF {repeticoes / padrao:,.0f} páginas/s, '
+            f'rápido {repeticoes / rapido:,.0f} páginas/s '
+            f'({padrao / rapido:.1f}x)'
+        )
+
+    @staticmethod
+    def _montar_coletas(total):
+        # Coletas como viriam do queryset da ColetasViewSet: relacionados
+        # carregados e imagens no cache de prefetch
+        agora = timezone.now()
+        materiais = [m.id for m in catalogo_materiais.atual().materiais] or [None]
+        coletas = []
+        for i in range(1, total + 1):
+            cliente = Clientes(
+                id=i, id_usuarios=Usuarios(id=i, nome=f'Cliente {i}', usuario=f'cliente{i}')
+            )
+            parceiro = Parceiros(
+                id=i, id_usuarios=Usuarios(id=total + i, nome=f'Parceiro {i}', usuario=f'parceiro{i}')
+            ) if i % 2 else None
+            coleta = Coletas(
+                id=i,
+                id_clientes=cliente,
+                id_parceiros=parceiro,
+                id_materiais_id=materiais[i % len(materiais)],
+                peso_material=Decimal('12.5000') if i % 3 else None,
+                quantidade_material=None if i % 3 else 4,
+                id_enderecos=Enderecos(
+                    id=i, rua=f'Rua das Araucárias {i}', numero=i, bairro='Água Verde',
+                    cidade='Curitiba', complemento='Apto 12' if i % 4 else None
+                ),
+                id_solicitacoes=Solicitacoes(
+                    id=i, estado_solicitacao='aceitado' if parceiro else 'pendente',
+                    observacoes='Portão azul'
+                ),
+                id_pagamentos=Pagamentos(
+                    id=i, valor_pagamento='35.90', estado_pagamento='pendente'
+                ),
+                criado_em=agora,
+                atualizado_em=agora,
+            )
+            coleta._prefetched_objects_cache = {
+                'imagens_coletas': [
+                    ImagemColetas(id=i, imagem=f'coletas/{i}.jpg', criado_em=agora)
+                ] if i % 2 else []
+            }
+            coletas.append(coleta)
+        return coletas
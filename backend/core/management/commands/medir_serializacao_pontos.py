@@ -0,0 +1,104 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from core import catalogo_materiais
+from core.models import (Enderecos, MateriaisPontosColeta, Parceiros,
+                         PontosColeta, Telefones, Usuarios)
+from core.serializers import (MateriaisSerializer,
+                              ParceiroComUsuarioCreateSerializer,
+                              PontosColetaRetrieveSerializer)
+
+
+class PontosColetaAnteriorSerializer(PontosColetaRetrieveSerializer):
+    """Serializer de leitura anterior: parceiro com o serializer de escrita e depth = 1"""
+    id_enderecos = None
+    id_parceiros = ParceiroComUsuarioCreateSerializer()
+
+    class Meta(PontosColetaRetrieveSerializer.Meta):
+        read_only_fields = []
+        depth = 1
+
+    def get_materiais(self, obj):
+        ids = [
+            relacao.id_materiais_id
+            for relacao in obj.materiaispontoscoleta_set.all()
+        ]
+        return MateriaisSerializer(catalogo_materiais.materiais(ids), many=True).data
+
+
+class Command(BaseCommand):
+    help = (
+        'Mede a serialização de pontos de coleta (pontos/s) com o serializer '
+        'de leitura atual e com o anterior. Os pontos são montados em '
+        'memória, como viriam do queryset da PontosColetaViewSet; não '
+        'consulta nem altera o banco além do catálogo de materiais.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pontos', type=int, default=5000,
+                            help='Quantidade de pontos serializados')
+        parser.add_argument('--materiais', type=int, default=3,
+                            help='Materiais por ponto')
+        parser.add_argument('--repeticoes', type=int, default=5,
+                            help='Medições de cada serializer (vale a melhor)')
+
+    def handle(self, *args, **options):
+        ids_materiais = [m.id for m in catalogo_materiais.atual().materiais]
+        if not ids_materiais:
+            raise CommandError('Nenhum material cadastrado')
+        ids_materiais = ids_materiais[:options['materiais']]
+
+        pontos = self._montar_pontos(options['pontos'], ids_materiais)
+
+        for nome, classe in (
+            ('atual', PontosColetaRetrieveSerializer),
+            ('anterior', PontosColetaAnteriorSerializer),
+        ):
+            melhor, tamanho = self._medir(classe, pontos, options['repeticoes'])
+            self.stdout.write(
+                f'{nome}: {len(pontos) / melhor:,.0f} pontos/s '
+                f'({melhor * 1000:.1f} ms para {len(pontos)}, '
+                f'{tamanho / 1024:.0f} KiB de JSON)'
+            )
+
+    @staticmethod
+    def _medir(classe, pontos, repeticoes):
+        melhor = None
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            dados = classe(pontos, many=True).data
+            duracao = time.perf_counter() - inicio
+            melhor = duracao if melhor is None else min(melhor, duracao)
+        return melhor, len(JSONRenderer().render(dados))
+
+    @staticmethod
+    def _montar_pontos(total, ids_materiais):
+        # Mesmo formato do queryset da view: endereço, parceiro e usuário
+        # carregados e telefone/materiais no cache de prefetch
+        agora = timezone.now()
+        pontos = []
+        for i in range(1, total + 1):
+            endereco = Enderecos(
+                id=i, cep='80000000', estado='PR', cidade='Curitiba',
+                bairro='Centro', rua=f'Rua {i}', numero=i,
+                latitude=-25.4, longitude=-49.2, geocoding_status='concluido',
+                criado_em=agora, atualizado_em=agora
+            )
+            usuario = Usuarios(id=i, nome=f'Parceiro {i}', usuario=f'parceiro{i}')
+            usuario.telefones = Telefones(numero='41999990000')
+            parceiro = Parceiros(id=i, id_usuarios=usuario, cnpj=f'{i:014d}')
+            ponto = PontosColeta(
+                id=i, nome=f'Ponto {i}', descricao='', horario_funcionamento='8h-18h',
+                id_enderecos=endereco, id_parceiros=parceiro
+            )
+            ponto._prefetched_objects_cache = {
+                'materiaispontoscoleta_set': [
+                    MateriaisPontosColeta(id_materiais_id=m, id_pontos_coleta=ponto)
+                    for m in ids_materiais
+                ]
+            }
+            pontos.append(ponto)
+        return pontos
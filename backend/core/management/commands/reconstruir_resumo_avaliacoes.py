@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core import resumo_avaliacoes
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula a tabela resumo_avaliacoes a partir das avaliações, '
+        'corrigindo qualquer divergência dos contadores'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tipo',
+            choices=sorted(resumo_avaliacoes.TIPOS),
+            help='Recalcula apenas clientes ou parceiros (padrão: ambos)'
+        )
+        parser.add_argument(
+            '--ids',
+            type=int,
+            nargs='+',
+            help='Ids de Clientes/Parceiros a recalcular (padrão: todos)'
+        )
+
+    def handle(self, *args, **options):
+        tipos = [options['tipo']] if options['tipo'] else sorted(resumo_avaliacoes.TIPOS)
+
+        for tipo in tipos:
+            with transaction.atomic():
+                total = resumo_avaliacoes.reconstruir(tipo, options['ids'])
+            self.stdout.write(self.style.SUCCESS(
+                f'{total} resumo(s) de {tipo} recalculado(s)'
+            ))
@@ -0,0 +1,173 @@
+import json
+import logging
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.utils.deprecation import MiddlewareMixin
+
+from . import catalogo_materiais
+
+logger = logging.getLogger('core.consultas')
+
+
+class CatalogoMateriaisMiddleware(MiddlewareMixin):
+    """
+    Valida o catálogo de materiais em memória no início de cada requisição
+
+    O MiddlewareMixin já atende síncrono e assíncrono; no ASGI a validação
+    (cache e, ao mudar a versão, banco) roda em uma thread
+    """
+
+    def process_request(self, request):
+        catalogo_materiais.validar()
+
+
+class OrcamentoConsultasExcedido(Exception):
+    pass
+
+
+# Controle de transação não conta como consulta: o atomic() de fora abre
+# com BEGIN, que não passa pelo cursor, mas dentro de outro atomic (como
+# no TestCase) vira SAVEPOINT/RELEASE
+_SAVEPOINTS = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')
+
+
+class _ContadorConsultas:
+    """Conta as consultas e soma o tempo gasto no banco de uma requisição"""
+
+    def __init__(self):
+        self.total = 0
+        self.tempo = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            if not sql.startswith(_SAVEPOINTS):
+                self.total += 1
+            self.tempo += time.perf_counter() - inicio
+
+
+# Contador da requisição em andamento. Uma ContextVar, e não um
+# execute_wrapper por requisição: no ASGI as views síncronas rodam em outra
+# thread (sync_to_async), com outra conexão, mas herdam o contexto
+_contador_atual = ContextVar('contador_consultas', default=None)
+
+
+def _contar_consulta(execute, sql, params, many, context):
+    contador = _contador_atual.get()
+    if contador is None:
+        return execute(sql, params, many, context)
+    return contador(execute, sql, params, many, context)
+
+
+def instalar_contador(sender, connection, **kwargs):
+    """
+    Receptor de connection_created (ligado em CoreConfig.ready): toda
+    conexão aberta passa pelo contador
+    """
+    if _contar_consulta not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_contar_consulta)
+
+
+class OrcamentoConsultasMiddleware:
+    """
+    Mede consultas SQL e tempo no banco de cada requisição
+
+    Os números vão nos headers X-Consultas-SQL e X-Tempo-SQL-ms e em um
+    log JSON (logger core.consultas) com view e ação. Uma viewset pode
+    declarar orcamento_consultas (número ou {ação: número}); passar dele
+    gera um aviso no log ou, com ORCAMENTO_CONSULTAS_ESTRITO, uma exceção
+    (conferido em OrcamentoConsultasTestes, core/tests.py).
+
+    Fica por último no MIDDLEWARE para medir só a view: consultas de
+    sessão e do catálogo de materiais ficam de fora. Atende síncrono e
+    assíncrono, para não obrigar o ASGI a passar toda requisição (e a view
+    assíncrona de eventos) por uma thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.assincrono = iscoroutinefunction(get_response)
+        if self.assincrono:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.assincrono:
+            return self.__acall__(request)
+        if not settings.ORCAMENTO_CONSULTAS_ATIVO:
+            return self.get_response(request)
+
+        contador = _ContadorConsultas()
+        token = _contador_atual.set(contador)
+        inicio = time.perf_counter()
+        try:
+            resposta = self.get_response(request)
+        finally:
+            _contador_atual.reset(token)
+        return self._conferir(request, resposta, contador, time.perf_counter() - inicio)
+
+    async def __acall__(self, request):
+        if not settings.ORCAMENTO_CONSULTAS_ATIVO:
+            return await self.get_response(request)
+
+        contador = _ContadorConsultas()
+        token = _contador_atual.set(contador)
+        inicio = time.perf_counter()
+        try:
+            resposta = await self.get_response(request)
+        finally:
+            _contador_atual.reset(token)
+        return self._conferir(request, resposta, contador, time.perf_counter() - inicio)
+
+    def _conferir(self, request, resposta, contador, duracao):
+        resposta['X-Consultas-SQL'] = str(contador.total)
+        resposta['X-Tempo-SQL-ms'] = f'{contador.tempo * 1000:.1f}'
+
+        view, acao, orcamento = self._orcamento(request)
+        dados = {
+            'metodo': request.method,
+            'caminho': request.path,
+            'view': view,
+            'acao': acao,
+            'status': resposta.status_code,
+            'consultas': contador.total,
+            'tempo_sql_ms': round(contador.tempo * 1000, 1),
+            'tempo_total_ms': round(duracao * 1000, 1),
+            'orcamento': orcamento,
+        }
+        logger.info(json.dumps(dados, ensure_ascii=False))
+
+        if orcamento is not None and contador.total > orcamento:
+            mensagem = (
+                f'{view}.{acao} fez {contador.total} consultas '
+                f'(orçamento: {orcamento}) em {request.method} {request.path}'
+            )
+            if settings.ORCAMENTO_CONSULTAS_ESTRITO:
+                raise OrcamentoConsultasExcedido(mensagem)
+            logger.warning(mensagem)
+
+        return resposta
+
+    def _orcamento(self, request):
+        # Lido da rota já resolvida, e não em process_view: no ASGI o Django
+        # rodaria um process_view síncrono em uma thread
+        rota = getattr(request, 'resolver_match', None)
+        if rota is None:
+            return None, None, None
+
+        # Viewsets do DRF: as_view() guarda a classe e o mapa método -> ação
+        classe = getattr(rota.func, 'cls', None)
+        acoes = getattr(rota.func, 'actions', None) or {}
+        acao = acoes.get(request.method.lower())
+        orcamento = getattr(classe, 'orcamento_consultas', None)
+        if isinstance(orcamento, dict):
+            orcamento = orcamento.get(acao)
+
+        nome = classe.__name__ if classe else getattr(rota.func, '__name__', None)
+        return nome, acao, orcamento
@@ -0,0 +1,28 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_alter_imagemcoletas_table'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GeocodificacaoCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+                ('atualizado_em', models.DateTimeField(auto_now=True)),
+                ('chave', models.CharField(max_length=64, unique=True)),
+                ('endereco_normalizado', models.CharField(max_length=255)),
+                ('latitude', models.FloatField(blank=True, null=True)),
+                ('longitude', models.FloatField(blank=True, null=True)),
+                ('encontrado', models.BooleanField(default=True)),
+                ('expira_em', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'db_table': 'geocodificacao_cache',
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # A tabela enderecos não é gerenciada pelo Django (managed = False),
+    # por isso as alterações são aplicadas diretamente em SQL
+
+    dependencies = [
+        ('core', '0004_geocodificacaocache'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=[
+                "ALTER TABLE enderecos "
+                "ALTER COLUMN latitude DROP NOT NULL, "
+                "ALTER COLUMN longitude DROP NOT NULL, "
+                "ADD COLUMN IF NOT EXISTS geocoding_status varchar(10) "
+                "NOT NULL DEFAULT 'concluido';",
+                "CREATE INDEX IF NOT EXISTS enderecos_geocoding_pendente_idx "
+                "ON enderecos (atualizado_em) "
+                "WHERE geocoding_status = 'pendente';",
+            ],
+            reverse_sql=[
+                "DROP INDEX IF EXISTS enderecos_geocoding_pendente_idx;",
+                "ALTER TABLE enderecos DROP COLUMN IF EXISTS geocoding_status;",
+            ],
+        ),
+    ]
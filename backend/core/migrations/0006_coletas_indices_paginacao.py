@@ -0,0 +1,28 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # Índices para a paginação por cursor em (criado_em, id) das coletas.
+    # A tabela coletas não é gerenciada pelo Django (managed = False)
+
+    dependencies = [
+        ('core', '0005_enderecos_geocoding_status'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=[
+                "CREATE INDEX IF NOT EXISTS coletas_criado_em_id_idx "
+                "ON coletas (criado_em, id);",
+                "CREATE INDEX IF NOT EXISTS coletas_cliente_criado_em_id_idx "
+                "ON coletas (id_clientes, criado_em, id);",
+                "CREATE INDEX IF NOT EXISTS coletas_parceiro_criado_em_id_idx "
+                "ON coletas (id_parceiros, criado_em, id);",
+            ],
+            reverse_sql=[
+                "DROP INDEX IF EXISTS coletas_criado_em_id_idx;",
+                "DROP INDEX IF EXISTS coletas_cliente_criado_em_id_idx;",
+                "DROP INDEX IF EXISTS coletas_parceiro_criado_em_id_idx;",
+            ],
+        ),
+    ]
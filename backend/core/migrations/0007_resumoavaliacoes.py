@@ -0,0 +1,34 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_coletas_indices_paginacao'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumoAvaliacoes',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+                ('atualizado_em', models.DateTimeField(auto_now=True)),
+                ('tipo', models.CharField(choices=[('cliente', 'Cliente'), ('parceiro', 'Parceiro')], max_length=10)),
+                ('referencia_id', models.IntegerField()),
+                ('total_avaliacoes', models.IntegerField(default=0)),
+                ('soma_notas', models.IntegerField(default=0)),
+                ('nota_0', models.IntegerField(default=0)),
+                ('nota_1', models.IntegerField(default=0)),
+                ('nota_2', models.IntegerField(default=0)),
+                ('nota_3', models.IntegerField(default=0)),
+                ('nota_4', models.IntegerField(default=0)),
+                ('nota_5', models.IntegerField(default=0)),
+                ('total_coletas_finalizadas', models.IntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'resumo_avaliacoes',
+                'constraints': [models.UniqueConstraint(fields=('tipo', 'referencia_id'), name='resumo_avaliacoes_tipo_referencia_uniq')],
+            },
+        ),
+    ]
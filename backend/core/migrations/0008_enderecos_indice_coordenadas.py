@@ -0,0 +1,21 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # Índice para o pré-filtro por caixa delimitadora da busca por
+    # proximidade (core.geo). A tabela enderecos não é gerenciada pelo Django
+
+    dependencies = [
+        ('core', '0007_resumoavaliacoes'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=(
+                "CREATE INDEX IF NOT EXISTS enderecos_latitude_longitude_idx "
+                "ON enderecos (latitude, longitude) "
+                "WHERE latitude IS NOT NULL AND longitude IS NOT NULL;"
+            ),
+            reverse_sql="DROP INDEX IF EXISTS enderecos_latitude_longitude_idx;",
+        ),
+    ]
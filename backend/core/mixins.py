@@ -1,10 +1,12 @@
 import re
-from time import sleep
 from urllib.parse import quote
 
 import requests
 from django.core.exceptions import ValidationError
 
+from .geocodificacao import (GeocodificacaoIndisponivel, cache_geocodificacao,
+                             limitador_nominatim)
+
 
 class ValidacaoCFPMixin:
     @staticmethod
@@ -134,36 +136,70 @@ class GeocodingMixin:
             tuple: (latitude, longitude) ou None se não encontrar
         """
         try:
-            # Formata o endereço para URL
-            endereco_formatado = quote(endereco_completo)
-
-            # URL da API Nominatim
-            url = f"https://nominatim.openstreetmap.org/" \
-                f"search?format=json&q={endereco_formatado}"
+            return GeocodingMixin.geocodificar(endereco_completo)
+        except GeocodificacaoIndisponivel as e:
+            # Logar este erro em produção
+            print(f"Erro ao acessar API Nominatim: {e}")
+            return None
 
-            # Headers para identificar corretamente a aplicação
-            headers = {
-                'User-Agent': 'GreenCycleApp/1.0 (seu-email@exemplo.com)'
-            }
+    @staticmethod
+    def geocodificar(endereco_completo):
+        """
+        Igual a get_lat_lon, mas diferencia "endereço não encontrado"
+        (retorna None) de falhas temporárias da API, que levantam
+        GeocodificacaoIndisponivel para que o chamador possa tentar
+        novamente mais tarde.
+
+        Antes de acessar a rede consulta o cache de geocodificação
+        (Redis + tabela geocodificacao_cache), já que os endereços se
+        repetem bastante (mesmas ruas, mesmos condomínios).
+        """
+        encontrado, coordenadas = cache_geocodificacao.obter(
+            endereco_completo
+        )
+        if encontrado:
+            return coordenadas
 
-            # Faz a requisição com timeout
-            response = requests.get(url, headers=headers, timeout=10)
+        # Formata o endereço para URL
+        endereco_formatado = quote(endereco_completo)
 
-            # Respeita o rate limit da API (1 segundo entre requisições)
-            sleep(1)
+        # URL da API Nominatim
+        url = f"https://nominatim.openstreetmap.org/" \
+            f"search?format=json&q={endereco_formatado}"
 
-            if response.status_code == 200:
-                data = response.json()
-                if data:
-                    # Retorna a primeira ocorrência (mais relevante)
-                    return (float(data[0]['lat']), float(data[0]['lon']))
+        # Headers para identificar corretamente a aplicação
+        headers = {
+            'User-Agent': 'GreenCycleApp/1.0 (seu-email@exemplo.com)'
+        }
 
-            return None
+        # Respeita o rate limit da API (1 requisição por segundo),
+        # compartilhado entre os workers; só espera se o limite
+        # já tiver sido consumido por outra chamada recente
+        limitador_nominatim.aguardar()
 
+        try:
+            # Faz a requisição com timeout
+            response = requests.get(url, headers=headers, timeout=10)
         except requests.exceptions.RequestException as e:
-            # Logar este erro em produção
-            print(f"Erro ao acessar API Nominatim: {e}")
-            return None
+            raise GeocodificacaoIndisponivel(str(e)) from e
+
+        if response.status_code != 200:
+            raise GeocodificacaoIndisponivel(
+                f"Nominatim respondeu com status {response.status_code}"
+            )
+
+        try:
+            data = response.json()
+            coordenadas = None
+            if data:
+                # Retorna a primeira ocorrência (mais relevante)
+                coordenadas = (float(data[0]['lat']), float(data[0]['lon']))
         except (KeyError, IndexError, ValueError) as e:
-            print(f"Erro ao processar resposta da API: {e}")
-            return None
+            raise GeocodificacaoIndisponivel(
+                f"Erro ao processar resposta da API: {e}"
+            ) from e
+
+        # Só armazena respostas válidas da API (inclusive vazias),
+        # erros temporários não devem entrar no cache
+        cache_geocodificacao.salvar(endereco_completo, coordenadas)
+        return coordenadas
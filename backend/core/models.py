@@ -180,6 +180,12 @@ class Coletas(Base):
 
 
 class Enderecos(Base):
+    ESTADOS_GEOCODING = [
+        ('pendente', 'Pendente'),
+        ('concluido', 'Concluído'),
+        ('falhou', 'Falhou'),
+    ]
+
     id = models.SmallAutoField(primary_key=True)
     cep = models.CharField(max_length=15)
     estado = models.CharField(max_length=50)
@@ -188,8 +194,14 @@ class Enderecos(Base):
     rua = models.CharField(max_length=50)
     numero = models.SmallIntegerField()
     complemento = models.CharField(max_length=100, blank=True, null=True)
-    latitude = models.FloatField()
-    longitude = models.FloatField()
+    # Preenchidas de forma assíncrona (ver core.tasks)
+    latitude = models.FloatField(blank=True, null=True)
+    longitude = models.FloatField(blank=True, null=True)
+    geocoding_status = models.CharField(
+        max_length=10,
+        choices=ESTADOS_GEOCODING,
+        default='concluido'
+    )
 
     class Meta:
         managed = False
@@ -340,3 +352,57 @@ class ImagemPerfil(Base):
     class Meta:
         managed = False
         db_table = 'imagem_perfil'
+
+
+class GeocodificacaoCache(Base):
+    # Tabela gerenciada pelo Django (fallback persistente do cache do Redis)
+    chave = models.CharField(max_length=64, unique=True)
+    endereco_normalizado = models.CharField(max_length=255)
+    latitude = models.FloatField(blank=True, null=True)
+    longitude = models.FloatField(blank=True, null=True)
+    encontrado = models.BooleanField(default=True)
+    expira_em = models.DateTimeField(db_index=True)
+
+    def coordenadas(self):
+        if not self.encontrado:
+            return None
+        return (self.latitude, self.longitude)
+
+    class Meta:
+        db_table = 'geocodificacao_cache'
+
+
+class ResumoAvaliacoes(Base):
+    # Tabela gerenciada pelo Django: contadores de avaliações por
+    # parceiro/cliente, atualizados junto com cada avaliação
+    TIPOS = (
+        ('cliente', 'Cliente'),
+        ('parceiro', 'Parceiro'),
+    )
+
+    tipo = models.CharField(max_length=10, choices=TIPOS)
+    referencia_id = models.IntegerField()  # id de Clientes ou Parceiros
+    total_avaliacoes = models.IntegerField(default=0)  # apenas notas > 0
+    soma_notas = models.IntegerField(default=0)
+    nota_0 = models.IntegerField(default=0)  # aguardando avaliação
+    nota_1 = models.IntegerField(default=0)
+    nota_2 = models.IntegerField(default=0)
+    nota_3 = models.IntegerField(default=0)
+    nota_4 = models.IntegerField(default=0)
+    nota_5 = models.IntegerField(default=0)
+    total_coletas_finalizadas = models.IntegerField(default=0)
+
+    @property
+    def media_notas(self):
+        if not self.total_avaliacoes:
+            return 0
+        return round(self.soma_notas / self.total_avaliacoes, 2)
+
+    class Meta:
+        db_table = 'resumo_avaliacoes'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['tipo', 'referencia_id'],
+                name='resumo_avaliacoes_tipo_referencia_uniq'
+            ),
+        ]
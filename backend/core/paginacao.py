@@ -0,0 +1,247 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as Base64Error
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class PaginacaoPadrao(PageNumberPagination):
+    """
+    Paginação padrão de todas as viewsets (ver REST_FRAMEWORK no settings)
+
+    Uma viewset pode trocar a classe com pagination_class ou ajustar o
+    tamanho com page_size; max_page_size limita o ?tamanho_pagina=N.
+    """
+    page_size = settings.PAGINACAO_TAMANHO
+    page_size_query_param = 'tamanho_pagina'
+    max_page_size = settings.PAGINACAO_TAMANHO_MAXIMO
+
+
+class PaginacaoSemContagem(PaginacaoPadrao):
+    """
+    Paginação por número de página sem o COUNT(*) da tabela
+
+    Busca um item a mais que o tamanho da página para saber se existe
+    uma próxima, evitando a contagem em tabelas grandes. A resposta não
+    traz o campo count.
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        tamanho = self.get_page_size(request)
+        if not tamanho:
+            return None
+
+        numero = request.query_params.get(self.page_query_param) or 1
+        try:
+            numero = int(numero)
+        except ValueError:
+            numero = 0
+        if numero < 1:
+            raise NotFound(self.invalid_page_message.format(
+                page_number=numero, message='Página inválida'
+            ))
+
+        inicio = (numero - 1) * tamanho
+        itens = list(queryset[inicio:inicio + tamanho + 1])
+        if not itens and numero > 1:
+            raise NotFound(self.invalid_page_message.format(
+                page_number=numero, message='Página sem resultados'
+            ))
+
+        self.numero = numero
+        self.tem_proxima = len(itens) > tamanho
+        return itens[:tamanho]
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        resposta = super().get_paginated_response_schema(schema)
+        resposta['properties'].pop('count', None)
+        resposta['required'] = ['results']
+        return resposta
+
+    def get_next_link(self):
+        if not self.tem_proxima:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.page_query_param, self.numero + 1)
+
+    def get_previous_link(self):
+        if self.numero <= 1:
+            return None
+        url = self.request.build_absolute_uri()
+        if self.numero == 2:
+            return remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.page_query_param, self.numero - 1)
+
+
+class PaginacaoKeyset(BasePagination):
+    """
+    Paginação por cursor (keyset) em (criado_em, id), do mais novo para
+    o mais antigo
+
+    Em vez de OFFSET, cada página filtra a partir do último item da
+    página anterior, então o custo da consulta depende do tamanho da
+    página e não do histórico inteiro. O id desempata registros com o
+    mesmo criado_em, mantendo a ordem estável entre as páginas.
+    """
+    campo_ordenacao = 'criado_em'
+    page_size = settings.PAGINACAO_KEYSET_TAMANHO
+    page_size_query_param = 'tamanho_pagina'
+    max_page_size = settings.PAGINACAO_TAMANHO_MAXIMO
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Cursor inválido'
+
+    def get_page_size(self, request):
+        try:
+            tamanho = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if tamanho <= 0:
+            return self.page_size
+        return min(tamanho, self.max_page_size)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.tamanho = self.get_page_size(request)
+        cursor = self.decodificar_cursor(request)
+
+        if isinstance(queryset, (list, tuple)):
+            return self._paginar_lista(queryset, cursor)
+
+        campo = self.campo_ordenacao
+        if cursor is None:
+            voltando = False
+            queryset = queryset.order_by(f'-{campo}', '-id')
+        else:
+            voltando, valor, pk = cursor
+            if voltando:
+                # Página anterior: busca em ordem crescente e inverte depois
+                queryset = queryset.filter(
+                    Q(**{f'{campo}__gt': valor})
+                    | Q(**{campo: valor, 'id__gt': pk})
+                ).order_by(campo, 'id')
+            else:
+                queryset = queryset.filter(
+                    Q(**{f'{campo}__lt': valor})
+                    | Q(**{campo: valor, 'id__lt': pk})
+                ).order_by(f'-{campo}', '-id')
+
+        # Um item a mais indica se existe outra página nessa direção
+        itens = list(queryset[:self.tamanho + 1])
+        return self._montar_pagina(itens, cursor, voltando)
+
+    def _paginar_lista(self, itens, cursor):
+        """Mesma paginação para uma lista já ordenada (mais novo primeiro)"""
+        if cursor is None:
+            voltando = False
+        else:
+            voltando, valor, pk = cursor
+            if voltando:
+                itens = [
+                    item for item in reversed(itens)
+                    if self._chave(item) > (valor, pk)
+                ]
+            else:
+                itens = [
+                    item for item in itens
+                    if self._chave(item) < (valor, pk)
+                ]
+        return self._montar_pagina(itens[:self.tamanho + 1], cursor, voltando)
+
+    def _montar_pagina(self, itens, cursor, voltando):
+        tem_mais = len(itens) > self.tamanho
+        itens = itens[:self.tamanho]
+
+        if voltando:
+            itens.reverse()
+            self.tem_proxima = True
+            self.tem_anterior = tem_mais
+        else:
+            self.tem_proxima = tem_mais
+            self.tem_anterior = cursor is not None
+
+        self.itens = itens
+        return itens
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_next_link(self):
+        if not self.tem_proxima or not self.itens:
+            return None
+        return self._montar_link(self.itens[-1], voltando=False)
+
+    def get_previous_link(self):
+        if not self.tem_anterior:
+            return None
+        if not self.itens:
+            # Página vazia após o fim: volta para a primeira página
+            url = self.request.build_absolute_uri()
+            return remove_query_param(url, self.cursor_query_param)
+        return self._montar_link(self.itens[0], voltando=True)
+
+    def _chave(self, item):
+        """(criado_em, id) de uma instância ou de uma linha de .values()"""
+        if isinstance(item, dict):
+            return item[self.campo_ordenacao], item['id']
+        return getattr(item, self.campo_ordenacao), item.id
+
+    def _montar_link(self, item, voltando):
+        valor, pk = self._chave(item)
+        cursor = self.codificar_cursor(voltando, valor, pk)
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    @staticmethod
+    def codificar_cursor(voltando, valor, pk):
+        dados = json.dumps(
+            {'v': int(voltando), 'c': valor.isoformat(), 'i': pk},
+            separators=(',', ':')
+        )
+        return urlsafe_b64encode(dados.encode('ascii')).decode('ascii')
+
+    def decodificar_cursor(self, request):
+        """Retorna None (primeira página) ou (voltando, criado_em, id)"""
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+
+        try:
+            dados = json.loads(urlsafe_b64decode(cursor.encode('ascii')))
+            valor = parse_datetime(dados['c'])
+            pk = int(dados['i'])
+            voltando = bool(dados['v'])
+        except (Base64Error, UnicodeError, ValueError, KeyError, TypeError):
+            raise NotFound(self.invalid_cursor_message)
+
+        if valor is None:
+            raise NotFound(self.invalid_cursor_message)
+        return voltando, valor, pk
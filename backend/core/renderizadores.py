@@ -0,0 +1,145 @@
+"""
+Renderer e parser JSON da API com orjson
+
+Produzem o mesmo JSON do JSONRenderer/JSONParser do DRF (compacto,
+UTF-8, datas ISO 8601 com Z em UTC, Decimal como número, U+2028/U+2029
+escapados), só que mais rápido. Tipos que o orjson não conhece (Decimal,
+textos traduzíveis, QuerySet...) passam pelo encoder do DRF.
+
+Onde o orjson se comporta diferente do json da biblioteca padrão, o
+trabalho volta para a implementação do DRF:
+- floats em notação científica (1e-07 no json, 1e-7 no orjson) e
+  NaN/Infinity (o DRF recusa com STRICT_JSON, o orjson gera null);
+- inteiros fora de 64 bits (o orjson não gera; na leitura viram float);
+- JSON que o orjson recusa, para o erro ser o mesmo do DRF.
+O mesmo vale sem o orjson instalado ou quando a resposta pede indentação
+(API navegável, Accept: application/json; indent=4). O comando
+medir_json confere a equivalência.
+"""
+import codecs
+import io
+
+from django.conf import settings
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # sem orjson fica o json da biblioteca padrão
+    orjson = None
+
+if orjson is not None:
+    OPCOES = (
+        orjson.OPT_UTC_Z
+        # Chaves int (ex.: notas_detalhadas) viram texto, como no json
+        | orjson.OPT_NON_STR_KEYS
+    )
+
+_encoder = JSONEncoder()
+
+# Inteiros com 19 dígitos ou mais podem passar de 64 bits. Para achá-los
+# todo dígito vira 0 (bytes.translate) e procuramos 19 zeros seguidos,
+# bem mais rápido que uma regex \d{19}
+SO_ZEROS = bytes.maketrans(b'123456789', b'000000000')
+NUMERO_LONGO = b'0' * 19
+
+# Faixa de inteiros que o orjson escreve
+MENOR_INTEIRO = -2 ** 63
+MAIOR_INTEIRO = 2 ** 64 - 1
+
+
+def _float_compativel(valor):
+    # Faixa em que o repr não usa expoente (orjson: 1e-7, json: 1e-07);
+    # NaN e Infinity também ficam fora
+    return valor == 0 or 1e-4 <= abs(valor) < 1e16
+
+
+def _compativel(valor):
+    """
+    False se houver valor que o orjson escreveria diferente do json ou
+    não escreveria: float com expoente, NaN/Infinity ou inteiro fora de
+    64 bits. Os dicts (a maior parte da resposta) são percorridos direto,
+    sem empilhar textos e inteiros.
+    """
+    pendentes = [valor]
+    while pendentes:
+        atual = pendentes.pop()
+        if isinstance(atual, dict):
+            for chave, item in atual.items():
+                if type(chave) is not str:
+                    pendentes.append(chave)
+                tipo = type(item)
+                if tipo is str or item is None:
+                    continue
+                if tipo is int:
+                    if not MENOR_INTEIRO <= item <= MAIOR_INTEIRO:
+                        return False
+                elif tipo is float:
+                    if not _float_compativel(item):
+                        return False
+                else:
+                    pendentes.append(item)
+        elif isinstance(atual, (list, tuple)):
+            pendentes.extend(atual)
+        elif isinstance(atual, float):
+            if not _float_compativel(atual):
+                return False
+        elif isinstance(atual, int):
+            if not MENOR_INTEIRO <= atual <= MAIOR_INTEIRO:
+                return False
+    return True
+
+
+def _default(obj):
+    valor = _encoder.default(obj)
+    if type(valor) is str or (
+        not isinstance(valor, (dict, list, tuple)) and _compativel(valor)
+    ):
+        return valor
+    # Iteráveis convertidos (QuerySet, geradores...) só podem ser lidos uma
+    # vez, então não dá para voltar ao DRF depois: o trecho já sai
+    # escrito pelo JSONRenderer. Erros (ex.: NaN) chegam como __cause__
+    return orjson.Fragment(JSONRenderer().render(valor))
+
+
+class JSONRapidoRenderer(JSONRenderer):
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        if data is None:
+            return b''
+
+        if not _compativel(data):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=_default, option=OPCOES)
+        except orjson.JSONEncodeError as exc:
+            if exc.__cause__ is not None:
+                raise exc.__cause__  # erro do encoder do DRF no default
+            # Ex.: aninhamento além do limite do orjson
+            return super().render(data, accepted_media_type, renderer_context)
+        # Como o JSONRenderer: permite embutir a resposta em <script>
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+
+
+class JSONRapidoParser(JSONParser):
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if orjson is None:
+            return super().parse(stream, media_type, parser_context)
+
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+
+        conteudo = stream.read()
+        if (codecs.lookup(encoding).name == 'utf-8'
+                and NUMERO_LONGO not in conteudo.translate(SO_ZEROS)):
+            try:
+                # orjson já recusa NaN/Infinity, como o JSONParser estrito
+                return orjson.loads(conteudo)
+            except orjson.JSONDecodeError:
+                pass  # o DRF decide se aceita e monta a mensagem de erro
+        return super().parse(io.BytesIO(conteudo), media_type, parser_context)
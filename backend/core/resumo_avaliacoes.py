@@ -0,0 +1,152 @@
+from collections import Counter, defaultdict
+
+from django.db.models import Count, F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from .models import Clientes, Coletas, Parceiros, ResumoAvaliacoes
+
+# tipo -> (modelo avaliado, campo da nota em Avaliacoes, FK em Coletas)
+TIPOS = {
+    'cliente': (Clientes, 'nota_clientes', 'id_clientes'),
+    'parceiro': (Parceiros, 'nota_parceiros', 'id_parceiros'),
+}
+
+NOTAS = range(0, 6)
+
+
+def anotar_estatisticas(queryset, tipo):
+    """
+    Anota no queryset de clientes/parceiros as estatísticas de avaliação
+    (total, soma e quantidade por nota) e o total de coletas
+    finalizadas, tudo calculado pelo banco em uma única consulta
+    """
+    _, campo_nota, campo_coleta = TIPOS[tipo]
+
+    # Apenas avaliações com nota válida (0 = ainda não avaliado)
+    nota_valida = Q(**{f'avaliacoes__{campo_nota}__gt': 0})
+    por_nota = {
+        f'nota_{nota}': Count(
+            'avaliacoes',
+            filter=Q(**{f'avaliacoes__{campo_nota}': nota})
+        )
+        for nota in NOTAS
+    }
+
+    coletas_finalizadas = Coletas.objects.filter(
+        **{campo_coleta: OuterRef('pk')},
+        id_solicitacoes__estado_solicitacao='finalizado',
+        id_pagamentos__estado_pagamento='pago'
+    ).values(campo_coleta).annotate(total=Count('id')).values('total')
+
+    return queryset.annotate(
+        total_avaliacoes=Count('avaliacoes', filter=nota_valida),
+        soma_notas=Coalesce(
+            Sum(f'avaliacoes__{campo_nota}', filter=nota_valida), 0
+        ),
+        total_coletas_finalizadas=Coalesce(Subquery(coletas_finalizadas), 0),
+        **por_nota
+    )
+
+
+def reconstruir(tipo, referencia_ids=None):
+    """
+    Recalcula o resumo a partir da tabela avaliacoes
+
+    Sem referencia_ids recalcula todos os clientes/parceiros do tipo.
+    Retorna a quantidade de resumos gravados.
+    """
+    modelo = TIPOS[tipo][0]
+    queryset = modelo.objects.all()
+    if referencia_ids is not None:
+        queryset = queryset.filter(id__in=referencia_ids)
+
+    campos = ['total_avaliacoes', 'soma_notas', 'total_coletas_finalizadas']
+    campos += [f'nota_{nota}' for nota in NOTAS]
+
+    total = 0
+    for linha in anotar_estatisticas(queryset, tipo).values('id', *campos):
+        referencia_id = linha.pop('id')
+        ResumoAvaliacoes.objects.update_or_create(
+            tipo=tipo, referencia_id=referencia_id, defaults=linha
+        )
+        total += 1
+    return total
+
+
+def obter_resumo(tipo, referencia_id):
+    """Retorna o resumo, criando-o a partir das avaliações se não existir"""
+    resumo = ResumoAvaliacoes.objects.filter(
+        tipo=tipo, referencia_id=referencia_id
+    ).first()
+    if resumo is None:
+        reconstruir(tipo, [referencia_id])
+        resumo = ResumoAvaliacoes.objects.get(
+            tipo=tipo, referencia_id=referencia_id
+        )
+    return resumo
+
+
+def _aplicar(tipo, referencia_id, **incrementos):
+    """
+    Soma os incrementos ao resumo com UPDATE ... SET campo = campo + n
+
+    Deve ser chamado dentro da mesma transação e depois da gravação da
+    avaliação: se o resumo ainda não existe ele é reconstruído a partir
+    das avaliações, que então já incluem a alteração.
+    """
+    incrementos = {campo: n for campo, n in incrementos.items() if n}
+    if not incrementos:
+        return
+
+    atualizados = ResumoAvaliacoes.objects.filter(
+        tipo=tipo, referencia_id=referencia_id
+    ).update(**{campo: F(campo) + n for campo, n in incrementos.items()})
+    if not atualizados:
+        reconstruir(tipo, [referencia_id])
+
+
+def registrar_nota(tipo, referencia_id, nota_anterior, nota_nova):
+    """Atualiza o resumo após a troca de uma nota (0 = sem avaliação)"""
+    if nota_anterior == nota_nova:
+        return
+
+    incrementos = {
+        f'nota_{nota_anterior}': -1,
+        f'nota_{nota_nova}': 1,
+        'soma_notas': nota_nova - nota_anterior,
+        'total_avaliacoes': int(nota_nova > 0) - int(nota_anterior > 0),
+    }
+    _aplicar(tipo, referencia_id, **incrementos)
+
+
+def registrar_finalizacoes(coletas, avaliacoes):
+    """
+    Conta as coletas finalizadas e as avaliações pendentes (nota 0)
+    criadas, com um UPDATE por cliente/parceiro envolvido
+
+    Toda coleta finalizada conta, mesmo a que já tinha avaliação e não
+    está em `avaliacoes`: reconstruir() conta pela tabela coletas
+    """
+    por_referencia = defaultdict(Counter)
+    for coleta in coletas:
+        for tipo, (_, _, campo_coleta) in TIPOS.items():
+            referencia_id = getattr(coleta, f'{campo_coleta}_id')
+            if referencia_id is not None:
+                por_referencia[(tipo, referencia_id)]['total_coletas_finalizadas'] += 1
+
+    for avaliacao in avaliacoes:
+        referencias = {
+            'cliente': (avaliacao.id_clientes_id, avaliacao.nota_clientes),
+            'parceiro': (avaliacao.id_parceiros_id, avaliacao.nota_parceiros),
+        }
+        for tipo, (referencia_id, nota) in referencias.items():
+            if referencia_id is None:
+                continue
+            incrementos = por_referencia[(tipo, referencia_id)]
+            incrementos[f'nota_{nota}'] += 1
+            if nota > 0:
+                incrementos['soma_notas'] += nota
+                incrementos['total_avaliacoes'] += 1
+
+    for (tipo, referencia_id), incrementos in por_referencia.items():
+        _aplicar(tipo, referencia_id, **incrementos)
@@ -0,0 +1,106 @@
+import time
+
+import numpy as np
+
+from .geo import RAIO_TERRA_KM
+
+
+def distancias_entre(origens, destinos):
+    """
+    Matriz len(origens) x len(destinos) de distâncias haversine (km)
+    entre listas de (lat, lon), calculada de uma vez com broadcasting
+    """
+    origens = np.radians(np.asarray(origens, dtype=float).reshape(-1, 2))
+    destinos = np.radians(np.asarray(destinos, dtype=float).reshape(-1, 2))
+    lat1 = origens[:, 0][:, np.newaxis]
+    lon1 = origens[:, 1][:, np.newaxis]
+    lat2 = destinos[:, 0][np.newaxis, :]
+    lon2 = destinos[:, 1][np.newaxis, :]
+
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * RAIO_TERRA_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def matriz_distancias(coordenadas):
+    """Matriz NxN de distâncias (km) entre as coordenadas [(lat, lon), ...]"""
+    return distancias_entre(coordenadas, coordenadas)
+
+
+def vizinho_mais_proximo(matriz, inicio=0):
+    """Rota inicial: sempre segue para o ponto mais próximo ainda não visitado"""
+    n = len(matriz)
+    visitado = np.zeros(n, dtype=bool)
+    ordem = [inicio]
+    visitado[inicio] = True
+
+    for _ in range(n - 1):
+        distancias = np.where(visitado, np.inf, matriz[ordem[-1]])
+        proximo = int(np.argmin(distancias))
+        ordem.append(proximo)
+        visitado[proximo] = True
+    return ordem
+
+
+def dois_opt(matriz, ordem, prazo):
+    """
+    Melhora um caminho aberto invertendo trechos (2-opt) enquanto houver
+    ganho e não passar o prazo (time.monotonic())
+
+    O primeiro ponto (a origem) nunca sai do lugar. Para cada início de
+    trecho todos os finais possíveis são avaliados de uma vez com NumPy.
+    Retorna (ordem, completo); completo é False se o prazo encerrou a
+    otimização antes de um ótimo local.
+    """
+    ordem = np.asarray(ordem)
+    n = len(ordem)
+    if n < 4:
+        return ordem.tolist(), True
+
+    melhorou = True
+    while melhorou:
+        melhorou = False
+        for i in range(1, n - 1):
+            if time.monotonic() > prazo:
+                return ordem.tolist(), False
+
+            a, b = ordem[i - 1], ordem[i]
+            # Inverter ordem[i..j] troca as arestas (a, b) e (c, e) por
+            # (a, c) e (b, e); no fim do caminho não existe e
+            c = ordem[i + 1:]
+            e = np.append(ordem[i + 2:], ordem[-1])
+            tem_e = np.arange(i + 1, n) < n - 1
+
+            ganho = (
+                matriz[a, b] - matriz[a, c]
+                + np.where(tem_e, matriz[c, e] - matriz[b, e], 0.0)
+            )
+            k = int(np.argmax(ganho))
+            if ganho[k] > 1e-9:
+                j = i + 1 + k
+                ordem[i:j + 1] = ordem[i:j + 1][::-1].copy()
+                melhorou = True
+    return ordem.tolist(), True
+
+
+def distancia_caminho(matriz, ordem):
+    if len(ordem) < 2:
+        return 0.0
+    ordem = np.asarray(ordem)
+    return float(matriz[ordem[:-1], ordem[1:]].sum())
+
+
+def planejar_rota(coordenadas, tempo_maximo):
+    """
+    Ordem de visita das coordenadas partindo da primeira (a origem)
+
+    Vizinho mais próximo seguido de 2-opt, limitado a tempo_maximo
+    segundos. Retorna (ordem, matriz, completo).
+    """
+    prazo = time.monotonic() + tempo_maximo
+    matriz = matriz_distancias(coordenadas)
+    ordem = vizinho_mais_proximo(matriz)
+    ordem, completo = dois_opt(matriz, ordem, prazo)
+    return ordem, matriz, completo
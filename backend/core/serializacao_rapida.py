@@ -0,0 +1,334 @@
+"""
+Serialização rápida das listagens grandes de coletas e avaliações
+
+Em vez de instanciar os modelos e passar cada um pelos campos do DRF, a
+página é buscada com .values() e cada linha vira um dict por uma função
+montada uma única vez por serializer. A saída é a mesma do serializer
+correspondente (conferida por SerializacaoRapidaTestes em core/tests.py
+e, sobre uma base real, pelo comando conferir_serializacao_rapida):
+campos de modelo são formatados pelo próprio campo do serializer e os
+SerializerMethodField são reproduzidos sobre as colunas da linha.
+
+Ativada por requisição (?rapido=1 / ?rapido=0) ou para todas com
+SERIALIZACAO_RAPIDA.
+"""
+from collections import defaultdict
+from functools import cache
+from operator import itemgetter
+
+from django.conf import settings
+from rest_framework.response import Response
+
+from . import catalogo_materiais
+from .models import ImagemColetas, Pagamentos, Solicitacoes
+from .serializers import (AvaliacaoRetrieveSerializer,
+                          ColetasPendentesParceiroSerializer,
+                          ColetasRetrieveSerializer, ImagemColetaSerializer)
+
+VALORES_VERDADEIROS = ('1', 'true', 'sim')
+
+
+def ativa(request):
+    """?rapido= da requisição ou, sem ele, SERIALIZACAO_RAPIDA"""
+    valor = request.query_params.get('rapido')
+    if valor is None:
+        return settings.SERIALIZACAO_RAPIDA
+    return valor.lower() in VALORES_VERDADEIROS
+
+
+# ====================== EXTRATORES ======================
+# Cada extrator recebe a linha do .values() e devolve o valor do campo
+
+def _campo(serializer, nome, coluna=None):
+    """Coluna formatada pelo campo do serializer (como em to_representation)"""
+    formatar = serializer.fields[nome].to_representation
+    coluna = coluna or nome
+
+    def extrair(linha):
+        valor = linha[coluna]
+        return None if valor is None else formatar(valor)
+    return extrair
+
+
+def _rotulo(modelo, nome, coluna):
+    """Equivalente ao get_<campo>_display() do modelo"""
+    rotulos = dict(modelo._meta.get_field(nome).flatchoices)
+
+    def extrair(linha):
+        valor = linha[coluna]
+        return rotulos.get(valor, valor)
+    return extrair
+
+
+def _material_nome(coluna):
+    def extrair(linha):
+        return catalogo_materiais.nome(linha[coluna])
+    return extrair
+
+
+def _endereco_completo(linha):
+    # ColetasRetrieveSerializer.get_endereco_completo
+    if linha['id_enderecos'] is None:
+        return None
+    partes = [
+        linha['id_enderecos__rua'],
+        str(linha['id_enderecos__numero']),
+        linha['id_enderecos__bairro'],
+        linha['id_enderecos__cidade']
+    ]
+    endereco = ', '.join(p for p in partes if p)
+    if linha['id_enderecos__complemento']:
+        endereco += ' - ' + linha['id_enderecos__complemento']
+    return endereco
+
+
+def _endereco_pendente(linha):
+    # ColetasPendentesParceiroSerializer.get_endereco_completo
+    if linha['id_enderecos'] is None:
+        return None
+    return (
+        f"{linha['id_enderecos__rua']}, {linha['id_enderecos__numero']}, "
+        f"{linha['id_enderecos__bairro']}, {linha['id_enderecos__cidade']}"
+    )
+
+
+def _distancia_km(linha):
+    distancia = linha.get('distancia_km')
+    return round(distancia, 2) if distancia is not None else None
+
+
+def _se_existe(coluna_fk, extrair):
+    """Campo de um relacionamento opcional: None quando a FK é nula"""
+    def extrair_se_existe(linha):
+        return None if linha[coluna_fk] is None else extrair(linha)
+    return extrair_se_existe
+
+
+# ====================== FORMATOS ======================
+
+class Formato:
+    """
+    Colunas buscadas com .values() e a função linha -> dict de um
+    serializer, na ordem de Meta.fields
+    """
+
+    def __init__(self, serializer_class, colunas, campos, anotacoes=(), complementar=None):
+        nomes = [nome for nome, _ in campos]
+        assert nomes == list(serializer_class.Meta.fields), (
+            f'Campos do formato rápido diferentes de {serializer_class.__name__}'
+        )
+        self.colunas = tuple(colunas)
+        self.anotacoes = tuple(anotacoes)
+        self.complementar = complementar
+        self.converter = _compilar(campos)
+
+    def linhas(self, queryset):
+        colunas = self.colunas + tuple(
+            nome for nome in self.anotacoes if nome in queryset.query.annotations
+        )
+        return queryset.prefetch_related(None).values(*colunas)
+
+    def serializar(self, linhas):
+        linhas = list(linhas)
+        if self.complementar and linhas:
+            self.complementar(linhas)
+        converter = self.converter
+        return [converter(linha) for linha in linhas]
+
+
+def _compilar(campos):
+    campos = tuple(campos)
+
+    def converter(linha):
+        return {nome: extrair(linha) for nome, extrair in campos}
+    return converter
+
+
+COLUNAS_ENDERECO = (
+    'id_enderecos',
+    'id_enderecos__rua',
+    'id_enderecos__numero',
+    'id_enderecos__bairro',
+    'id_enderecos__cidade',
+)
+
+
+def _formato_coletas():
+    serializer = ColetasRetrieveSerializer()
+    imagem = ImagemColetaSerializer()
+    converter_imagem = _compilar([
+        ('id', itemgetter('id')),
+        ('imagem', _campo(imagem, 'imagem')),
+        ('criado_em', _campo(imagem, 'criado_em')),
+    ])
+
+    def complementar(linhas):
+        # Mesma consulta do prefetch_related('imagens_coletas')
+        imagens = defaultdict(list)
+        for linha in ImagemColetas.objects.filter(
+            id_coletas__in=[linha['id'] for linha in linhas]
+        ).values('id', 'imagem', 'criado_em', 'id_coletas'):
+            imagens[linha['id_coletas']].append(converter_imagem(linha))
+        for linha in linhas:
+            linha['imagens_coletas'] = imagens.get(linha['id'], [])
+
+    return Formato(
+        ColetasRetrieveSerializer,
+        colunas=(
+            'id',
+            'id_clientes__id_usuarios',
+            'id_clientes__id_usuarios__nome',
+            'id_parceiros__id_usuarios',
+            'id_parceiros__id_usuarios__nome',
+            'id_materiais',
+            'peso_material',
+            'quantidade_material',
+            *COLUNAS_ENDERECO,
+            'id_enderecos__complemento',
+            'id_solicitacoes',
+            'id_solicitacoes__estado_solicitacao',
+            'id_solicitacoes__observacoes',
+            'id_pagamentos',
+            'id_pagamentos__estado_pagamento',
+            'id_pagamentos__valor_pagamento',
+            'criado_em',
+            'atualizado_em',
+        ),
+        campos=[
+            ('id', itemgetter('id')),
+            ('cliente_id', itemgetter('id_clientes__id_usuarios')),
+            ('cliente_nome', itemgetter('id_clientes__id_usuarios__nome')),
+            ('parceiro_id', itemgetter('id_parceiros__id_usuarios')),
+            ('parceiro_nome', itemgetter('id_parceiros__id_usuarios__nome')),
+            ('material_nome', _material_nome('id_materiais')),
+            ('peso_material', _campo(serializer, 'peso_material')),
+            ('quantidade_material', _campo(serializer, 'quantidade_material')),
+            ('endereco_completo', _endereco_completo),
+            ('status_solicitacao', _se_existe('id_solicitacoes', _rotulo(
+                Solicitacoes, 'estado_solicitacao',
+                'id_solicitacoes__estado_solicitacao'
+            ))),
+            ('observacoes_solicitacao', itemgetter('id_solicitacoes__observacoes')),
+            ('status_pagamento', _se_existe('id_pagamentos', _rotulo(
+                Pagamentos, 'estado_pagamento', 'id_pagamentos__estado_pagamento'
+            ))),
+            ('valor_pagamento', itemgetter('id_pagamentos__valor_pagamento')),
+            ('criado_em', _campo(serializer, 'criado_em')),
+            ('atualizado_em', _campo(serializer, 'atualizado_em')),
+            ('imagens_coletas', itemgetter('imagens_coletas')),
+        ],
+        complementar=complementar
+    )
+
+
+def _formato_pendentes():
+    serializer = ColetasPendentesParceiroSerializer()
+    return Formato(
+        ColetasPendentesParceiroSerializer,
+        colunas=(
+            'id',
+            'id_clientes__id_usuarios__nome',
+            'id_materiais',
+            'peso_material',
+            'quantidade_material',
+            *COLUNAS_ENDERECO,
+            'id_pagamentos__valor_pagamento',
+            'criado_em',
+        ),
+        # Anotada por geo.filtrar_por_raio quando a busca tem origem
+        anotacoes=('distancia_km',),
+        campos=[
+            ('id', itemgetter('id')),
+            ('cliente_nome', itemgetter('id_clientes__id_usuarios__nome')),
+            ('material_nome', _material_nome('id_materiais')),
+            ('peso_material', _campo(serializer, 'peso_material')),
+            ('quantidade_material', _campo(serializer, 'quantidade_material')),
+            ('endereco_completo', _endereco_pendente),
+            ('valor_pagamento', itemgetter('id_pagamentos__valor_pagamento')),
+            ('criado_em', _campo(serializer, 'criado_em')),
+            ('distancia_km', _distancia_km),
+        ]
+    )
+
+
+def _formato_avaliacoes():
+    serializer = AvaliacaoRetrieveSerializer()
+    return Formato(
+        AvaliacaoRetrieveSerializer,
+        colunas=(
+            'id',
+            'id_coletas',
+            'id_coletas__id_materiais',
+            'id_clientes__id_usuarios',
+            'id_clientes__id_usuarios__nome',
+            'id_parceiros__id_usuarios',
+            'id_parceiros__id_usuarios__nome',
+            'nota_parceiros',
+            'descricao_parceiros',
+            'nota_clientes',
+            'descricao_clientes',
+            'criado_em',
+            'atualizado_em',
+        ),
+        campos=[
+            ('id', itemgetter('id')),
+            ('id_coletas', itemgetter('id_coletas')),
+            ('cliente_id', itemgetter('id_clientes__id_usuarios')),
+            ('cliente_nome', itemgetter('id_clientes__id_usuarios__nome')),
+            ('parceiro_id', itemgetter('id_parceiros__id_usuarios')),
+            ('parceiro_nome', itemgetter('id_parceiros__id_usuarios__nome')),
+            ('material_nome', _se_existe(
+                'id_coletas', _material_nome('id_coletas__id_materiais')
+            )),
+            ('nota_parceiros', _campo(serializer, 'nota_parceiros')),
+            ('descricao_parceiros', _campo(serializer, 'descricao_parceiros')),
+            ('nota_clientes', _campo(serializer, 'nota_clientes')),
+            ('descricao_clientes', _campo(serializer, 'descricao_clientes')),
+            ('criado_em', _campo(serializer, 'criado_em')),
+            ('atualizado_em', _campo(serializer, 'atualizado_em')),
+        ]
+    )
+
+
+_FORMATOS = {
+    ColetasRetrieveSerializer: _formato_coletas,
+    ColetasPendentesParceiroSerializer: _formato_pendentes,
+    AvaliacaoRetrieveSerializer: _formato_avaliacoes,
+}
+
+
+@cache
+def formato(serializer_class):
+    """Formato rápido do serializer (montado no primeiro uso)"""
+    return _FORMATOS[serializer_class]()
+
+
+def suportado(serializer_class):
+    return serializer_class in _FORMATOS
+
+
+class SerializacaoRapidaMixin:
+    """
+    Listagens de um ViewSet que podem usar a serialização rápida
+
+    responder_pagina() pagina e serializa o queryset pelo caminho rápido
+    quando ativa() e o serializer tem formato; senão usa o serializer.
+    """
+
+    def responder_pagina(self, queryset, serializer_class):
+        rapido = ativa(self.request) and suportado(serializer_class)
+        if rapido:
+            queryset = formato(serializer_class).linhas(queryset)
+
+        pagina = self.paginate_queryset(queryset)
+        itens = queryset if pagina is None else pagina
+        if rapido:
+            dados = formato(serializer_class).serializar(itens)
+        else:
+            dados = serializer_class(
+                itens, many=True, context=self.get_serializer_context()
+            ).data
+
+        if pagina is None:
+            return Response(dados)
+        return self.get_paginated_response(dados)
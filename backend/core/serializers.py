@@ -1,13 +1,17 @@
 # from django.contrib.auth.hashers import make_password
-import requests
+from django.conf import settings
 from django.core.validators import MinLengthValidator
 from django.db import transaction
+from django.utils.functional import cached_property
 from rest_framework import serializers
 from rest_framework.serializers import (CharField, DateField, ImageField,
                                         ModelSerializer,
                                         PrimaryKeyRelatedField, Serializer,
                                         ValidationError)
 
+from . import catalogo_materiais
+from .cache_respostas import invalidar
+from .cep import CEPIndisponivel, buscar_cep
 from .mixins import (GeocodingMixin, ValidacaoCEPMixin, ValidacaoCFPMixin,
                      ValidacaoCNPJMixin, ValidacaoTelefoneMixin)
 from .models import (Avaliacoes, Clientes, Coletas, Enderecos, EnderecoCliente, ImagemColetas,
@@ -15,11 +19,39 @@ from .models import (Avaliacoes, Clientes, Coletas, Enderecos, EnderecoCliente,
                      MateriaisPontosColeta, Pagamentos, Parceiros,
                      PontosColeta, Solicitacoes, Telefones, Usuarios)
 from .services import imagekit_service
+from .tasks import agendar_geocodificacao
 
 # Lembrar disso para os serializers
 # CRUD (create, retrieve, update, delete)
 
 
+# ====================== CAMPOS ======================
+
+class MaterialCatalogoField(PrimaryKeyRelatedField):
+    """
+    Chave de Materiais validada pelo catálogo em memória
+    (core.catalogo_materiais); só consulta o banco se o id não estiver
+    no catálogo (ex.: material criado na mesma transação)
+
+    A instância devolvida é a do catálogo, compartilhada entre requisições:
+    grave pelo id (id_materiais_id=material.id). Atribuída a um
+    OneToOneField, o Django guardaria nela o objeto do outro lado
+    """
+
+    def __init__(self, **kwargs):
+        if not kwargs.get('read_only'):
+            kwargs.setdefault('queryset', Materiais.objects.all())
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        material = catalogo_materiais.material(data)
+        if material is None:
+            return super().to_internal_value(data)
+        return material
+
+
 # ====================== SERIALIZERS DE TELEFONE ======================
 
 class TelefoneCreateSerializer(ValidacaoTelefoneMixin, ModelSerializer):
@@ -132,15 +164,17 @@ class UsuarioRetrieveSerializer(ModelSerializer):
         depth = 1
         
     def get_telefone(self, obj):
+        # Relação reversa: sem consulta quando o queryset da view usa
+        # select_related('telefones') (ou 'id_usuarios__telefones')
         try:
-            telefone = Telefones.objects.get(id_usuarios=obj.id)
-            return {
-                'numero': telefone.numero,
-                'criado_em': telefone.criado_em,
-                'atualizado_em': telefone.atualizado_em
-            }
+            telefone = obj.telefones
         except Telefones.DoesNotExist:
             return None
+        return {
+            'numero': telefone.numero,
+            'criado_em': telefone.criado_em,
+            'atualizado_em': telefone.atualizado_em
+        }
 
 
 # Serializer para endereços do usuário (para listagem na criação de coleta)
@@ -385,8 +419,7 @@ class ParceiroComUsuarioCreateSerializer(ValidacaoCNPJMixin, ModelSerializer):
         allow_null=True
     )
     id_usuarios = PrimaryKeyRelatedField(read_only=True)
-    materiais = PrimaryKeyRelatedField(
-        queryset=Materiais.objects.all(),
+    materiais = MaterialCatalogoField(
         many=True,
         required=False,
         write_only=True,
@@ -452,7 +485,7 @@ class ParceiroComUsuarioCreateSerializer(ValidacaoCNPJMixin, ModelSerializer):
         # Cria os relacionamentos com materiais
         for material in materiais_data:
             MateriaisParceiros.objects.create(
-                id_materiais=material,
+                id_materiais_id=material.id,
                 id_parceiros=parceiro
             )
 
@@ -480,8 +513,7 @@ class ParceiroComUsuarioUpdateSerializer(ValidacaoCNPJMixin, ModelSerializer):
         allow_null=True
     )
     cnpj = CharField(required=False)
-    materiais = PrimaryKeyRelatedField(
-        queryset=Materiais.objects.all(),
+    materiais = MaterialCatalogoField(
         many=True,
         required=False,
         write_only=True,
@@ -518,7 +550,7 @@ class ParceiroComUsuarioUpdateSerializer(ValidacaoCNPJMixin, ModelSerializer):
             # Cria novos relacionamentos
             for material in materiais_data:
                 MateriaisParceiros.objects.create(
-                    id_materiais=material,
+                    id_materiais_id=material.id,
                     id_parceiros=instance
                 )
 
@@ -572,7 +604,7 @@ class MateriaisSerializer(ModelSerializer):
 
 class ParceiroComUsuarioRetrieveSerializer(ModelSerializer):
     id_usuarios = UsuarioRetrieveSerializer(read_only=True)
-    materiais = MateriaisSerializer(many=True, read_only=True)
+    materiais = serializers.SerializerMethodField()
 
     class Meta:
         model = Parceiros
@@ -584,6 +616,12 @@ class ParceiroComUsuarioRetrieveSerializer(ModelSerializer):
         ]
         depth = 1
 
+    def get_materiais(self, obj):
+        # Só os ids vêm do banco (materiaisparceiros_set); os materiais
+        # saem do catálogo em memória
+        ids = [relacao.id_materiais_id for relacao in obj.materiaisparceiros_set.all()]
+        return MateriaisSerializer(catalogo_materiais.materiais(ids), many=True).data
+
 
 class EnderecoBuscaCEPSerializer(Serializer, ValidacaoCEPMixin):
     cep = CharField(max_length=15)
@@ -591,28 +629,23 @@ class EnderecoBuscaCEPSerializer(Serializer, ValidacaoCEPMixin):
     def validate_cep(self, value):
         cep = self.validar_cep(value)
 
-        # Consulta a API ViaCEP
-        url = f'https://viacep.com.br/ws/{cep}/json/'
-        response = requests.get(url)
+        # Consulta o índice local de CEPs (ViaCEP apenas como fallback)
+        try:
+            endereco = buscar_cep(cep)
+        except CEPIndisponivel:
+            raise ValidationError(
+                'Não foi possível consultar o CEP no momento'
+            )
 
-        if response.status_code != 200 or response.json().get('erro'):
+        if endereco is None:
             raise ValidationError('CEP não encontrado')
 
+        # Guarda o resultado para buscar_endereco não consultar de novo
+        self._endereco = endereco
         return cep
 
     def buscar_endereco(self):
-        cep = self.validated_data['cep']  # type: ignore
-        url = f'https://viacep.com.br/ws/{cep}/json/'
-        response = requests.get(url)
-        data = response.json()
-
-        return {
-            'cep': data.get('cep', '').replace('-', ''),
-            'estado': data.get('uf', ''),
-            'cidade': data.get('localidade', ''),
-            'bairro': data.get('bairro', ''),
-            'rua': data.get('logradouro', '')
-        }
+        return self._endereco
 
 
 class EnderecoCreateSerializer(
@@ -633,12 +666,21 @@ class EnderecoCreateSerializer(
             'bairro',
             'numero',
             'complemento',
+            'geocoding_status',
         ]
         read_only_fields = [
             'id',
+            'geocoding_status',
         ]
 
     def create(self, validated_data):
+        if settings.GEOCODING_ASSINCRONO:
+            # As coordenadas são resolvidas em segundo plano (core.tasks)
+            validated_data['geocoding_status'] = 'pendente'
+            endereco = super().create(validated_data)
+            agendar_geocodificacao(endereco.id)
+            return endereco
+
         # Monta o endereço completo para geocoding
         endereco_completo = (
             f"{validated_data.get('rua')}, {validated_data.get('numero')}, "
@@ -649,13 +691,14 @@ class EnderecoCreateSerializer(
         # Obtém as coordenadas
         coordenadas = self.get_lat_lon(endereco_completo)
 
-        if not coordenadas:
-            # Se não conseguir geocodificar,
-            # usa coordenadas padrão (centro do estado)
-            coordenadas = (-15.7801, -47.9292)  # Coordenadas de Brasília
-
-        validated_data['latitude'] = coordenadas[0]
-        validated_data['longitude'] = coordenadas[1]
+        if coordenadas:
+            validated_data['latitude'] = coordenadas[0]
+            validated_data['longitude'] = coordenadas[1]
+            validated_data['geocoding_status'] = 'concluido'
+        else:
+            # Sem coordenadas falsas: o endereço fica fora dos cálculos
+            # de distância até ser geocodificado novamente
+            validated_data['geocoding_status'] = 'falhou'
 
         return super().create(validated_data)
 
@@ -680,7 +723,11 @@ class EnderecoUpdateSerializer(
             'rua',
             'bairro',
             'numero',
-            'complemento'
+            'complemento',
+            'geocoding_status',
+        ]
+        read_only_fields = [
+            'geocoding_status',
         ]
 
     def update(self, instance, validated_data):
@@ -692,7 +739,10 @@ class EnderecoUpdateSerializer(
             campo in validated_data for campo in campos_geocoding
         )
 
-        if precisa_geocodificar:
+        if precisa_geocodificar and settings.GEOCODING_ASSINCRONO:
+            # Mantém as coordenadas antigas até o novo geocoding terminar
+            instance.geocoding_status = 'pendente'
+        elif precisa_geocodificar:
             # Usa os novos valores ou mantém os existentes
             endereco_completo = (
                 f"{validated_data.get('rua', instance.rua)}, "
@@ -708,18 +758,21 @@ class EnderecoUpdateSerializer(
             if coordenadas:
                 instance.latitude = coordenadas[0]
                 instance.longitude = coordenadas[1]
-            elif not instance.latitude or not instance.longitude:
+                instance.geocoding_status = 'concluido'
+            elif instance.latitude is None or instance.longitude is None:
                 # Se não conseguir geocodificar e
                 # não tiver coordenadas existentes
-                coordenadas = (-15.7801, -47.9292)  # Coordenadas de Brasília
-                instance.latitude = coordenadas[0]
-                instance.longitude = coordenadas[1]
+                instance.geocoding_status = 'falhou'
 
         # Atualiza os outros campos normalmente
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
 
         instance.save()
+
+        if precisa_geocodificar and settings.GEOCODING_ASSINCRONO:
+            agendar_geocodificacao(instance.id)
+
         return instance
 
 
@@ -737,6 +790,7 @@ class EnderecoRetrieveSerializer(ModelSerializer):
             'complemento',
             'latitude',
             'longitude',
+            'geocoding_status',
         ]
 
 
@@ -827,7 +881,7 @@ class AvaliacaoRetrieveSerializer(ModelSerializer):
         return obj.id_parceiros.id_usuarios.id if obj.id_parceiros and obj.id_parceiros.id_usuarios else None
 
     def get_material_nome(self, obj):
-        return obj.id_coletas.id_materiais.nome if obj.id_coletas and obj.id_coletas.id_materiais else None
+        return catalogo_materiais.nome(obj.id_coletas.id_materiais_id) if obj.id_coletas else None
 
 
 class EstatisticasClienteSerializer(serializers.Serializer):
@@ -890,12 +944,97 @@ class PagamentoCreateSerializer(serializers.ModelSerializer):
         }
 
 
+class RelacionadoEmLoteField(serializers.PrimaryKeyRelatedField):
+    """
+    PrimaryKeyRelatedField que usa os objetos já carregados pelo
+    ListSerializer (context['relacionados_lote']) em vez de uma consulta
+    por item
+    """
+
+    def to_internal_value(self, data):
+        carregados = self.context.get('relacionados_lote', {}).get(self.field_name)
+        if carregados is None:
+            return super().to_internal_value(data)
+
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            objeto = carregados.get(int(data))
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if objeto is None:
+            self.fail('does_not_exist', pk_value=data)
+        return objeto
+
+
+class ColetasCreateListSerializer(serializers.ListSerializer):
+    """
+    Criação de várias coletas: chaves estrangeiras validadas com uma
+    consulta por tabela e um bulk_create por tabela, em uma transação
+    """
+    RELACIONADOS = ('id_clientes', 'id_enderecos')
+
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            self.context['relacionados_lote'] = self._carregar_relacionados(data)
+        return super().to_internal_value(data)
+
+    def _carregar_relacionados(self, data):
+        carregados = {}
+        for nome in self.RELACIONADOS:
+            ids = set()
+            for item in data:
+                valor = item.get(nome) if isinstance(item, dict) else None
+                if isinstance(valor, bool):
+                    continue
+                try:
+                    ids.add(int(valor))
+                except (TypeError, ValueError):
+                    continue
+            campo = self.child.fields[nome]
+            carregados[nome] = campo.get_queryset().in_bulk(ids)
+        return carregados
+
+    @transaction.atomic
+    def create(self, validated_data):
+        solicitacoes = Solicitacoes.objects.bulk_create([
+            Solicitacoes(estado_solicitacao='pendente', **item['dados_solicitacao'])
+            for item in validated_data
+        ])
+        pagamentos = Pagamentos.objects.bulk_create([
+            Pagamentos(estado_pagamento='pendente', **item['dados_pagamento'])
+            for item in validated_data
+        ])
+        coletas = Coletas.objects.bulk_create([
+            Coletas(
+                id_solicitacoes=solicitacao,
+                id_pagamentos=pagamento,
+                **{
+                    campo: valor for campo, valor in item.items()
+                    if campo not in ('dados_solicitacao', 'dados_pagamento')
+                }
+            )
+            for item, solicitacao, pagamento in zip(
+                validated_data, solicitacoes, pagamentos
+            )
+        ])
+
+        invalidar(Solicitacoes, Pagamentos, Coletas)
+        from .indice_espacial import indice_pendentes
+        indice_pendentes.publicar_inclusoes([coleta.id for coleta in coletas])
+
+        return coletas
+
+
 class ColetasCreateSerializer(serializers.ModelSerializer):
+    serializer_related_field = RelacionadoEmLoteField
+    id_materiais = MaterialCatalogoField()
     dados_solicitacao = SolicitacaoCreateSerializer(write_only=True)
     dados_pagamento = PagamentoCreateSerializer(write_only=True)
 
     class Meta:
         model = Coletas
+        list_serializer_class = ColetasCreateListSerializer
         fields = [
             'id_clientes',
             'id_materiais',
@@ -946,6 +1085,10 @@ class ColetasCreateSerializer(serializers.ModelSerializer):
             **validated_data
         )
 
+        # Import local: indice_espacial usa os serializers deste módulo
+        from .indice_espacial import indice_pendentes
+        indice_pendentes.publicar_inclusao(coleta.id)
+
         return coleta
 
 
@@ -1026,9 +1169,7 @@ class ColetasRetrieveSerializer(serializers.ModelSerializer):
         return None
 
     def get_material_nome(self, obj):
-        if obj.id_materiais:
-            return obj.id_materiais.nome
-        return None
+        return catalogo_materiais.nome(obj.id_materiais_id)
 
     def get_endereco_completo(self, obj):
         if obj.id_enderecos:
@@ -1073,6 +1214,8 @@ class ColetasPendentesParceiroSerializer(serializers.ModelSerializer):
     material_nome = serializers.SerializerMethodField()
     endereco_completo = serializers.SerializerMethodField()
     valor_pagamento = serializers.SerializerMethodField()
+    # Preenchida apenas quando a busca informa uma origem
+    distancia_km = serializers.SerializerMethodField()
 
     class Meta:
         model = Coletas
@@ -1084,14 +1227,15 @@ class ColetasPendentesParceiroSerializer(serializers.ModelSerializer):
             'quantidade_material',
             'endereco_completo',
             'valor_pagamento',
-            'criado_em'
+            'criado_em',
+            'distancia_km'
         ]
 
     def get_cliente_nome(self, obj):
         return obj.id_clientes.id_usuarios.nome if obj.id_clientes and obj.id_clientes.id_usuarios else None
 
     def get_material_nome(self, obj):
-        return obj.id_materiais.nome if obj.id_materiais else None
+        return catalogo_materiais.nome(obj.id_materiais_id)
 
     def get_endereco_completo(self, obj):
         if obj.id_enderecos:
@@ -1102,6 +1246,10 @@ class ColetasPendentesParceiroSerializer(serializers.ModelSerializer):
     def get_valor_pagamento(self, obj):
         return obj.id_pagamentos.valor_pagamento if obj.id_pagamentos else None
 
+    def get_distancia_km(self, obj):
+        distancia = getattr(obj, 'distancia_km', None)
+        return round(distancia, 2) if distancia is not None else None
+
 
 class MateriaisParceirosSerializer(ModelSerializer):
     class Meta:
@@ -1133,8 +1281,7 @@ class PagamentosSerializer(ModelSerializer):
 
 
 class PontosColetaCreateSerializer(ModelSerializer):
-    materiais = PrimaryKeyRelatedField(
-        queryset=Materiais.objects.all(),
+    materiais = MaterialCatalogoField(
         many=True,
         required=True,
         write_only=True
@@ -1163,7 +1310,7 @@ class PontosColetaCreateSerializer(ModelSerializer):
         # Cria os relacionamentos com materiais
         for material in materiais_data:
             MateriaisPontosColeta.objects.create(
-                id_materiais=material,
+                id_materiais_id=material.id,
                 id_pontos_coleta=ponto_coleta
             )
 
@@ -1171,8 +1318,7 @@ class PontosColetaCreateSerializer(ModelSerializer):
 
 
 class PontosColetaUpdateSerializer(ModelSerializer):
-    materiais = PrimaryKeyRelatedField(
-        queryset=Materiais.objects.all(),
+    materiais = MaterialCatalogoField(
         many=True,
         required=False,
         write_only=True
@@ -1210,7 +1356,7 @@ class PontosColetaUpdateSerializer(ModelSerializer):
             # Cria novos relacionamentos
             for material in materiais_data:
                 MateriaisPontosColeta.objects.create(
-                    id_materiais=material,
+                    id_materiais_id=material.id,
                     id_pontos_coleta=instance
                 )
 
@@ -1247,10 +1393,39 @@ class EnderecoSimplesPCSerializer(ModelSerializer):
         return ', '.join(filter(None, partes))
 
 
+class EnderecoPontoColetaSerializer(ModelSerializer):
+    class Meta:
+        model = Enderecos
+        fields = '__all__'
+
+
+class ParceiroPontoColetaSerializer(ModelSerializer):
+    """Parceiro resumido para a leitura de pontos de coleta"""
+    nome = CharField(source='id_usuarios.nome', read_only=True)
+    telefone = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Parceiros
+        fields = ['id', 'id_usuarios', 'cnpj', 'nome', 'telefone']
+        read_only_fields = fields
+
+    def get_telefone(self, obj):
+        # Telefone já prefetchado pela PontosColetaViewSet
+        try:
+            return obj.id_usuarios.telefones.numero
+        except Telefones.DoesNotExist:
+            return None
+
+
 class PontosColetaRetrieveSerializer(ModelSerializer):
-    materiais = MateriaisSerializer(many=True, read_only=True)
-    id_parceiros = ParceiroComUsuarioCreateSerializer()
-    # telefone_parceiro = serializers.SerializerMethodField()
+    """
+    Leitura de pontos de coleta (list, retrieve e proximos), somente com
+    campos de leitura: endereço e parceiro vêm do select_related e
+    telefone/materiais dos prefetch da PontosColetaViewSet
+    """
+    id_enderecos = EnderecoPontoColetaSerializer(read_only=True)
+    id_parceiros = ParceiroPontoColetaSerializer(read_only=True)
+    materiais = serializers.SerializerMethodField()
 
     class Meta:
         model = PontosColeta
@@ -1261,27 +1436,35 @@ class PontosColetaRetrieveSerializer(ModelSerializer):
             'descricao',
             'horario_funcionamento',
             'id_parceiros',
-            # 'telefone_parceiro',
             'materiais'
         ]
-        depth = 1
+        read_only_fields = fields
 
-    def get_id_parceiros(self, obj):
-        #  Método customizado para serializar o parceiro sem materiais
-        return {
-            'id': obj.id_parceiros.id,
-            'cnpj': obj.id_parceiros.cnpj,
-            'id_usuarios': obj.id_parceiros.id_usuarios,
-        }
+    @cached_property
+    def _material(self):
+        # Um único serializer de material para todos os pontos da página
+        return MateriaisSerializer()
+
+    def get_materiais(self, obj):
+        ids = [
+            relacao.id_materiais_id
+            for relacao in obj.materiaispontoscoleta_set.all()
+        ]
+        return [
+            self._material.to_representation(material)
+            for material in catalogo_materiais.materiais(ids)
+        ]
+
+
+class PontosColetaProximosSerializer(PontosColetaRetrieveSerializer):
+    """Pontos de coleta com a distância (km) até a origem da busca"""
+    distancia_km = serializers.SerializerMethodField()
+
+    class Meta(PontosColetaRetrieveSerializer.Meta):
+        fields = PontosColetaRetrieveSerializer.Meta.fields + ['distancia_km']
 
-    # def get_telefone_parceiro(self, obj):
-    #     if obj.id_parceiros and obj.id_parceiros.id_usuarios:
-    #         try:
-    #             telefone = obj.id_parceiros.id_usuarios.telefones
-    #             return telefone.numero
-    #         except Telefones.DoesNotExist:
-    #             return None
-    #     return None
+    def get_distancia_km(self, obj):
+        return round(obj.distancia_km, 2)
 
 
 class SolicitacoesSerializer(ModelSerializer):
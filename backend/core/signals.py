@@ -0,0 +1,23 @@
+from django.apps import apps
+from django.db.models.signals import m2m_changed, post_delete, post_save
+
+from .cache_respostas import invalidar
+
+
+def _invalidar_modelo(sender, **kwargs):
+    invalidar(sender)
+
+
+def _invalidar_relacao(sender, action, **kwargs):
+    # sender é a tabela intermediária (ex.: MateriaisPontosColeta)
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidar(sender)
+
+
+def conectar():
+    """Versão do cache de respostas incrementada a cada gravação"""
+    for modelo in apps.get_app_config('core').get_models():
+        uid = f'cache_respostas:{modelo._meta.label_lower}'
+        post_save.connect(_invalidar_modelo, sender=modelo, dispatch_uid=uid)
+        post_delete.connect(_invalidar_modelo, sender=modelo, dispatch_uid=uid)
+    m2m_changed.connect(_invalidar_relacao, dispatch_uid='cache_respostas:m2m')
@@ -0,0 +1,187 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from celery_app import app
+
+from .cache_respostas import invalidar
+from .geocodificacao import (CAMPOS_ENDERECO, GeocodificacaoIndisponivel,
+                             montar_endereco_completo)
+from .mixins import GeocodingMixin
+from .models import Enderecos
+
+logger = logging.getLogger(__name__)
+
+PREFIXO_AGENDADO = 'geocoding:agendado'
+
+
+def _marcar_agendados(ids, segundos):
+    """
+    Marca os endereços que já têm uma tarefa de geocoding a caminho (na
+    fila ou aguardando retry) pelos próximos `segundos`, para a tarefa
+    periódica não abrir outra cadeia em paralelo
+    """
+    try:
+        cache.set_many(
+            {f'{PREFIXO_AGENDADO}:{i}': 1 for i in ids},
+            timeout=segundos
+        )
+    except Exception as e:
+        logger.warning('Erro ao marcar endereços agendados: %s', e)
+
+
+def _agendados(ids):
+    chaves = {f'{PREFIXO_AGENDADO}:{i}': i for i in ids}
+    try:
+        return {chaves[chave] for chave in cache.get_many(list(chaves))}
+    except Exception as e:
+        logger.warning('Erro ao ler endereços agendados: %s', e)
+        return set()
+
+
+@app.task(bind=True, max_retries=settings.GEOCODING_MAX_TENTATIVAS)
+def geocodificar_enderecos(self, ids):
+    """
+    Resolve as coordenadas de um lote de endereços pendentes
+
+    Endereços não encontrados ficam com geocoding_status 'falhou' e sem
+    coordenadas. Falhas temporárias do Nominatim são tentadas novamente
+    com backoff exponencial, apenas para os endereços que falharam.
+    """
+    enderecos = Enderecos.objects.filter(
+        id__in=ids,
+        geocoding_status='pendente'
+    )
+
+    falhas_temporarias = []
+    atualizados = []
+    for endereco in enderecos:
+        try:
+            coordenadas = GeocodingMixin.geocodificar(
+                montar_endereco_completo(endereco)
+            )
+        except GeocodificacaoIndisponivel as e:
+            logger.warning('Geocoding do endereço %s falhou: %s', endereco.id, e)
+            falhas_temporarias.append(endereco.id)
+            continue
+
+        if coordenadas:
+            dados = {
+                'latitude': coordenadas[0],
+                'longitude': coordenadas[1],
+                'geocoding_status': 'concluido',
+            }
+        else:
+            dados = {'geocoding_status': 'falhou'}
+
+        # Filtra pelo status para não sobrescrever um endereço que
+        # já foi resolvido por outra tarefa, e pelo texto geocodificado
+        # para descartar o resultado se o endereço mudou nesse meio tempo
+        # (a mudança agenda outra tarefa)
+        if Enderecos.objects.filter(
+            id=endereco.id,
+            geocoding_status='pendente',
+            **{campo: getattr(endereco, campo) for campo in CAMPOS_ENDERECO}
+        ).update(atualizado_em=timezone.now(), **dados):
+            atualizados.append(endereco.id)
+
+    # update() não dispara sinais: coordenadas aparecem nas respostas em cache
+    invalidar(Enderecos)
+    if atualizados:
+        _republicar_pendentes(atualizados)
+
+    if not falhas_temporarias:
+        return
+
+    if self.request.retries >= self.max_retries:
+        Enderecos.objects.filter(
+            id__in=falhas_temporarias,
+            geocoding_status='pendente'
+        ).update(geocoding_status='falhou', atualizado_em=timezone.now())
+        invalidar(Enderecos)
+        return
+
+    espera = settings.GEOCODING_BACKOFF_BASE * (2 ** self.request.retries)
+    # O retry não altera atualizado_em: sem a marca a tarefa periódica
+    # reenviaria esses endereços a cada minuto durante a espera
+    _marcar_agendados(
+        falhas_temporarias, espera + settings.GEOCODING_PENDENTE_APOS
+    )
+    raise self.retry(args=[falhas_temporarias], countdown=espera)
+
+
+def _republicar_pendentes(endereco_ids):
+    """
+    Republica no índice em memória as coletas pendentes desses endereços:
+    as entradas guardam as coordenadas da inclusão
+    """
+    # Import local: core.indice_espacial depende dos serializers, que
+    # importam este módulo
+    from .indice_espacial import coletas_pendentes, indice_pendentes
+    coleta_ids = list(coletas_pendentes().filter(
+        id_enderecos__in=endereco_ids
+    ).values_list('id', flat=True))
+    if coleta_ids:
+        indice_pendentes.publicar_inclusoes(coleta_ids)
+
+
+@app.task
+def processar_enderecos_pendentes():
+    """
+    Tarefa periódica que reenvia, em lotes, endereços que continuam
+    pendentes (ex.: a tarefa original não chegou ao broker). Ignora os
+    que já têm tarefa na fila ou aguardando retry (_marcar_agendados)
+    """
+    limite = timezone.now() - timedelta(
+        seconds=settings.GEOCODING_PENDENTE_APOS
+    )
+    ids = list(
+        Enderecos.objects.filter(
+            geocoding_status='pendente',
+            atualizado_em__lt=limite
+        ).order_by('id').values_list('id', flat=True)
+    )
+    agendados = _agendados(ids)
+    ids = [i for i in ids if i not in agendados]
+    _marcar_agendados(ids, settings.GEOCODING_PENDENTE_APOS)
+
+    tamanho = settings.GEOCODING_LOTE
+    for inicio in range(0, len(ids), tamanho):
+        geocodificar_enderecos.delay(ids[inicio:inicio + tamanho])
+
+    return len(ids)
+
+
+@app.task
+def despachar_coletas_pendentes():
+    """
+    Tarefa periódica do despacho automático (opt-in com
+    DESPACHO_AUTOMATICO=True): atribui coletas pendentes a parceiros
+    """
+    if not settings.DESPACHO_AUTOMATICO:
+        return 0
+
+    # Import local: core.despacho depende dos serializers, que importam
+    # este módulo
+    from .despacho import despachar
+    aplicadas, _ = despachar()
+    return len(aplicadas)
+
+
+def agendar_geocodificacao(endereco_id):
+    """Envia o endereço para a fila após o commit da transação atual"""
+    def enviar():
+        try:
+            geocodificar_enderecos.delay([endereco_id])
+        except Exception as e:
+            # A tarefa periódica processa o endereço depois
+            logger.warning(
+                'Não foi possível agendar geocoding do endereço %s: %s',
+                endereco_id, e
+            )
+
+    transaction.on_commit(enviar)
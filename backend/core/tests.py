@@ -1,3 +1,667 @@
-from django.test import TestCase
+import threading
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from . import (catalogo_materiais, estados_coleta, resumo_avaliacoes,
+               serializacao_rapida, tasks)
+from .indice_espacial import indice_pendentes
+from .middleware import OrcamentoConsultasExcedido
+from .mixins import GeocodingMixin
+from .models import (Avaliacoes, Clientes, Coletas, Enderecos, ImagemColetas,
+                     Materiais, MateriaisParceiros, MateriaisPontosColeta,
+                     Pagamentos, Parceiros, PontosColeta, ResumoAvaliacoes,
+                     Solicitacoes, Telefones, Usuarios)
+from .serializers import (AvaliacaoRetrieveSerializer,
+                          ColetasPendentesParceiroSerializer,
+                          ColetasRetrieveSerializer)
+from .views import UsuariosCreateViewSet
+
+
+# ====================== DADOS DE TESTE ======================
+
+def criar_endereco(indice=1, **campos):
+    dados = {
+        'cep': '80020310',
+        'estado': 'PR',
+        'cidade': 'Curitiba',
+        'bairro': 'Centro',
+        'rua': f'Rua das Araucárias {indice}',
+        'numero': indice,
+        'latitude': -25.43,
+        'longitude': -49.27,
+        'geocoding_status': 'concluido',
+    }
+    dados.update(campos)
+    return Enderecos.objects.create(**dados)
+
+
+def criar_material(nome='Papel'):
+    return Materiais.objects.create(nome=nome, descricao=nome, preco='1.00')
+
+
+def criar_usuario(indice, telefone=True):
+    usuario = Usuarios.objects.create(
+        nome=f'Usuário {indice}',
+        usuario=f'usuario{indice}',
+        email=f'usuario{indice}@exemplo.com',
+        senha='12345678',
+        id_endereco=criar_endereco(indice),
+    )
+    if telefone:
+        Telefones.objects.create(id_usuarios=usuario, numero=f'4199999{indice:04d}')
+    return usuario
+
+
+def criar_cliente(indice):
+    return Clientes.objects.create(
+        id_usuarios=criar_usuario(indice),
+        cpf=f'{indice:011d}',
+        data_nascimento='1990-01-01',
+        sexo='F',
+    )
+
+
+def criar_parceiro(indice, materiais=()):
+    parceiro = Parceiros.objects.create(
+        id_usuarios=criar_usuario(indice), cnpj=f'{indice:014d}'
+    )
+    for material in materiais:
+        MateriaisParceiros.objects.create(
+            id_materiais=material, id_parceiros=parceiro
+        )
+    return parceiro
+
+
+def criar_coleta(cliente, material, parceiro=None, endereco=None,
+                 estado='pendente', **campos):
+    dados = {
+        'id_clientes': cliente,
+        'id_parceiros': parceiro,
+        'id_materiais': material,
+        'peso_material': '12.5000',
+        'id_enderecos': endereco or criar_endereco(),
+        'id_solicitacoes': Solicitacoes.objects.create(
+            estado_solicitacao=estado, observacoes='Portão azul'
+        ),
+        'id_pagamentos': Pagamentos.objects.create(
+            valor_pagamento='35.90', saldo_pagamento='0',
+            estado_pagamento='pendente'
+        ),
+    }
+    dados.update(campos)
+    return Coletas.objects.create(**dados)
+
+
+class TesteBase(TestCase):
+    """
+    Cache em memória vazio e catálogo de materiais e índice de pendentes
+    recarregados em cada teste: as versões do cache só sobem após o
+    commit, que não acontece dentro do TestCase
+    """
+
+    def setUp(self):
+        cache.clear()
+        catalogo_materiais._atual = None
+        indice_pendentes._versao = None
+
+
+# ====================== CONSULTAS POR LISTAGEM ======================
+
+@override_settings(CACHE_RESPOSTAS_ATIVO=False)
+class ConsultasListagensTestes(TesteBase):
+    """Listagens com o mesmo número de consultas com 1 e com N itens"""
+    TAMANHO = 10
+
+    @classmethod
+    def setUpTestData(cls):
+        materiais = [criar_material(f'Material {i}') for i in range(cls.TAMANHO)]
+        for i in range(cls.TAMANHO):
+            criar_cliente(i + 1)
+            criar_parceiro(100 + i, materiais=[materiais[i]])
+
+    def _listar(self, url, tamanho):
+        resposta = self.client.get(url, {'tamanho_pagina': tamanho})
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(len(resposta.json()['results']), tamanho)
+
+    def _conferir(self, url):
+        # Primeira requisição fora da medição: carrega o catálogo
+        self._listar(url, 1)
+        with CaptureQueriesContext(connection) as consultas:
+            self._listar(url, 1)
+        with self.assertNumQueries(len(consultas)):
+            self._listar(url, self.TAMANHO)
+
+    def test_usuarios(self):
+        self._conferir('/v1/usuarios/')
+
+    def test_clientes(self):
+        self._conferir('/v1/clientes/')
+
+    def test_parceiros(self):
+        self._conferir('/v1/parceiros/')
+
+
+# ====================== ORÇAMENTO DE CONSULTAS ======================
+
+@override_settings(
+    CACHE_RESPOSTAS_ATIVO=False,
+    INDICE_PENDENTES_ATIVO=False,
+    ORCAMENTO_CONSULTAS_ATIVO=True,
+    ORCAMENTO_CONSULTAS_ESTRITO=True,
+)
+class OrcamentoConsultasTestes(TesteBase):
+    """
+    Cada ação com orcamento_consultas fica dentro dele: no modo estrito o
+    OrcamentoConsultasMiddleware levanta OrcamentoConsultasExcedido, que o
+    cliente de testes repassa
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        materiais = [criar_material(f'Material {i}') for i in range(3)]
+        cls.cliente = criar_cliente(1)
+        cls.parceiro = criar_parceiro(2, materiais=materiais)
+        criar_cliente(3)
+        criar_parceiro(4, materiais=[criar_material('Vidro')])
+
+        ponto = PontosColeta.objects.create(
+            nome='Ecoponto Centro',
+            id_enderecos=criar_endereco(5),
+            id_parceiros=cls.parceiro,
+        )
+        for material in materiais:
+            MateriaisPontosColeta.objects.create(
+                id_materiais=material, id_pontos_coleta=ponto
+            )
+
+        cls.pendentes = [
+            criar_coleta(cls.cliente, materiais[0]) for _ in range(3)
+        ]
+        cls.aceita = criar_coleta(
+            cls.cliente, materiais[1], parceiro=cls.parceiro, estado='aceitado'
+        )
+        cls.coletada = criar_coleta(
+            cls.cliente, materiais[1], parceiro=cls.parceiro, estado='coletado'
+        )
+        finalizada = criar_coleta(
+            cls.cliente, materiais[2], parceiro=cls.parceiro, estado='finalizado'
+        )
+        Avaliacoes.objects.create(
+            id_coletas=finalizada,
+            id_clientes=cls.cliente,
+            id_parceiros=cls.parceiro,
+            nota_parceiros=5,
+            nota_clientes=4,
+        )
+
+    def _conferir(self, metodo, url, dados=None, status=200):
+        with self.subTest(url=url):
+            resposta = getattr(self.client, metodo)(url, dados)
+            self.assertEqual(resposta.status_code, status)
+            self.assertIn('X-Consultas-SQL', resposta)
+
+    def test_consultas(self):
+        usuario_cliente = self.cliente.id_usuarios
+        usuario_parceiro = self.parceiro.id_usuarios
+        urls = [
+            '/v1/usuarios/',
+            f'/v1/usuarios/{usuario_cliente.id}/',
+            '/v1/clientes/',
+            f'/v1/clientes/{self.cliente.id}/',
+            f'/v1/clientes/por-usuario/{usuario_cliente.usuario}/',
+            '/v1/parceiros/',
+            f'/v1/parceiros/{self.parceiro.id}/',
+            f'/v1/parceiros/por-usuario/{usuario_parceiro.usuario}/',
+            '/v1/materiais/',
+            f'/v1/materiais/{self.aceita.id_materiais_id}/',
+            '/v1/telefones/',
+            f'/v1/telefones/{usuario_cliente.id}/',
+            '/v1/pontos-coleta/',
+            f'/v1/pontos-coleta/{PontosColeta.objects.get().id}/',
+            '/v1/pontos-coleta/proximos/?lat=-25.43&lon=-49.27',
+            '/v1/avaliacoes/',
+            f'/v1/avaliacoes/estatisticas-cliente/{usuario_cliente.id}/',
+            f'/v1/avaliacoes/estatisticas-parceiro/{usuario_parceiro.id}/',
+            '/v1/coletas/',
+            f'/v1/coletas/{self.aceita.id}/',
+            f'/v1/coletas/pendentes-parceiro/{usuario_parceiro.id}/',
+            f'/v1/coletas/pendentes-parceiro/{usuario_parceiro.id}/?lat=-25.43&lon=-49.27',
+            f'/v1/coletas/minhas-coletas-parceiro/{usuario_parceiro.id}/',
+            f'/v1/coletas/minhas-coletas-cliente/{usuario_cliente.id}/',
+            f'/v1/coletas/rota-parceiro/{usuario_parceiro.id}/',
+        ]
+        # Primeira requisição carrega o catálogo (fora da medição, mas
+        # dentro do mesmo teste)
+        for url in urls:
+            self._conferir('get', url)
+
+    def test_transicoes(self):
+        self._conferir(
+            'post', f'/v1/coletas/{self.pendentes[0].id}/aceitar-coleta/',
+            {'parceiro_id': self.parceiro.id_usuarios_id}
+        )
+        self._conferir('post', f'/v1/coletas/{self.aceita.id}/marcar-coletado/')
+        self._conferir('post', f'/v1/coletas/{self.pendentes[1].id}/cancelar-coleta/')
+        self._conferir('post', f'/v1/coletas/{self.coletada.id}/finalizar-coleta/')
+
+    def test_orcamento_excedido(self):
+        with mock.patch.object(
+            UsuariosCreateViewSet, 'orcamento_consultas', {'list': 1}
+        ):
+            with self.assertRaises(OrcamentoConsultasExcedido):
+                self.client.get('/v1/usuarios/')
+
+            with override_settings(ORCAMENTO_CONSULTAS_ESTRITO=False):
+                with self.assertLogs('core.consultas', 'WARNING'):
+                    resposta = self.client.get('/v1/usuarios/')
+            self.assertEqual(resposta['X-Consultas-SQL'], '2')
+
+    async def test_asgi(self):
+        # No ASGI a view síncrona roda em outra thread: o contador chega a
+        # ela pelo contexto
+        with mock.patch.object(
+            UsuariosCreateViewSet, 'orcamento_consultas', {'list': 1}
+        ):
+            with self.assertRaises(OrcamentoConsultasExcedido):
+                await self.async_client.get('/v1/usuarios/')
+
+
+# ====================== CATÁLOGO DE MATERIAIS ======================
+
+@override_settings(CACHE_RESPOSTAS_ATIVO=False)
+class CatalogoMateriaisTestes(TesteBase):
+
+    def test_gravacao_nao_altera_catalogo(self):
+        material = criar_material()
+        parceiro = criar_parceiro(1)
+        resposta = self.client.post('/v1/pontos-coleta/', {
+            'nome': 'Ecoponto Centro',
+            'id_enderecos': criar_endereco(2).id,
+            'id_parceiros': parceiro.id,
+            'materiais': [material.id],
+        })
+        self.assertEqual(resposta.status_code, 201)
+        self.assertTrue(MateriaisPontosColeta.objects.filter(
+            id_materiais=material, id_pontos_coleta=resposta.json()['id']
+        ).exists())
+        # A instância do catálogo é compartilhada entre requisições: o
+        # OneToOneField não pode ter guardado nela o ponto de coleta
+        self.assertEqual(catalogo_materiais.material(material.id)._state.fields_cache, {})
+
+
+# ====================== BUSCA POR DISTÂNCIA ======================
+
+@override_settings(CACHE_RESPOSTAS_ATIVO=False)
+class BuscaDistanciaTestes(TesteBase):
+
+    def test_raio_invalido(self):
+        for raio in ('abc', '0', '-1', 'nan', 'inf', '-inf'):
+            with self.subTest(raio=raio):
+                resposta = self.client.get(
+                    '/v1/pontos-coleta/proximos/',
+                    {'lat': -25.43, 'lon': -49.27, 'raio': raio}
+                )
+                self.assertEqual(resposta.status_code, 400)
+                self.assertIn('raio', resposta.json())
+
+    @override_settings(INDICE_PENDENTES_ATIVO=True)
+    def test_raio_invalido_no_indice(self):
+        # nan chegava ao índice em memória e respondia uma página vazia
+        material = criar_material()
+        parceiro = criar_parceiro(1, materiais=[material])
+        criar_coleta(criar_cliente(2), material)
+        url = f'/v1/coletas/pendentes-parceiro/{parceiro.id_usuarios_id}/'
+        for params in (
+            {'lat': -25.43, 'lon': -49.27, 'raio': 'nan'},
+            {'origem': 'endereco', 'raio': 'nan'},
+        ):
+            with self.subTest(**params):
+                resposta = self.client.get(url, params)
+                self.assertEqual(resposta.status_code, 400)
+                self.assertIn('raio', resposta.json())
+
+        resposta = self.client.get(url, {'origem': 'endereco', 'raio': 5})
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(len(resposta.json()['results']), 1)
+
+
+# ====================== GEOCODING ======================
+
+class GeocodingTestes(TesteBase):
+
+    def _geocodificar(self, endereco, coordenadas, durante=None):
+        def geocodificar(texto):
+            if durante:
+                durante()
+            return coordenadas
+
+        with mock.patch.object(GeocodingMixin, 'geocodificar', side_effect=geocodificar):
+            tasks.geocodificar_enderecos.apply(args=[[endereco.id]])
+        endereco.refresh_from_db()
+
+    def test_grava_coordenadas(self):
+        endereco = criar_endereco(
+            latitude=None, longitude=None, geocoding_status='pendente'
+        )
+        self._geocodificar(endereco, (-25.5, -49.3))
+        self.assertEqual(endereco.geocoding_status, 'concluido')
+        self.assertEqual((endereco.latitude, endereco.longitude), (-25.5, -49.3))
+
+    def test_endereco_alterado_durante_geocoding(self):
+        endereco = criar_endereco(
+            latitude=None, longitude=None, geocoding_status='pendente'
+        )
+
+        def alterar():
+            Enderecos.objects.filter(id=endereco.id).update(rua='Rua Nova')
+
+        # O resultado é do texto antigo: fica para a tarefa da alteração
+        self._geocodificar(endereco, (-25.5, -49.3), durante=alterar)
+        self.assertEqual(endereco.geocoding_status, 'pendente')
+        self.assertIsNone(endereco.latitude)
+
+    @override_settings(CACHE_RESPOSTAS_ATIVO=False, INDICE_PENDENTES_ATIVO=True)
+    def test_atualiza_indice_pendentes(self):
+        material = criar_material()
+        parceiro = criar_parceiro(1, materiais=[material])
+        endereco = criar_endereco(
+            2, latitude=None, longitude=None, geocoding_status='pendente'
+        )
+        criar_coleta(criar_cliente(3), material, endereco=endereco)
+
+        url = f'/v1/coletas/pendentes-parceiro/{parceiro.id_usuarios_id}/'
+        busca = {'lat': -25.5, 'lon': -49.3, 'raio': 1}
+        self.assertEqual(self.client.get(url, busca).json()['results'], [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self._geocodificar(endereco, (-25.5, -49.3))
+
+        resultados = self.client.get(url, busca).json()['results']
+        self.assertEqual(len(resultados), 1)
+        self.assertEqual(resultados[0]['distancia_km'], 0)
+
+
+# ====================== ESTADOS DA COLETA ======================
+
+@override_settings(CACHE_RESPOSTAS_ATIVO=False)
+class EstadosColetaTestes(TesteBase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.material = criar_material()
+        cls.cliente = criar_cliente(1)
+        cls.parceiro = criar_parceiro(2, materiais=[cls.material])
+
+    def _estado(self, coleta):
+        coleta.id_solicitacoes.refresh_from_db()
+        return coleta.id_solicitacoes.estado_solicitacao
+
+    def test_aceitar(self):
+        coleta = criar_coleta(self.cliente, self.material)
+        resposta = self.client.post(
+            f'/v1/coletas/{coleta.id}/aceitar-coleta/',
+            {'parceiro_id': self.parceiro.id_usuarios_id}
+        )
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(self._estado(coleta), 'aceitado')
+
+    def test_aceitar_id_invalido(self):
+        resposta = self.client.post(
+            '/v1/coletas/abc/aceitar-coleta/',
+            {'parceiro_id': self.parceiro.id_usuarios_id}
+        )
+        self.assertEqual(resposta.status_code, 404)
+
+    def test_transicoes(self):
+        coleta = criar_coleta(
+            self.cliente, self.material, parceiro=self.parceiro, estado='aceitado'
+        )
+        for acao, estado in (
+            ('marcar-coletado', 'coletado'), ('finalizar-coleta', 'finalizado')
+        ):
+            resposta = self.client.post(f'/v1/coletas/{coleta.id}/{acao}/')
+            self.assertEqual(resposta.status_code, 200)
+            self.assertEqual(self._estado(coleta), estado)
+
+        coleta = criar_coleta(self.cliente, self.material)
+        resposta = self.client.post(f'/v1/coletas/{coleta.id}/cancelar-coleta/')
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(self._estado(coleta), 'cancelado')
+
+    def test_resumo_conta_finalizacao_com_avaliacao_existente(self):
+        coleta = criar_coleta(
+            self.cliente, self.material, parceiro=self.parceiro, estado='coletado'
+        )
+        # Avaliação gravada antes da finalização: não é recriada
+        Avaliacoes.objects.create(
+            id_coletas=coleta,
+            id_clientes=self.cliente,
+            id_parceiros=self.parceiro,
+            nota_parceiros=0,
+            nota_clientes=0,
+        )
+        for tipo, referencia in (('cliente', self.cliente), ('parceiro', self.parceiro)):
+            resumo_avaliacoes.obter_resumo(tipo, referencia.id)
+
+        resposta = self.client.post(f'/v1/coletas/{coleta.id}/finalizar-coleta/')
+        self.assertEqual(resposta.status_code, 200)
+
+        campos = ['total_coletas_finalizadas', 'total_avaliacoes', 'soma_notas']
+        campos += [f'nota_{nota}' for nota in resumo_avaliacoes.NOTAS]
+        for tipo, referencia in (('cliente', self.cliente), ('parceiro', self.parceiro)):
+            with self.subTest(tipo=tipo):
+                incremental = ResumoAvaliacoes.objects.filter(
+                    tipo=tipo, referencia_id=referencia.id
+                ).values(*campos).get()
+                self.assertEqual(incremental['total_coletas_finalizadas'], 1)
+                resumo_avaliacoes.reconstruir(tipo, [referencia.id])
+                reconstruido = ResumoAvaliacoes.objects.filter(
+                    tipo=tipo, referencia_id=referencia.id
+                ).values(*campos).get()
+                self.assertEqual(incremental, reconstruido)
+
+    def test_transicoes_id_invalido(self):
+        for acao in ('marcar-coletado', 'cancelar-coleta', 'finalizar-coleta'):
+            with self.subTest(acao=acao):
+                resposta = self.client.post(f'/v1/coletas/abc/{acao}/')
+                self.assertEqual(resposta.status_code, 404)
+
+
+class AceiteConcorrenteTestes(TransactionTestCase):
+    """
+    Várias threads aceitam a mesma coleta ao mesmo tempo, cada uma com a
+    sua conexão e transação: o UPDATE condicional deixa só uma vencer
+    """
+    THREADS = 8
+
+    def setUp(self):
+        # O SQLite em memória recusa escritas simultâneas ("table is
+        # locked") em vez de esperar a outra transação
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('exige um banco com escritas concorrentes')
+        cache.clear()
+        catalogo_materiais._atual = None
+        indice_pendentes._versao = None
+
+    def test_aceite_unico(self):
+        material = criar_material()
+        parceiro = criar_parceiro(1, materiais=[material])
+        coleta = criar_coleta(criar_cliente(2), material)
+
+        largada = threading.Barrier(self.THREADS)
+        resultados = [None] * self.THREADS
+
+        def aceitar(posicao):
+            try:
+                largada.wait()
+                estados_coleta.aceitar_coleta(coleta.id, parceiro.id)
+                resultados[posicao] = 'aceita'
+            except estados_coleta.TransicaoInvalida:
+                resultados[posicao] = 'recusada'
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=aceitar, args=(posicao,))
+            for posicao in range(self.THREADS)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(resultados.count('aceita'), 1)
+        self.assertEqual(resultados.count('recusada'), self.THREADS - 1)
+        coleta.refresh_from_db()
+        coleta.id_solicitacoes.refresh_from_db()
+        self.assertEqual(coleta.id_parceiros_id, parceiro.id)
+        self.assertEqual(coleta.id_solicitacoes.estado_solicitacao, 'aceitado')
+
+
+# ====================== SERIALIZAÇÃO RÁPIDA ======================
+
+def _linha(instancia, colunas):
+    """Linha como a de .values(*colunas), lida da instância"""
+    linha = {}
+    for coluna in colunas:
+        *caminho, nome = coluna.split('__')
+        valor = instancia
+        for parte in caminho:
+            valor = getattr(valor, parte) if valor is not None else None
+        if valor is not None:
+            # Chave estrangeira: .values() devolve o id
+            valor = getattr(valor, valor._meta.get_field(nome).attname)
+        linha[coluna] = valor
+    return linha
+
+
+@override_settings(CACHE_RESPOSTAS_ATIVO=False, INDICE_PENDENTES_ATIVO=False)
+class SerializacaoRapidaTestes(TesteBase):
+    """O caminho rápido (?rapido=1) responde igual aos serializers"""
+
+    @classmethod
+    def setUpTestData(cls):
+        material = criar_material()
+        cls.cliente = criar_cliente(1)
+        cls.parceiro = criar_parceiro(2, materiais=[material])
+
+        # Pendentes: com complemento, por quantidade e sem coordenadas
+        criar_coleta(
+            cls.cliente, material,
+            endereco=criar_endereco(3, complemento='Apto 12')
+        )
+        criar_coleta(
+            cls.cliente, material, peso_material=None, quantidade_material=4
+        )
+        criar_coleta(
+            cls.cliente, material,
+            endereco=criar_endereco(
+                4, latitude=None, longitude=None, geocoding_status='pendente'
+            )
+        )
+
+        aceita = criar_coleta(
+            cls.cliente, material, parceiro=cls.parceiro, estado='aceitado'
+        )
+        ImagemColetas.objects.create(id_coletas=aceita, imagem='coletas/1.jpg')
+
+        finalizada = criar_coleta(
+            cls.cliente, material, parceiro=cls.parceiro, estado='finalizado'
+        )
+        Avaliacoes.objects.create(
+            id_coletas=finalizada,
+            id_clientes=cls.cliente,
+            id_parceiros=cls.parceiro,
+            nota_parceiros=5,
+            descricao_parceiros='Pontual',
+            nota_clientes=0,
+        )
+
+    def _comparar(self, url, params=None):
+        params = {'tamanho_pagina': 3, **(params or {})}
+        normal = self.client.get(url, {**params, 'rapido': 0})
+        rapido = self.client.get(url, {**params, 'rapido': 1})
+        self.assertEqual(normal.status_code, 200)
+        self.assertEqual(rapido.status_code, 200)
+        # Os links de paginação carregam o próprio ?rapido=
+        self.assertEqual(
+            normal.content, rapido.content.replace(b'rapido=1', b'rapido=0')
+        )
+        return normal.json()['results']
+
+    def test_coletas(self):
+        self.assertEqual(len(self._comparar('/v1/coletas/', {'tamanho_pagina': 10})), 5)
+
+    def test_minhas_coletas(self):
+        usuario_parceiro = self.parceiro.id_usuarios_id
+        usuario_cliente = self.cliente.id_usuarios_id
+        self._comparar(f'/v1/coletas/minhas-coletas-parceiro/{usuario_parceiro}/')
+        self._comparar(f'/v1/coletas/minhas-coletas-cliente/{usuario_cliente}/')
+
+    def test_avaliacoes(self):
+        self.assertEqual(len(self._comparar('/v1/avaliacoes/')), 1)
+
+    def test_pendentes_sem_distancia(self):
+        url = f'/v1/coletas/pendentes-parceiro/{self.parceiro.id_usuarios_id}/'
+        resultados = self._comparar(url, {'tamanho_pagina': 10})
+        self.assertEqual(len(resultados), 3)
+        self.assertEqual({item['distancia_km'] for item in resultados}, {None})
+
+    def test_pendentes_com_distancia(self):
+        url = f'/v1/coletas/pendentes-parceiro/{self.parceiro.id_usuarios_id}/'
+        resultados = self._comparar(url, {'lat': -25.44, 'lon': -49.28, 'raio': 10})
+        # A coleta sem coordenadas fica de fora da busca por distância
+        self.assertEqual(len(resultados), 2)
+        self.assertNotIn(None, [item['distancia_km'] for item in resultados])
+
+    def _conferir_nulo(self, serializer_class, instancia, campo):
+        formato = serializacao_rapida.formato(serializer_class)
+        # Os relacionamentos são NOT NULL no modelo (e no banco de testes),
+        # mas os serializers tratam a ausência: o formato rápido também
+        with mock.patch.object(instancia._meta.get_field(campo), 'null', True):
+            setattr(instancia, campo, None)
+            esperado = serializer_class(instancia).data
+            obtido = formato.serializar([_linha(instancia, formato.colunas)])
+        self.assertEqual(obtido, [esperado])
+
+    def test_relacionamentos_nulos(self):
+        relacionados = (
+            'id_clientes__id_usuarios', 'id_parceiros__id_usuarios',
+            'id_enderecos', 'id_solicitacoes', 'id_pagamentos',
+        )
+        casos = [
+            (ColetasRetrieveSerializer, 'id_enderecos'),
+            (ColetasRetrieveSerializer, 'id_solicitacoes'),
+            (ColetasRetrieveSerializer, 'id_pagamentos'),
+            (ColetasPendentesParceiroSerializer, 'id_enderecos'),
+            (ColetasPendentesParceiroSerializer, 'id_pagamentos'),
+        ]
+        for serializer_class, campo in casos:
+            with self.subTest(serializer=serializer_class.__name__, campo=campo):
+                coleta = Coletas.objects.select_related(*relacionados).filter(
+                    id_parceiros=None
+                ).first()
+                self._conferir_nulo(serializer_class, coleta, campo)
+
+        with self.subTest(serializer='AvaliacaoRetrieveSerializer', campo='id_coletas'):
+            avaliacao = Avaliacoes.objects.select_related(
+                'id_clientes__id_usuarios', 'id_parceiros__id_usuarios'
+            ).get()
+            self._conferir_nulo(AvaliacaoRetrieveSerializer, avaliacao, 'id_coletas')
+
+    def test_distancia_anotada(self):
+        formato = serializacao_rapida.formato(ColetasPendentesParceiroSerializer)
+        coleta = Coletas.objects.select_related(
+            'id_clientes__id_usuarios', 'id_enderecos', 'id_pagamentos'
+        ).first()
+        coleta.distancia_km = 3.14159
+        linha = {**_linha(coleta, formato.colunas), 'distancia_km': 3.14159}
+        self.assertEqual(
+            formato.serializar([linha]),
+            [ColetasPendentesParceiroSerializer(coleta).data]
+        )
@@ -12,7 +12,8 @@ from .views import (AvaliacoesViewSet, ClienteComUsuarioCreateViewSet,
                     PagamentosViewSet, ParceiroComUsuarioCreateViewSet,
                     ParceirosApiView, PingView, PontosColetaViewSet,
                     SolicitacoesViewSet, TelefonesViewSet,
-                    UsuariosCreateViewSet,EnderecoClienteViewSet, home)
+                    UsuariosCreateViewSet,EnderecoClienteViewSet,
+                    eventos_pendentes_parceiro, home)
 
 # from django.conf.urls.static import static
 # from django.conf import settings
@@ -72,6 +73,13 @@ urlpatterns = [
     # Painel de administração
     path('admin/', django_admin.site.urls),
 
+    # Eventos (SSE) das coletas pendentes, antes do router de coletas
+    path(
+        'v1/coletas/eventos-parceiro/<int:parceiro_id>/',
+        eventos_pendentes_parceiro,
+        name='coletas-eventos-parceiro'
+    ),
+
     # API v1 - Todas as rotas registradas no router
     path('v1/', include(router.urls)),
 
@@ -91,13 +99,22 @@ urlpatterns = [
 # 
 # COLETAS - Principais funcionalidades:
 # GET /v1/coletas/pendentes-parceiro/{parceiro_id}/ - Lista coletas pendentes para parceiro
+#   ?lat=&lon=&raio= ou ?origem=endereco&raio= - Apenas as próximas, ordenadas pela distância
+# GET /v1/coletas/eventos-parceiro/{parceiro_id}/ - Server-Sent Events: nova, aceita, cancelada
+#   (use após carregar pendentes-parceiro, em vez de repetir a consulta)
 # GET /v1/coletas/minhas-coletas-parceiro/{parceiro_id}/ - Lista coletas do parceiro
 # GET /v1/coletas/minhas-coletas-cliente/{cliente_id}/ - Lista coletas do cliente
+# GET /v1/coletas/rota-parceiro/{parceiro_id}/ - Ordem de visita das coletas aceitas (?lat=&lon= opcionais)
+# POST /v1/coletas/lote/ - Criar várias coletas de uma vez (lista no body)
 # POST /v1/coletas/{id}/aceitar-coleta/ - Aceitar coleta (parceiro)
 # POST /v1/coletas/{id}/marcar-coletado/ - Marcar como coletado (parceiro)
 # POST /v1/coletas/{id}/finalizar-coleta/ - Finalizar coleta (cliente)
 # POST /v1/coletas/{id}/cancelar-coleta/ - Cancelar coleta (cliente)
+# POST /v1/coletas/transicao-lote/ - Mesma ação em várias coletas (body: acao, coletas, parceiro_id)
 # POST /v1/coletas/{id}/upload-imagem/ - Upload de imagem
+# As listagens de coletas são paginadas por cursor:
+# ?tamanho_pagina=N e ?cursor=... (use os links next/previous da resposta)
+# ?rapido=1 (listagens de coletas e avaliações) - Mesmo JSON, montado a partir de .values()
 #
 # AVALIAÇÕES - Sistema de avaliações mútuas:
 # GET /v1/avaliacoes/ - Lista todas as avaliações
@@ -110,6 +127,9 @@ urlpatterns = [
 # ENDEREÇOS:
 # POST /v1/enderecos/buscar-cep/ - Buscar dados de endereço por CEP
 #
+# PONTOS DE COLETA:
+# GET /v1/pontos-coleta/proximos/?lat=&lon=&raio=&material= - Pontos mais próximos (raio em km, ordenados pela distância)
+#
 # USUÁRIOS:
 # GET /v1/clientes/por-usuario/{usuario}/ - Buscar cliente por nome de usuário
 # GET /v1/parceiros/por-usuario/{usuario}/ - Buscar parceiro por nome de usuário
@@ -1,14 +1,17 @@
 import os
 
 # from rest_framework.decorators import action
-from django.core.cache import cache
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
 from django.db import transaction
-from django.db.models import Prefetch, Q
-from django.http import JsonResponse
+from django.db.models import Q
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from rest_framework import status, viewsets, permissions
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.generics import ListCreateAPIView
 from rest_framework.response import Response
 # from rest_framework.permissions import IsAuthenticated
@@ -41,11 +44,17 @@ from .serializers import (AvaliacaoClienteSerializer,
                           ParceiroComUsuarioRetrieveSerializer,
                           ParceiroComUsuarioUpdateSerializer,
                           PontosColetaCreateSerializer,
+                          PontosColetaProximosSerializer,
                           PontosColetaRetrieveSerializer,
                           PontosColetaUpdateSerializer, SolicitacoesSerializer,
                           TelefoneCreateSerializer, TelefoneRetrieveSerializer,
                           TelefonesSerializer, TelefoneUpdateSerializer,
                           UsuarioCreateSerializer, UsuarioRetrieveSerializer, EnderecoClienteSerializer)
+from .cache_respostas import CacheRespostaMixin
+from .paginacao import PaginacaoKeyset, PaginacaoPadrao, PaginacaoSemContagem
+from .serializacao_rapida import SerializacaoRapidaMixin
+from . import (catalogo_materiais, estados_coleta, eventos, geo,
+               indice_espacial, resumo_avaliacoes, rotas)
 from .services import imagekit_service
 
 
@@ -53,9 +62,50 @@ def home(request):
     return JsonResponse({"mensagem": "APIs GreenCycle App"})
 
 
+async def eventos_pendentes_parceiro(request, parceiro_id):
+    """
+    Server-Sent Events com as coletas pendentes que surgem (nova) ou
+    deixam de estar disponíveis (aceita, cancelada) para os materiais do
+    parceiro. O cliente carrega pendentes-parceiro uma vez e depois só
+    acompanha este fluxo, sem polling.
+
+    Só funciona servido por ASGI (asgi.py, ver Dockerfile): no WSGI o
+    Django consome o iterador assíncrono inteiro antes de enviar a
+    resposta, e como o fluxo não termina o worker ficaria preso para
+    sempre sem o cliente receber nada. Por isso responde 501 fora do ASGI.
+    """
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse(
+            {'error': 'Eventos disponíveis apenas com o servidor ASGI'},
+            status=501
+        )
+
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Método não permitido'}, status=405)
+
+    dados = await sync_to_async(indice_espacial.dados_parceiro)(parceiro_id)
+    if dados is None:
+        return JsonResponse({'error': 'Parceiro não encontrado'}, status=404)
+
+    resposta = StreamingHttpResponse(
+        eventos.transmitir(set(dados['materiais'])),
+        content_type='text/event-stream'
+    )
+    resposta['Cache-Control'] = 'no-cache'
+    # Desliga o buffer do nginx para os eventos saírem na hora
+    resposta['X-Accel-Buffering'] = 'no'
+    return resposta
+
+
 # ViewSets
-class UsuariosCreateViewSet(viewsets.ModelViewSet):
-    queryset = Usuarios.objects.all()
+class UsuariosCreateViewSet(CacheRespostaMixin, viewsets.ModelViewSet):
+    cache_modelos = (Usuarios, Enderecos, Telefones)
+    # Máximo de consultas SQL por ação, conferido pelo
+    # OrcamentoConsultasMiddleware
+    orcamento_consultas = {'list': 2, 'retrieve': 1}
+    queryset = Usuarios.objects.all().select_related(
+        'id_endereco', 'telefones'
+    ).order_by('id')
 
     def get_serializer_class(self):
         if self.action == 'create':
@@ -80,9 +130,6 @@ class UsuariosCreateViewSet(viewsets.ModelViewSet):
 
         headers = self.get_success_headers(serializer_class.data)
 
-        # Remove cache de listagem de usuários se existir
-        cache.delete('usuarios_list')
-
         return Response(
             serializer_class.data,
             status=status.HTTP_201_CREATED,
@@ -90,8 +137,13 @@ class UsuariosCreateViewSet(viewsets.ModelViewSet):
         )
 
 
-class ClienteComUsuarioCreateViewSet(viewsets.ModelViewSet):
-    queryset = Clientes.objects.all().select_related('id_usuarios')
+class ClienteComUsuarioCreateViewSet(CacheRespostaMixin, viewsets.ModelViewSet):
+    cache_modelos = (Clientes, Usuarios, Enderecos, Telefones)
+    orcamento_consultas = {'list': 2, 'retrieve': 1, 'por_usuario': 1}
+    queryset = Clientes.objects.all().select_related(
+        'id_usuarios__id_endereco',
+        'id_usuarios__telefones'
+    ).order_by('id')
 
     def get_serializer_class(self):
         if self.action == 'retrieve':
@@ -124,9 +176,6 @@ class ClienteComUsuarioCreateViewSet(viewsets.ModelViewSet):
         self.perform_create(serializer_class)
         headers = self.get_success_headers(serializer_class.data)
 
-        # Remove cache de listagem de clientes se existir
-        cache.delete('clientes_list')
-
         return Response(
             serializer_class.data,
             status=status.HTTP_201_CREATED,
@@ -140,7 +189,7 @@ class ClienteComUsuarioCreateViewSet(viewsets.ModelViewSet):
     )
     def por_usuario(self, request, usuario=None):
         try:
-            cliente = Clientes.objects.get(id_usuarios__usuario=usuario)
+            cliente = self.get_queryset().get(id_usuarios__usuario=usuario)
             serializer = self.get_serializer(cliente)
             return Response(serializer.data)
         except Clientes.DoesNotExist:
@@ -154,18 +203,25 @@ class EnderecoClienteViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return EnderecoCliente.objects.filter(cliente=self.request.user)
+        return EnderecoCliente.objects.filter(
+            cliente=self.request.user
+        ).order_by('id')
 
     def perform_create(self, serializer):
         serializer.save(cliente=self.request.user)
 
 
-class ParceiroComUsuarioCreateViewSet(viewsets.ModelViewSet):
+class ParceiroComUsuarioCreateViewSet(CacheRespostaMixin, viewsets.ModelViewSet):
+    cache_modelos = (
+        Parceiros, Usuarios, Enderecos, Telefones, MateriaisParceiros, Materiais
+    )
+    orcamento_consultas = {'list': 3, 'retrieve': 2, 'por_usuario': 2}
     queryset = Parceiros.objects.all().select_related(
-        'id_usuarios'
+        'id_usuarios__id_endereco',
+        'id_usuarios__telefones'
     ).prefetch_related(
-        'materiaisparceiros_set__id_materiais'
-    )
+        'materiaisparceiros_set'
+    ).order_by('id')
 
     def get_serializer_class(self):
         if self.action == 'retrieve':
@@ -198,9 +254,6 @@ class ParceiroComUsuarioCreateViewSet(viewsets.ModelViewSet):
         self.perform_create(serializer_class)
         headers = self.get_success_headers(serializer_class.data)
 
-        # Remove cache de listagem de parceiros se existir
-        cache.delete('parceiros_list')
-
         return Response(
             serializer_class.data,
             status=status.HTTP_201_CREATED,
@@ -214,7 +267,7 @@ class ParceiroComUsuarioCreateViewSet(viewsets.ModelViewSet):
     )
     def por_usuario(self, request, usuario=None):
         try:
-            parceiro = Parceiros.objects.get(id_usuarios__usuario=usuario)
+            parceiro = self.get_queryset().get(id_usuarios__usuario=usuario)
             serializer = self.get_serializer(parceiro)
             return Response(serializer.data)
         except Parceiros.DoesNotExist:
@@ -225,7 +278,9 @@ class ParceiroComUsuarioCreateViewSet(viewsets.ModelViewSet):
 
 
 class EnderecosViewSet(viewsets.ModelViewSet):
-    queryset = Enderecos.objects.all()
+    queryset = Enderecos.objects.all().order_by('id')
+    # Tabela grande: pagina sem COUNT(*)
+    pagination_class = PaginacaoSemContagem
 
     def get_serializer_class(self):
         if self.action == 'create':
@@ -244,13 +299,24 @@ class EnderecosViewSet(viewsets.ModelViewSet):
         return Response(endereco)
 
 
-class AvaliacoesViewSet(viewsets.ModelViewSet):
+class AvaliacoesViewSet(SerializacaoRapidaMixin, viewsets.ModelViewSet):
     queryset = Avaliacoes.objects.all().select_related(
         'id_clientes__id_usuarios',
         'id_parceiros__id_usuarios',
-        'id_coletas__id_materiais'
-    )
-    
+        'id_coletas'
+    ).order_by('id')
+    # Tabela grande: pagina sem COUNT(*)
+    pagination_class = PaginacaoSemContagem
+    orcamento_consultas = {
+        'list': 1,
+        'retrieve': 1,
+        'avaliar_parceiro': 6,
+        'avaliar_cliente': 6,
+        # Sem resumo gravado, ele é montado na primeira consulta
+        'estatisticas_cliente': 10,
+        'estatisticas_parceiro': 10,
+    }
+
     def get_serializer_class(self):
         if self.action == 'retrieve' or self.action == 'list':
             return AvaliacaoRetrieveSerializer
@@ -262,6 +328,10 @@ class AvaliacoesViewSet(viewsets.ModelViewSet):
             return AvaliacaoRetrieveSerializer  # Placeholder
         return AvaliacoesSerializer
 
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        return self.responder_pagina(queryset, self.get_serializer_class())
+
     def create(self, request, *args, **kwargs):
         """Criação automática de avaliação - uso interno apenas"""
         return Response(
@@ -308,24 +378,32 @@ class AvaliacoesViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Buscar avaliação existente (sempre deve existir após finalização)
-        try:
-            avaliacao = Avaliacoes.objects.get(id_coletas=coleta)
-        except Avaliacoes.DoesNotExist:
-            return Response(
-                {'error': 'Avaliação não encontrada. A coleta pode não ter sido finalizada corretamente.'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
         # Cliente pode editar sua avaliação quantas vezes quiser
         # (removida validação que impedia re-avaliação)
         
         # Atualizar avaliação do parceiro
         serializer = AvaliacaoClienteSerializer(data=request.data)
         if serializer.is_valid():
-            avaliacao.nota_parceiros = serializer.validated_data['nota_parceiros']
-            avaliacao.descricao_parceiros = serializer.validated_data.get('descricao_parceiros', '')
-            avaliacao.save()
+            with transaction.atomic():
+                # Buscar avaliação existente (sempre deve existir após finalização)
+                # O lock evita que duas edições simultâneas desajustem o resumo
+                try:
+                    avaliacao = Avaliacoes.objects.select_for_update().get(
+                        id_coletas=coleta
+                    )
+                except Avaliacoes.DoesNotExist:
+                    return Response(
+                        {'error': 'Avaliação não encontrada. A coleta pode não ter sido finalizada corretamente.'},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+
+                nota_anterior = avaliacao.nota_parceiros
+                avaliacao.nota_parceiros = serializer.validated_data['nota_parceiros']
+                avaliacao.descricao_parceiros = serializer.validated_data.get('descricao_parceiros', '')
+                avaliacao.save()
+                resumo_avaliacoes.registrar_nota(
+                    'parceiro', avaliacao.id_parceiros_id, nota_anterior, avaliacao.nota_parceiros
+                )
             
             # Verificar se é primeira avaliação ou edição
             if avaliacao.nota_parceiros == 0:
@@ -379,24 +457,32 @@ class AvaliacoesViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Buscar avaliação existente (sempre deve existir após finalização)
-        try:
-            avaliacao = Avaliacoes.objects.get(id_coletas=coleta)
-        except Avaliacoes.DoesNotExist:
-            return Response(
-                {'error': 'Avaliação não encontrada. A coleta pode não ter sido finalizada corretamente.'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
         # Parceiro pode editar sua avaliação quantas vezes quiser
         # (removida validação que impedia re-avaliação)
         
         # Atualizar avaliação do cliente
         serializer = AvaliacaoParceiroSerializer(data=request.data)
         if serializer.is_valid():
-            avaliacao.nota_clientes = serializer.validated_data['nota_clientes']
-            avaliacao.descricao_clientes = serializer.validated_data.get('descricao_clientes', '')
-            avaliacao.save()
+            with transaction.atomic():
+                # Buscar avaliação existente (sempre deve existir após finalização)
+                # O lock evita que duas edições simultâneas desajustem o resumo
+                try:
+                    avaliacao = Avaliacoes.objects.select_for_update().get(
+                        id_coletas=coleta
+                    )
+                except Avaliacoes.DoesNotExist:
+                    return Response(
+                        {'error': 'Avaliação não encontrada. A coleta pode não ter sido finalizada corretamente.'},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+
+                nota_anterior = avaliacao.nota_clientes
+                avaliacao.nota_clientes = serializer.validated_data['nota_clientes']
+                avaliacao.descricao_clientes = serializer.validated_data.get('descricao_clientes', '')
+                avaliacao.save()
+                resumo_avaliacoes.registrar_nota(
+                    'cliente', avaliacao.id_clientes_id, nota_anterior, avaliacao.nota_clientes
+                )
             
             # Verificar se é primeira avaliação ou edição
             if avaliacao.nota_clientes == 0:
@@ -426,45 +512,11 @@ class AvaliacoesViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
 
-        # Buscar avaliações onde o cliente foi avaliado
-        avaliacoes = Avaliacoes.objects.filter(
-            id_clientes=cliente,
-            nota_clientes__gt=0  # Apenas avaliações com nota válida
-        )
-
-        if not avaliacoes.exists():
-            return Response({
-                'cliente_id': cliente.id_usuarios.id,
-                'cliente_nome': cliente.id_usuarios.nome,
-                'total_avaliacoes': 0,
-                'media_notas': 0,
-                'notas_detalhadas': {str(i): 0 for i in range(6)},
-                'total_coletas_finalizadas': 0
-            })
-
-        # Calcular estatísticas
-        notas = [av.nota_clientes for av in avaliacoes]
-        media_notas = sum(notas) / len(notas)
-        
-        # Contar cada nota
-        notas_detalhadas = {str(i): 0 for i in range(6)}
-        for nota in notas:
-            notas_detalhadas[str(nota)] += 1
-
-        # Total de coletas finalizadas do cliente
-        total_coletas = Coletas.objects.filter(
-            id_clientes=cliente,
-            id_solicitacoes__estado_solicitacao='finalizado',
-            id_pagamentos__estado_pagamento='pago'
-        ).count()
-
+        resumo = resumo_avaliacoes.obter_resumo('cliente', cliente.id)
         return Response({
             'cliente_id': cliente.id_usuarios.id,
             'cliente_nome': cliente.id_usuarios.nome,
-            'total_avaliacoes': len(notas),
-            'media_notas': round(media_notas, 2),
-            'notas_detalhadas': notas_detalhadas,
-            'total_coletas_finalizadas': total_coletas
+            **_formatar_estatisticas(resumo)
         })
 
     @action(detail=False, methods=['get'], url_path='estatisticas-parceiro/(?P<parceiro_id>[^/]+)')
@@ -482,54 +534,52 @@ class AvaliacoesViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
 
-        # Buscar avaliações onde o parceiro foi avaliado
-        avaliacoes = Avaliacoes.objects.filter(
-            id_parceiros=parceiro,
-            nota_parceiros__gt=0  # Apenas avaliações com nota válida
-        )
-
-        if not avaliacoes.exists():
-            return Response({
-                'parceiro_id': parceiro.id_usuarios.id,
-                'parceiro_nome': parceiro.id_usuarios.nome,
-                'total_avaliacoes': 0,
-                'media_notas': 0,
-                'notas_detalhadas': {str(i): 0 for i in range(6)},
-                'total_coletas_finalizadas': 0
-            })
-
-        # Calcular estatísticas
-        notas = [av.nota_parceiros for av in avaliacoes]
-        media_notas = sum(notas) / len(notas)
-        
-        # Contar cada nota
-        notas_detalhadas = {str(i): 0 for i in range(6)}
-        for nota in notas:
-            notas_detalhadas[str(nota)] += 1
-
-        # Total de coletas finalizadas do parceiro
-        total_coletas = Coletas.objects.filter(
-            id_parceiros=parceiro,
-            id_solicitacoes__estado_solicitacao='finalizado',
-            id_pagamentos__estado_pagamento='pago'
-        ).count()
-
+        resumo = resumo_avaliacoes.obter_resumo('parceiro', parceiro.id)
         return Response({
             'parceiro_id': parceiro.id_usuarios.id,
             'parceiro_nome': parceiro.id_usuarios.nome,
-            'total_avaliacoes': len(notas),
-            'media_notas': round(media_notas, 2),
-            'notas_detalhadas': notas_detalhadas,
-            'total_coletas_finalizadas': total_coletas
+            **_formatar_estatisticas(resumo)
         })
 
 
-class ColetasViewSet(viewsets.ModelViewSet):
+def _formatar_estatisticas(resumo):
+    # Nota 0 = avaliação pendente, não entra nas estatísticas
+    notas_detalhadas = {'0': 0}
+    for nota in range(1, 6):
+        notas_detalhadas[str(nota)] = getattr(resumo, f'nota_{nota}')
+
+    return {
+        'total_avaliacoes': resumo.total_avaliacoes,
+        'media_notas': resumo.media_notas,
+        'notas_detalhadas': notas_detalhadas,
+        'total_coletas_finalizadas': resumo.total_coletas_finalizadas
+    }
+
+
+class ColetasViewSet(SerializacaoRapidaMixin, viewsets.ModelViewSet):
+    # Listagens paginadas por cursor em (criado_em, id)
+    pagination_class = PaginacaoKeyset
+    orcamento_consultas = {
+        'list': 2,
+        'retrieve': 2,
+        'create': 7,
+        'criar_lote': 7,
+        'pendentes_para_parceiro': 5,
+        'minhas_coletas_parceiro': 3,
+        'minhas_coletas_cliente': 3,
+        'rota_parceiro': 3,
+        'aceitar_coleta': 4,
+        'marcar_coletado': 3,
+        'cancelar_coleta': 4,
+        # Na primeira finalização do cliente/parceiro o resumo de
+        # avaliações é montado a partir da tabela avaliacoes
+        'finalizar_coleta': 25,
+    }
+
     def get_queryset(self):
         queryset = Coletas.objects.all().select_related(
             'id_clientes__id_usuarios',
             'id_parceiros__id_usuarios',
-            'id_materiais',
             'id_enderecos',
             'id_solicitacoes',
             'id_pagamentos'
@@ -552,7 +602,7 @@ class ColetasViewSet(viewsets.ModelViewSet):
         return queryset
 
     def get_serializer_class(self):
-        if self.action == 'create':
+        if self.action in ['create', 'criar_lote']:
             return ColetasCreateSerializer
         elif self.action in ['update', 'partial_update']:
             return ColetasUpdateSerializer
@@ -565,14 +615,52 @@ class ColetasViewSet(viewsets.ModelViewSet):
         context['request'] = self.request
         return context
 
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        return self.responder_pagina(queryset, self.get_serializer_class())
+
+    @action(detail=False, methods=['post'], url_path='lote')
+    def criar_lote(self, request):
+        """
+        Cria várias coletas de uma vez (condomínios, empresas)
+        Body: lista com os mesmos objetos aceitos em POST /v1/coletas/
+        Tudo ou nada: se algum item for inválido nenhuma coleta é criada
+        e os erros vêm na posição do item
+        """
+        serializer = self.get_serializer(
+            data=request.data,
+            many=True,
+            allow_empty=False,
+            max_length=settings.COLETAS_LOTE_MAXIMO
+        )
+        serializer.is_valid(raise_exception=True)
+        coletas = serializer.save()
+
+        return Response(
+            {
+                'total': len(coletas),
+                'ids': [coleta.id for coleta in coletas],
+            },
+            status=status.HTTP_201_CREATED
+        )
+
     @action(detail=False, methods=['get'], url_path='pendentes-parceiro/(?P<parceiro_id>[^/]+)')
     def pendentes_para_parceiro(self, request, parceiro_id=None):
         """
         Lista coletas pendentes que o parceiro pode aceitar
         (coletas com materiais que ele trabalha e status pendente)
+
+        Com uma origem (?lat=&lon= ou ?origem=endereco, que usa o endereço
+        do parceiro) retorna apenas as coletas até ?raio= km, ordenadas
+        pela distância e paginadas por número de página (?page=).
         """
+        if settings.INDICE_PENDENTES_ATIVO:
+            return self._pendentes_do_indice(request, parceiro_id)
+
         try:
-            parceiro = Parceiros.objects.get(id_usuarios=parceiro_id)
+            parceiro = Parceiros.objects.select_related(
+                'id_usuarios__id_endereco'
+            ).get(id_usuarios=parceiro_id)
             
             # Busca materiais que o parceiro trabalha
             materiais_parceiro = MateriaisParceiros.objects.filter(
@@ -586,13 +674,27 @@ class ColetasViewSet(viewsets.ModelViewSet):
                 id_parceiros__isnull=True  # Ainda não foi aceita por nenhum parceiro
             ).select_related(
                 'id_clientes__id_usuarios',
-                'id_materiais',
                 'id_enderecos',
                 'id_pagamentos'
-            ).order_by('-criado_em')
-            
-            serializer = self.get_serializer(coletas_pendentes, many=True)
-            return Response(serializer.data)
+            )
+
+            endereco = parceiro.id_usuarios.id_endereco if parceiro.id_usuarios else None
+            origem = self._origem_busca(
+                request,
+                (endereco.latitude, endereco.longitude) if endereco else None
+            )
+            if origem is not None:
+                lat, lon, raio = origem
+                coletas_pendentes = geo.filtrar_por_raio(
+                    coletas_pendentes, lat, lon, raio, prefixo='id_enderecos__'
+                )
+                # O cursor é em (criado_em, id); a ordem por distância
+                # usa a paginação por número de página
+                self._paginator = PaginacaoPadrao()
+
+            return self.responder_pagina(
+                coletas_pendentes, ColetasPendentesParceiroSerializer
+            )
             
         except Parceiros.DoesNotExist:
             return Response(
@@ -600,6 +702,44 @@ class ColetasViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
 
+    def _pendentes_do_indice(self, request, parceiro_id):
+        """pendentes-parceiro respondido pelo índice em memória"""
+        parceiro = indice_espacial.dados_parceiro(parceiro_id)
+        if parceiro is None:
+            return Response(
+                {'detail': 'Parceiro não encontrado'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        origem = self._origem_busca(request, parceiro['coordenadas'])
+        if origem is not None:
+            self._paginator = PaginacaoPadrao()
+
+        resultados = indice_espacial.indice_pendentes.consultar(
+            parceiro['materiais'], origem
+        )
+        pagina = self.paginate_queryset(resultados)
+        return self.get_paginated_response(
+            [indice_espacial.para_resposta(item) for item in pagina]
+        )
+
+    @staticmethod
+    def _origem_busca(request, coordenadas_parceiro):
+        """(lat, lon, raio) da busca por distância ou None sem origem"""
+        origem = geo.ler_origem(request.query_params)
+        if origem is not None:
+            return origem
+
+        if request.query_params.get('origem') != 'endereco':
+            return None
+
+        if not coordenadas_parceiro or None in coordenadas_parceiro:
+            raise ValidationError(
+                {'origem': 'O endereço do parceiro não possui coordenadas'}
+            )
+        latitude, longitude = coordenadas_parceiro
+        return (latitude, longitude, geo.ler_raio(request.query_params))
+
     @action(detail=False, methods=['get'], url_path='minhas-coletas-parceiro/(?P<parceiro_id>[^/]+)')
     def minhas_coletas_parceiro(self, request, parceiro_id=None):
         """
@@ -612,14 +752,13 @@ class ColetasViewSet(viewsets.ModelViewSet):
                 id_parceiros=parceiro
             ).select_related(
                 'id_clientes__id_usuarios',
-                'id_materiais',
+                'id_parceiros__id_usuarios',
                 'id_enderecos',
                 'id_solicitacoes',
                 'id_pagamentos'
-            ).prefetch_related('imagens_coletas').order_by('-criado_em')
-            
-            serializer = ColetasRetrieveSerializer(coletas_parceiro, many=True)
-            return Response(serializer.data)
+            ).prefetch_related('imagens_coletas')
+
+            return self.responder_pagina(coletas_parceiro, ColetasRetrieveSerializer)
             
         except Parceiros.DoesNotExist:
             return Response(
@@ -638,15 +777,14 @@ class ColetasViewSet(viewsets.ModelViewSet):
             coletas_cliente = Coletas.objects.filter(
                 id_clientes=cliente
             ).select_related(
+                'id_clientes__id_usuarios',
                 'id_parceiros__id_usuarios',
-                'id_materiais',
                 'id_enderecos',
                 'id_solicitacoes',
                 'id_pagamentos'
-            ).prefetch_related('imagens_coletas').order_by('-criado_em')
-            
-            serializer = ColetasRetrieveSerializer(coletas_cliente, many=True)
-            return Response(serializer.data)
+            ).prefetch_related('imagens_coletas')
+
+            return self.responder_pagina(coletas_cliente, ColetasRetrieveSerializer)
             
         except Clientes.DoesNotExist:
             return Response(
@@ -654,12 +792,108 @@ class ColetasViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
 
+    @action(detail=False, methods=['get'], url_path='rota-parceiro/(?P<parceiro_id>[^/]+)')
+    def rota_parceiro(self, request, parceiro_id=None):
+        """
+        Ordem sugerida para visitar as coletas aceitas e ainda não
+        coletadas do parceiro
+
+        Parte de ?lat=&lon= ou do endereço do parceiro; sem nenhum dos
+        dois, começa pela coleta aceita há mais tempo. Coletas cujo
+        endereço ainda não tem coordenadas vêm em sem_coordenadas.
+        """
+        try:
+            parceiro = Parceiros.objects.select_related(
+                'id_usuarios__id_endereco'
+            ).get(id_usuarios=parceiro_id)
+        except Parceiros.DoesNotExist:
+            return Response(
+                {'detail': 'Parceiro não encontrado'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        coletas = list(Coletas.objects.filter(
+            id_parceiros=parceiro,
+            id_solicitacoes__estado_solicitacao='aceitado'
+        ).select_related('id_enderecos').order_by('criado_em', 'id'))
+
+        paradas = [
+            coleta for coleta in coletas
+            if coleta.id_enderecos.latitude is not None
+            and coleta.id_enderecos.longitude is not None
+        ]
+        sem_coordenadas = [
+            coleta.id for coleta in coletas
+            if coleta.id_enderecos.latitude is None
+            or coleta.id_enderecos.longitude is None
+        ]
+
+        origem = geo.ler_origem(request.query_params)
+        if origem is not None:
+            origem = origem[:2]
+        else:
+            endereco = parceiro.id_usuarios.id_endereco if parceiro.id_usuarios else None
+            if endereco and endereco.latitude is not None and endereco.longitude is not None:
+                origem = (endereco.latitude, endereco.longitude)
+
+        coordenadas = [
+            (coleta.id_enderecos.latitude, coleta.id_enderecos.longitude)
+            for coleta in paradas
+        ]
+        # A origem ocupa a posição 0 da matriz e não entra na resposta
+        deslocamento = 1 if origem is not None else 0
+        if origem is not None:
+            coordenadas.insert(0, origem)
+
+        resposta = {
+            'parceiro_id': parceiro.id_usuarios.id,
+            'origem': (
+                {'latitude': origem[0], 'longitude': origem[1]}
+                if origem is not None else None
+            ),
+            'distancia_total_km': 0,
+            'otimizacao_completa': True,
+            'paradas': [],
+            'sem_coordenadas': sem_coordenadas,
+        }
+        if not paradas:
+            return Response(resposta)
+
+        ordem, matriz, completo = rotas.planejar_rota(
+            coordenadas, settings.ROTA_TEMPO_MAXIMO
+        )
+        resposta['distancia_total_km'] = round(
+            rotas.distancia_caminho(matriz, ordem), 2
+        )
+        resposta['otimizacao_completa'] = completo
+
+        anterior = None
+        for posicao in ordem:
+            if posicao < deslocamento:
+                anterior = posicao
+                continue
+            coleta = paradas[posicao - deslocamento]
+            endereco = coleta.id_enderecos
+            resposta['paradas'].append({
+                'ordem': len(resposta['paradas']) + 1,
+                'coleta_id': coleta.id,
+                'endereco_completo': f"{endereco.rua}, {endereco.numero}, {endereco.bairro}, {endereco.cidade}",
+                'latitude': endereco.latitude,
+                'longitude': endereco.longitude,
+                'distancia_km': (
+                    round(float(matriz[anterior, posicao]), 2)
+                    if anterior is not None else 0
+                ),
+            })
+            anterior = posicao
+
+        return Response(resposta)
+
     @action(detail=True, methods=['post'], url_path='aceitar-coleta')
     def aceitar_coleta(self, request, pk=None):
         """
         Permite que um parceiro aceite uma coleta pendente
         """
-        coleta = self.get_object()
         parceiro_id = request.data.get('parceiro_id')
         
         if not parceiro_id:
@@ -668,76 +902,62 @@ class ColetasViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        try:
-            parceiro = Parceiros.objects.get(id_usuarios=parceiro_id)
-        except Parceiros.DoesNotExist:
+        parceiro = Parceiros.objects.filter(
+            id_usuarios=parceiro_id
+        ).values_list('id', flat=True).first()
+        if parceiro is None:
             return Response(
                 {'error': 'Parceiro não encontrado'},
                 status=status.HTTP_404_NOT_FOUND
             )
         
-        with transaction.atomic():
-            # Verificar se a coleta ainda está pendente
-            if coleta.id_solicitacoes.estado_solicitacao != 'pendente':
-                return Response(
-                    {'error': 'Esta coleta não está mais disponível'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            
-            # Verificar se já não foi aceita por outro parceiro
-            if coleta.id_parceiros:
-                return Response(
-                    {'error': 'Esta coleta já foi aceita por outro parceiro'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            
-            # Verificar se o parceiro trabalha com este material
-            if not MateriaisParceiros.objects.filter(
-                id_parceiros=parceiro,
-                id_materiais=coleta.id_materiais
-            ).exists():
-                return Response(
-                    {'error': 'Você não trabalha com este tipo de material'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            
-            # Aceitar a coleta
-            coleta.id_parceiros = parceiro
-            coleta.save()
-            
-            # Atualizar status da solicitação
-            solicitacao = coleta.id_solicitacoes
-            solicitacao.estado_solicitacao = 'aceitado'
-            solicitacao.save()
-            
+        # Sem get_object(): a coleta é verificada e reivindicada pelo
+        # UPDATE condicional, sem leitura prévia
+        try:
+            estados_coleta.aceitar_coleta(pk, parceiro)
+        except estados_coleta.ColetaNaoEncontrada as e:
             return Response(
-                {'message': 'Coleta aceita com sucesso'},
-                status=status.HTTP_200_OK
+                {'detail': str(e)},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        except estados_coleta.TransicaoInvalida as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_400_BAD_REQUEST
             )
 
+        return Response(
+            {'message': 'Coleta aceita com sucesso'},
+            status=status.HTTP_200_OK
+        )
+
+    def _transicionar(self, acao, pk, mensagem):
+        try:
+            estados_coleta.transicionar_uma(acao, pk)
+        except estados_coleta.ColetaNaoEncontrada as e:
+            return Response(
+                {'detail': str(e)},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        except estados_coleta.TransicaoInvalida as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        return Response(
+            {'message': mensagem},
+            status=status.HTTP_200_OK
+        )
+
     @action(detail=True, methods=['post'], url_path='marcar-coletado')
     def marcar_coletado(self, request, pk=None):
         """
         Permite que um parceiro marque uma coleta como coletada
         """
-        coleta = self.get_object()
-        
-        if coleta.id_solicitacoes.estado_solicitacao != 'aceitado':
-            return Response(
-                {'error': 'Esta coleta não pode ser marcada como coletada'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        with transaction.atomic():
-            # Atualizar status da solicitação para coletado
-            solicitacao = coleta.id_solicitacoes
-            solicitacao.estado_solicitacao = 'coletado'
-            solicitacao.save()
-            
-            return Response(
-                {'message': 'Coleta marcada como coletada com sucesso'},
-                status=status.HTTP_200_OK
-            )
+        return self._transicionar(
+            'marcar_coletado', pk, 'Coleta marcada como coletada com sucesso'
+        )
 
     @action(detail=True, methods=['post'], url_path='cancelar-coleta')
     def cancelar_coleta(self, request, pk=None):
@@ -745,31 +965,9 @@ class ColetasViewSet(viewsets.ModelViewSet):
         Permite que um cliente cancele uma coleta
         Condições: pagamento pendente E solicitação pendente
         """
-        coleta = self.get_object()
-        
-        # Validar se pode cancelar: pagamento pendente E solicitação pendente
-        if (coleta.id_pagamentos.estado_pagamento != 'pendente' or 
-            coleta.id_solicitacoes.estado_solicitacao != 'pendente'):
-            return Response(
-                {'error': 'Esta coleta só pode ser cancelada se estiver com pagamento pendente e solicitação pendente'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        with transaction.atomic():
-            # Atualizar status da solicitação
-            solicitacao = coleta.id_solicitacoes
-            solicitacao.estado_solicitacao = 'cancelado'
-            solicitacao.save()
-            
-            # Atualizar status do pagamento
-            pagamento = coleta.id_pagamentos
-            pagamento.estado_pagamento = 'cancelado'
-            pagamento.save()
-            
-            return Response(
-                {'message': 'Coleta cancelada com sucesso'},
-                status=status.HTTP_200_OK
-            )
+        return self._transicionar(
+            'cancelar', pk, 'Coleta cancelada com sucesso'
+        )
 
     @action(detail=True, methods=['post'], url_path='finalizar-coleta')
     def finalizar_coleta(self, request, pk=None):
@@ -779,46 +977,67 @@ class ColetasViewSet(viewsets.ModelViewSet):
         Ao finalizar: muda solicitação para finalizado E pagamento para pago
         NOVO: Cria automaticamente registro de avaliação
         """
-        coleta = self.get_object()
-        
-        # Validar se pode finalizar: pagamento pendente E solicitação coletado
-        if (coleta.id_pagamentos.estado_pagamento != 'pendente' or 
-            coleta.id_solicitacoes.estado_solicitacao != 'coletado'):
+        return self._transicionar(
+            'finalizar', pk, 'Coleta finalizada com sucesso e avaliação criada'
+        )
+
+    @action(detail=False, methods=['post'], url_path='transicao-lote')
+    def transicao_lote(self, request):
+        """
+        Aplica a mesma ação a várias coletas em uma única transação
+        Body: {"acao": "marcar_coletado", "coletas": [1, 2, 3], "parceiro_id": 5}
+        parceiro_id (id do usuário) é obrigatório para aceitar e, nas
+        demais ações, restringe às coletas desse parceiro
+        """
+        acao = request.data.get('acao')
+        coletas = request.data.get('coletas')
+
+        if acao not in estados_coleta.ACOES:
             return Response(
-                {'error': 'Esta coleta só pode ser finalizada se estiver com pagamento pendente e solicitação coletado'},
+                {'error': f"Ação inválida. Use: {', '.join(estados_coleta.ACOES)}"},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        
-        with transaction.atomic():
-            # Atualizar status da solicitação para finalizado
-            solicitacao = coleta.id_solicitacoes
-            solicitacao.estado_solicitacao = 'finalizado'
-            solicitacao.finalizado_em = timezone.now()
-            solicitacao.save()
-            
-            # Atualizar status do pagamento para pago
-            pagamento = coleta.id_pagamentos
-            pagamento.estado_pagamento = 'pago'
-            pagamento.save()
-            
-            # Criar registro de avaliação automaticamente
-            # Verificar se já não existe (por segurança)
-            if not hasattr(coleta, 'avaliacao') or not coleta.avaliacao:
-                Avaliacoes.objects.create(
-                    id_coletas=coleta,
-                    id_clientes=coleta.id_clientes,
-                    id_parceiros=coleta.id_parceiros,
-                    nota_parceiros=0,  # Valor padrão até cliente avaliar
-                    nota_clientes=0,   # Valor padrão até parceiro avaliar
-                    descricao_parceiros='',
-                    descricao_clientes=''
+        if (
+            not isinstance(coletas, list) or not coletas
+            or not all(isinstance(c, int) and not isinstance(c, bool) for c in coletas)
+        ):
+            return Response(
+                {'error': 'coletas deve ser uma lista de IDs'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(coletas) > settings.TRANSICAO_LOTE_MAXIMO:
+            return Response(
+                {'error': f'Máximo de {settings.TRANSICAO_LOTE_MAXIMO} coletas por lote'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        parceiro = None
+        parceiro_id = request.data.get('parceiro_id')
+        if parceiro_id:
+            parceiro = Parceiros.objects.filter(
+                id_usuarios=parceiro_id
+            ).values_list('id', flat=True).first()
+            if parceiro is None:
+                return Response(
+                    {'error': 'Parceiro não encontrado'},
+                    status=status.HTTP_404_NOT_FOUND
                 )
-            
+        elif acao == 'aceitar':
             return Response(
-                {'message': 'Coleta finalizada com sucesso e avaliação criada'},
-                status=status.HTTP_200_OK
+                {'error': 'ID do parceiro é obrigatório'},
+                status=status.HTTP_400_BAD_REQUEST
             )
 
+        alteradas, recusadas = estados_coleta.transicionar(acao, coletas, parceiro)
+        return Response({
+            'acao': acao,
+            'sucesso': alteradas,
+            'falhas': [
+                {'coleta_id': coleta_id, 'error': motivo}
+                for coleta_id, motivo in recusadas.items()
+            ],
+        })
+
     @action(detail=True, methods=['post'], url_path='upload-imagem')
     def upload_imagem(self, request, pk=None):
         """
@@ -864,57 +1083,106 @@ class ColetasViewSet(viewsets.ModelViewSet):
         )
 
 
-class MateriaisViewSet(viewsets.ModelViewSet):
-    queryset = Materiais.objects.all()
+class MateriaisViewSet(CacheRespostaMixin, viewsets.ModelViewSet):
+    cache_modelos = (Materiais,)
+    orcamento_consultas = {'list': 2, 'retrieve': 1}
+    queryset = Materiais.objects.all().order_by('id')
     serializer_class = MateriaisSerializer
 
 
-class MateriaisParceirosViewSet(viewsets.ModelViewSet):
-    queryset = MateriaisParceiros.objects.all()
+class MateriaisParceirosViewSet(CacheRespostaMixin, viewsets.ModelViewSet):
+    cache_modelos = (MateriaisParceiros,)
+    queryset = MateriaisParceiros.objects.all().order_by(
+        'id_parceiros', 'id_materiais'
+    )
     serializer_class = MateriaisParceirosSerializer
 
 
-class MateriaisPontosColetaViewSet(viewsets.ModelViewSet):
-    queryset = MateriaisPontosColeta.objects.all()
+class MateriaisPontosColetaViewSet(CacheRespostaMixin, viewsets.ModelViewSet):
+    cache_modelos = (MateriaisPontosColeta,)
+    queryset = MateriaisPontosColeta.objects.all().order_by(
+        'id_pontos_coleta', 'id_materiais'
+    )
     serializer_class = MateriaisPontosColetaSerializer
 
 
 class PagamentosViewSet(viewsets.ModelViewSet):
-    queryset = Pagamentos.objects.all()
+    queryset = Pagamentos.objects.all().order_by('id')
+    # Tabela grande: pagina sem COUNT(*)
+    pagination_class = PaginacaoSemContagem
     serializer_class = PagamentosSerializer
 
 
-class PontosColetaViewSet(viewsets.ModelViewSet):
+class PontosColetaViewSet(CacheRespostaMixin, viewsets.ModelViewSet):
+    cache_modelos = (
+        PontosColeta, MateriaisPontosColeta, Materiais, Enderecos, Parceiros,
+        Usuarios, Telefones
+    )
+    orcamento_consultas = {'list': 4, 'retrieve': 3, 'proximos': 4}
     queryset = PontosColeta.objects.all().select_related(
         'id_enderecos',
         'id_parceiros',
         'id_parceiros__id_usuarios'
     ).prefetch_related(
-        Prefetch(
-            'materiais',
-            queryset=Materiais.objects.only(
-                'nome', 'descricao'
-            )
-        ),
+        # Apenas os ids; os materiais vêm do catálogo em memória
+        'materiaispontoscoleta_set',
         'id_parceiros__id_usuarios__telefones'
-    )
+    ).order_by('id')
 
     def get_serializer_class(self):
         if self.action == 'create':
             return PontosColetaCreateSerializer
         elif self.action in ['update', 'partial_update']:
             return PontosColetaUpdateSerializer
+        elif self.action == 'proximos':
+            return PontosColetaProximosSerializer
         return PontosColetaRetrieveSerializer
 
+    @action(detail=False, methods=['get'])
+    def proximos(self, request):
+        """
+        Pontos de coleta mais próximos de ?lat=&lon=, até ?raio= km,
+        ordenados pela distância. ?material= (id ou nome) filtra os
+        pontos que recebem o material.
+        """
+        lat, lon, raio = geo.ler_origem(request.query_params, obrigatoria=True)
+
+        queryset = self.get_queryset()
+        material = request.query_params.get('material')
+        if material:
+            if not material.isdigit():
+                # Nome resolvido pelo catálogo, sem join com materiais
+                encontrado = catalogo_materiais.por_nome(material)
+                material = encontrado.id if encontrado else None
+            if material is None:
+                queryset = queryset.none()
+            else:
+                queryset = queryset.filter(
+                    materiaispontoscoleta__id_materiais=material
+                )
+
+        queryset = geo.filtrar_por_raio(
+            queryset, lat, lon, raio, prefixo='id_enderecos__'
+        )
+
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
 
 class SolicitacoesViewSet(viewsets.ModelViewSet):
-    queryset = Solicitacoes.objects.all()
+    queryset = Solicitacoes.objects.all().order_by('id')
+    # Tabela grande: pagina sem COUNT(*)
+    pagination_class = PaginacaoSemContagem
     serializer_class = SolicitacoesSerializer
 
 
 class TelefonesViewSet(viewsets.ModelViewSet):
-    queryset = Telefones.objects.all().select_related('id_usuarios')
+    queryset = Telefones.objects.all().select_related(
+        'id_usuarios'
+    ).order_by('id_usuarios')
     lookup_field = 'id_usuarios'  # Permite buscar por ID do usuário
+    orcamento_consultas = {'list': 2, 'retrieve': 1}
 
     def get_serializer_class(self):
         if self.action == 'create':
@@ -984,12 +1252,12 @@ class LoginAPIView(APIView):
 
 
 class ClientesApiView(ListCreateAPIView):
-    queryset = Clientes.objects.all()
+    queryset = Clientes.objects.all().order_by('id')
     serializer_class = ClienteComUsuarioCreateSerializer
 
 
 class ParceirosApiView(ListCreateAPIView):
-    queryset = Parceiros.objects.all()
+    queryset = Parceiros.objects.all().order_by('id')
     serializer_class = ParceiroComUsuarioCreateSerializer
 
 
@@ -999,7 +1267,7 @@ class PingView(APIView):
 
 
 class ImagemPerfilViewSet(viewsets.ModelViewSet):
-    queryset = ImagemPerfil.objects.all()
+    queryset = ImagemPerfil.objects.all().order_by('id')
     lookup_field = 'id_usuarios'  # Define que vamos buscar pelo id_usuarios
 
     def get_object(self):
@@ -49,12 +49,17 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
+    'core.middleware.CatalogoMateriaisMiddleware',
+    'core.middleware.OrcamentoConsultasMiddleware',
 ]
 
 CORS_ALLOW_ALL_ORIGINS = True
 
 ROOT_URLCONF = 'core.urls'
 
+# Cria as tabelas não gerenciadas do core no banco de testes
+TEST_RUNNER = 'core.executor_testes.ExecutorTestes'
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -159,8 +164,35 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ),
+    # Todas as listagens são paginadas; cada viewset pode trocar a classe
+    'DEFAULT_PAGINATION_CLASS': 'core.paginacao.PaginacaoPadrao',
+    # JSON com orjson (core.renderizadores), mesma saída do JSONRenderer
+    'DEFAULT_RENDERER_CLASSES': (
+        'core.renderizadores.JSONRapidoRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'core.renderizadores.JSONRapidoParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
 }
 
+# Paginação (core.paginacao)
+# O cliente pode pedir outro tamanho com ?tamanho_pagina=N, até o máximo
+PAGINACAO_TAMANHO = int(os.getenv('PAGINACAO_TAMANHO', 50))
+PAGINACAO_KEYSET_TAMANHO = int(os.getenv('PAGINACAO_KEYSET_TAMANHO', 20))
+PAGINACAO_TAMANHO_MAXIMO = 100
+
+# Listagens de coletas e avaliações montadas a partir de .values()
+# (core.serializacao_rapida); cada requisição pode escolher com ?rapido=1/0
+SERIALIZACAO_RAPIDA = os.getenv('SERIALIZACAO_RAPIDA', 'False') == 'True'
+
+# Busca por proximidade (core.geo): raio em km usado quando ?raio= não é
+# informado e o maior raio aceito
+BUSCA_RAIO_PADRAO_KM = float(os.getenv('BUSCA_RAIO_PADRAO_KM', 10))
+BUSCA_RAIO_MAXIMO_KM = float(os.getenv('BUSCA_RAIO_MAXIMO_KM', 100))
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=30),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
@@ -188,9 +220,134 @@ SESSION_CACHE_ALIAS = "default"
 REDIS_TIMEOUT = 60 * 60 * 24  # 1 dia
 CACHE_MIDDLEWARE_SECONDS = REDIS_TIMEOUT
 
-# Configuração do Celery (se for usar tarefas assíncronas)
-# CELERY_BROKER_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
-# CELERY_RESULT_BACKEND = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+# Cache de geocodificação (Nominatim)
+# Endereços encontrados ficam 90 dias em cache, não encontrados 1 dia
+GEOCODING_CACHE_TTL = int(
+    os.getenv('GEOCODING_CACHE_TTL', 60 * 60 * 24 * 90)
+)
+GEOCODING_CACHE_TTL_NEGATIVO = int(
+    os.getenv('GEOCODING_CACHE_TTL_NEGATIVO', 60 * 60 * 24)
+)
+# Limite de registros na tabela geocodificacao_cache (os mais antigos saem)
+GEOCODING_CACHE_MAX_REGISTROS = int(
+    os.getenv('GEOCODING_CACHE_MAX_REGISTROS', 50000)
+)
+GEOCODING_CACHE_PROBABILIDADE_LIMPEZA = 0.01
+
+# Limite de requisições ao Nominatim (token bucket compartilhado no Redis)
+# Use 'local' para um bucket em memória (testes/desenvolvimento)
+GEOCODING_RATE_LIMIT_BACKEND = os.getenv(
+    'GEOCODING_RATE_LIMIT_BACKEND', 'redis'
+)
+GEOCODING_RATE_LIMIT_POR_SEGUNDO = float(
+    os.getenv('GEOCODING_RATE_LIMIT_POR_SEGUNDO', 1)
+)
+GEOCODING_RATE_LIMIT_CAPACIDADE = int(
+    os.getenv('GEOCODING_RATE_LIMIT_CAPACIDADE', 1)
+)
+
+# Índice local de CEPs (importado com: python manage.py importar_ceps)
+CEP_INDICE_ARQUIVO = os.getenv(
+    'CEP_INDICE_ARQUIVO', os.path.join(BASE_DIR, 'dados', 'ceps.sqlite3')
+)
+# Consulta a ViaCEP quando o CEP não está no índice (e grava o resultado)
+CEP_FALLBACK_VIACEP = os.getenv('CEP_FALLBACK_VIACEP', 'True') == 'True'
+# Cliente da ViaCEP: timeouts (segundos), cache e circuit breaker
+CEP_TIMEOUT_CONEXAO = 2
+CEP_TIMEOUT_LEITURA = 3
+CEP_POOL_CONEXOES = 10
+CEP_CACHE_TTL = 60 * 60 * 24 * 7  # 7 dias
+CEP_CACHE_TTL_NEGATIVO = 60 * 60  # CEP inexistente: 1 hora
+CEP_CACHE_LRU_TAMANHO = 2048
+CEP_CIRCUITO_FALHAS = 5  # falhas seguidas para abrir o circuito
+CEP_CIRCUITO_REABERTURA = 30  # segundos até tentar novamente
+
+# Cache de list/retrieve das views com CacheRespostaMixin
+# (core.cache_respostas), invalidado por contadores de versão por modelo
+CACHE_RESPOSTAS_ATIVO = os.getenv('CACHE_RESPOSTAS_ATIVO', 'True') == 'True'
+CACHE_RESPOSTAS_TTL = 5 * 60
+
+# Contagem de consultas SQL por requisição (core.middleware): headers
+# X-Consultas-SQL/X-Tempo-SQL-ms e log core.consultas. Com ESTRITO, passar
+# do orcamento_consultas de uma viewset levanta exceção em vez de avisar
+ORCAMENTO_CONSULTAS_ATIVO = os.getenv('ORCAMENTO_CONSULTAS_ATIVO', 'True') == 'True'
+ORCAMENTO_CONSULTAS_ESTRITO = os.getenv('ORCAMENTO_CONSULTAS_ESTRITO', 'False') == 'True'
+
+# Catálogo de materiais em memória (core.catalogo_materiais): validado
+# pela versão no cache a cada requisição e recarregado após esse tempo
+# (segundos) mesmo sem alteração
+CATALOGO_MATERIAIS_IDADE_MAXIMA = 10 * 60
+
+# Índice em memória das coletas pendentes (core.indice_espacial), usado
+# por /v1/coletas/pendentes-parceiro/. Com False a busca vai ao banco
+INDICE_PENDENTES_ATIVO = os.getenv('INDICE_PENDENTES_ATIVO', 'True') == 'True'
+INDICE_PENDENTES_CELULA_GRAUS = 0.05  # ~5,5 km de latitude
+# Reconstrução completa a partir do banco após esse tempo (segundos),
+# corrige alterações feitas fora das ações de coletas
+INDICE_PENDENTES_IDADE_MAXIMA = 5 * 60
+INDICE_PENDENTES_TTL_EVENTOS = 10 * 60
+INDICE_PENDENTES_TTL_PARCEIRO = 60
+
+# Eventos das coletas pendentes enviados aos parceiros por SSE
+# (core.eventos). 'redis' usa pub/sub no REDIS_URL e alcança todos os
+# processos; 'memoria' só entrega no próprio processo (testes)
+EVENTOS_BACKEND = os.getenv('EVENTOS_BACKEND', 'redis')
+EVENTOS_REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+EVENTOS_REDIS_SENHA = os.getenv('REDIS_PASSWORD')
+EVENTOS_CANAL = 'recicla_api:coletas_pendentes'
+EVENTOS_TAMANHO_FILA = 1000  # eventos aguardando por conexão
+EVENTOS_INTERVALO_PING = 15  # segundos
+EVENTOS_RECONEXAO_MS = 3000
+
+# Tempo máximo (segundos) da otimização em /v1/coletas/rota-parceiro/
+ROTA_TEMPO_MAXIMO = float(os.getenv('ROTA_TEMPO_MAXIMO', 0.5))
+
+# Máximo de coletas por requisição em /v1/coletas/transicao-lote/
+TRANSICAO_LOTE_MAXIMO = 100
+# Máximo de coletas criadas por requisição em /v1/coletas/lote/
+COLETAS_LOTE_MAXIMO = 500
+
+# Configuração do Celery (tarefas assíncronas, ver celery_app.py)
+CELERY_BROKER_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+CELERY_RESULT_BACKEND = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+CELERY_TASK_IGNORE_RESULT = True
+CELERY_TIMEZONE = TIME_ZONE
+# Executa as tarefas na hora, sem worker (útil em desenvolvimento)
+CELERY_TASK_ALWAYS_EAGER = os.getenv('CELERY_TASK_ALWAYS_EAGER') == 'True'
+CELERY_BEAT_SCHEDULE = {
+    'processar-enderecos-pendentes': {
+        'task': 'core.tasks.processar_enderecos_pendentes',
+        'schedule': 60.0,
+    },
+}
+
+# Despacho automático de coletas pendentes (core.despacho). Também pode
+# ser executado manualmente: python manage.py despachar_coletas
+DESPACHO_AUTOMATICO = os.getenv('DESPACHO_AUTOMATICO', 'False') == 'True'
+DESPACHO_INTERVALO = 5 * 60  # segundos entre execuções periódicas
+DESPACHO_LOTE = 200  # coletas consideradas por execução
+DESPACHO_RAIO_MAXIMO_KM = 30
+DESPACHO_CAPACIDADE_PARCEIRO = 10  # coletas aceitas e ainda não coletadas
+# Pesos do custo: km, coletas em andamento e pontos abaixo da nota 5
+DESPACHO_PESO_DISTANCIA = 1.0
+DESPACHO_PESO_CARGA = 2.0
+DESPACHO_PESO_AVALIACAO = 3.0
+DESPACHO_NOTA_PADRAO = 4.0  # parceiros ainda sem avaliações
+
+if DESPACHO_AUTOMATICO:
+    CELERY_BEAT_SCHEDULE['despachar-coletas-pendentes'] = {
+        'task': 'core.tasks.despachar_coletas_pendentes',
+        'schedule': float(DESPACHO_INTERVALO),
+    }
+
+# Geocoding assíncrono dos endereços
+# Com False o geocoding volta a ser feito durante a requisição
+GEOCODING_ASSINCRONO = os.getenv('GEOCODING_ASSINCRONO', 'True') == 'True'
+GEOCODING_LOTE = 50
+GEOCODING_MAX_TENTATIVAS = 5
+GEOCODING_BACKOFF_BASE = 30  # segundos, dobra a cada tentativa
+# Pendentes há mais tempo que isso são reenviados pela tarefa periódica
+GEOCODING_PENDENTE_APOS = 5 * 60
 
 IMAGEKIT_PRIVATE_KEY = os.getenv('IMAGEKIT_PRIVATE_KEY')
 IMAGEKIT_PUBLIC_KEY = os.getenv('IMAGEKIT_PUBLIC_KEY')